@@ -0,0 +1,71 @@
+"""
+Startup import time of the bot, measured with python -X importtime
+
+    python -m benchmarks.import_time [--budget-ms 1200] [--runs 3]
+
+Exits with status 1 when the best run of `import main` is over budget or
+pulls in pyrogram, which must only be imported when a client is opened.
+The budget sits just above the current cold start of about 0.8-0.95s,
+set IMPORT_TIME_BUDGET_MS or --budget-ms higher on slow CI machines.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 1200))
+
+def measure(module: str = "main") -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+def check(budget_ms: float = DEFAULT_BUDGET_MS, runs: int = 3) -> Tuple[List[str], float, Dict[str, int]]:
+    """Problems found (empty when within budget), best total in ms and that run's modules"""
+    best = min((measure() for _ in range(runs)), key=lambda modules: modules["main"])
+    total_ms = best["main"] / 1000
+
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(f"import main took {total_ms:.0f}ms, budget is {budget_ms:.0f}ms")
+    pyrogram = [name for name in best if name == "pyrogram" or name.startswith("pyrogram.")]
+    if pyrogram:
+        problems.append(f"import main pulled in {len(pyrogram)} pyrogram modules")
+    return problems, total_ms, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import time of the bot")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    problems, total_ms, modules = check(args.budget_ms, args.runs)
+    print(f"import main: {total_ms:.0f}ms (best of {args.runs}), budget {args.budget_ms:.0f}ms")
+    print("slowest top-level packages by cumulative time:")
+    top_level = {name: us for name, us in modules.items() if "." not in name and name != "main"}
+    for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Throughput and accuracy of the OTP parser over the synthetic corpus
+
+    python -m benchmarks.otp_parser_bench [messages]
+"""
+
+import sys
+import time
+from tests.otp_corpus import generate
+from utils.otp_parser import extract_otp_from_text
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    messages = list(generate(count))
+
+    start = time.perf_counter()
+    results = [extract_otp_from_text(text) for text, _ in messages]
+    elapsed = time.perf_counter() - start
+
+    misses = sum(1 for (_, code), result in zip(messages, results) if result != code)
+    print(f"{count} messages in {elapsed:.2f}s, {count / elapsed:,.0f} msg/s")
+    print(f"{misses} misses, accuracy {1 - misses / count:.4%}")
+
+if __name__ == "__main__":
+    main()
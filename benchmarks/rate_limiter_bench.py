@@ -0,0 +1,93 @@
+"""
+Cost of a local rate limit check, memory per key and the idle key sweep
+
+    python -m benchmarks.rate_limiter_bench [keys] [checks_per_key]
+
+Every key is a distinct (user, action) pair over RATE_LIMITS actions, so
+keys with 60s and 300s periods are mixed in the LRU order the way they
+are in the bot. Memory is measured with tracemalloc in a separate pass,
+tracing slows the checks down.
+"""
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from utils.rate_limiter import RATE_LIMITS, RateLimiter
+
+def make_requests(keys: int, checks_per_key: int):
+    actions = list(RATE_LIMITS.items())
+    distinct = [(index // len(actions), *actions[index % len(actions)]) for index in range(keys)]
+    return distinct * checks_per_key
+
+def run_checks(limiter: RateLimiter, requests) -> float:
+    start = time.perf_counter()
+    for user_id, action, limits in requests:
+        limiter.hit(user_id, action, limits["limit"], limits["period"])
+    return time.perf_counter() - start
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    checks_per_key = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    requests = make_requests(keys, checks_per_key)
+    checks = len(requests)
+
+    limiter = RateLimiter()
+    elapsed = run_checks(limiter, requests)
+    print(f"{checks:,} checks over {len(limiter.user_limits):,} distinct keys")
+    print(f"  {elapsed / checks * 1e9:,.0f} ns per check, {checks / elapsed:,.0f} checks/s")
+    print(f"  denied {limiter.denied:,}, evicted inline {limiter.evicted:,}")
+
+    # Memory held by the limiter's keys and counters
+    del limiter
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    limiter = RateLimiter()
+    run_checks(limiter, requests[:keys])
+    gc.collect()
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    stored = len(limiter.user_limits)
+    print(f"memory for {stored:,} keys: {format_size(used)}, {used / stored:,.0f} B per key")
+
+    # Age every key past two windows, then time one full sweep and the
+    # longest the sweeper holds the event loop between yields
+    for counter in limiter.user_limits.values():
+        counter.window_start -= 2 * counter.period
+    elapsed, longest_hold, evicted = asyncio.run(timed_sweep(limiter))
+    print(
+        f"sweep of {stored:,} idle keys: {elapsed * 1000:.1f} ms, evicted {evicted:,}, "
+        f"longest hold of the loop {longest_hold * 1000:.1f} ms"
+    )
+
+async def timed_sweep(limiter: RateLimiter):
+    holds = []
+    done = asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            holds.append(now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    evicted = await limiter.sweep()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, max(holds, default=0), evicted
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Load test of the webhook server: POSTs synthetic message updates over
+keep-alive connections and reports throughput and acknowledgement latency
+
+    python -m benchmarks.webhook_load [--updates 20000] [--connections 40]
+
+The server runs in-process with a stub application whose queue is drained
+immediately, so this measures ingestion only, not handler work.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import aiohttp
+from aiohttp import web
+from telegram import Bot
+from utils.webhook import WebhookServer, SECRET_HEADER
+
+SECRET = "load-test-secret"
+
+class StubApplication:
+    """Just the parts of telegram.ext.Application the webhook server uses"""
+
+    def __init__(self):
+        self.update_queue: asyncio.Queue = asyncio.Queue()
+        self.bot = Bot("123456:load-test")
+
+def message_update(update_id: int) -> str:
+    user = {"id": update_id % 500, "is_bot": False, "first_name": "user"}
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": "hello"
+        }
+    })
+
+def percentile(sorted_values, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+async def run(updates: int, connections: int, port: int):
+    application = StubApplication()
+    server = WebhookServer(application, secret_token=SECRET, host="127.0.0.1", port=port)
+    server.runner = web.AppRunner(server.build_app(), access_log=None)
+    await server.runner.setup()
+    await web.TCPSite(server.runner, "127.0.0.1", port).start()
+
+    async def drain():
+        while True:
+            await application.update_queue.get()
+
+    drainer = asyncio.create_task(drain())
+    url = f"http://127.0.0.1:{port}{server.path}"
+    latencies = []
+    update_ids = iter(range(updates))
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connections)) as session:
+        async with session.post(url, data=message_update(0)) as response:
+            assert response.status == 403, "requests without the secret must be rejected"
+
+        async def client():
+            for update_id in update_ids:
+                start = time.perf_counter()
+                async with session.post(url, data=message_update(update_id), headers={SECRET_HEADER: SECRET}) as response:
+                    assert response.status == 200
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(connections)))
+        elapsed = time.perf_counter() - start
+
+    drainer.cancel()
+    await server.stop()
+
+    latencies.sort()
+    print(f"{updates} updates over {connections} connections in {elapsed:.2f}s")
+    print(f"throughput {updates / elapsed:,.0f} updates/s")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1000:.2f}ms, p99 {percentile(latencies, 0.99) * 1000:.2f}ms, "
+          f"max {latencies[-1] * 1000:.2f}ms")
+    print(f"server stats {server.get_stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--port", type=int, default=18443)
+    args = parser.parse_args()
+    asyncio.run(run(args.updates, args.connections, args.port))
+
+if __name__ == "__main__":
+    main()
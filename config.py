@@ -13,6 +13,7 @@ class Config:
     # MongoDB Configuration
     MONGO_URI = os.getenv("MONGO_URI", "mongodb+srv://10:10@cluster0.rbnwfqt.mongodb.net/?appName=Cluster0")
     DB_NAME = os.getenv("DB_NAME", "telegram_account_manager")
+    MONGO_SLOW_MS = float(os.getenv("MONGO_SLOW_MS", 100))
     
     # Log Channels (can be set via bot or .env)
     MAIN_LOG_CHANNEL = int(os.getenv("MAIN_LOG_CHANNEL", 0)) if os.getenv("MAIN_LOG_CHANNEL") else None
@@ -23,18 +24,79 @@ class Config:
     JOIN_LOG_CHANNEL = int(os.getenv("JOIN_LOG_CHANNEL", 0)) if os.getenv("JOIN_LOG_CHANNEL") else None
     LEAVE_LOG_CHANNEL = int(os.getenv("LEAVE_LOG_CHANNEL", 0)) if os.getenv("LEAVE_LOG_CHANNEL") else None
     
+    # Log Channel Delivery (events are batched into digests per channel)
+    CHANNEL_LOG_WINDOW = float(os.getenv("CHANNEL_LOG_WINDOW", 5))
+    CHANNEL_LOG_INTERVAL = float(os.getenv("CHANNEL_LOG_INTERVAL", 3))
+    CHANNEL_LOG_MAX_QUEUE = int(os.getenv("CHANNEL_LOG_MAX_QUEUE", 1000))
+    
     # Bot Settings
     MAX_ACCOUNTS_PER_USER = int(os.getenv("MAX_ACCOUNTS_PER_USER", 50))
     MAX_TOTAL_ACCOUNTS = int(os.getenv("MAX_TOTAL_ACCOUNTS", 10000))
     SESSION_DIR = os.getenv("SESSION_DIR", "sessions")
     
+    # Login Settings
+    LOGIN_STEP_TIMEOUT = int(os.getenv("LOGIN_STEP_TIMEOUT", 300))
+    LOGIN_CODE_TIMEOUT = int(os.getenv("LOGIN_CODE_TIMEOUT", 180))
+    MAX_PENDING_LOGINS = int(os.getenv("MAX_PENDING_LOGINS", 50))
+    
+    # Logging Settings (LOG_SAMPLE_RATE applies to hot-path logs only)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE = os.getenv("LOG_FILE", "logs/bot.log")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+    LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+    
+    # Conversation State Settings (memory, mongo or sqlite)
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+    STATE_TTL = int(os.getenv("STATE_TTL", 3600))
+    STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "data/states.db")
+    
     # Redis for rate limiting (optional)
     REDIS_URL = os.getenv("REDIS_URL", "")
+    # Seconds between full sweeps of idle local rate limit keys
+    RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", 300))
+    
+    # Update Mode Settings (polling or webhook)
+    UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", 8443)))
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
     
     # Worker Settings
     MAX_WORKERS = int(os.getenv("MAX_WORKERS", 10))
+    MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", 256))
+    MAX_TASKS_PER_USER = int(os.getenv("MAX_TASKS_PER_USER", 3))
+    SHUTDOWN_DRAIN_TIMEOUT = int(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 30))
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
     
+    # Monitoring Settings (MONITOR_SAMPLES samples are kept, one per MONITOR_INTERVAL seconds)
+    MONITOR_INTERVAL = float(os.getenv("MONITOR_INTERVAL", 5))
+    MONITOR_SAMPLES = int(os.getenv("MONITOR_SAMPLES", 720))
+    
+    # Event Loop Watchdog (ASYNCIO_DEBUG is for development, it slows the bot down)
+    LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() == "true"
+    LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 250))
+    ASYNCIO_DEBUG = os.getenv("ASYNCIO_DEBUG", "false").lower() == "true"
+    
+    # Profiling (owner-only /profile and /heap commands)
+    PROFILE_DEFAULT_SECONDS = int(os.getenv("PROFILE_DEFAULT_SECONDS", 30))
+    PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 300))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+    
+    # Metrics Settings (Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+    
+    # OTP Settings
+    OTP_CACHE_TTL = int(os.getenv("OTP_CACHE_TTL", 60))
+    OTP_LISTEN_TIMEOUT = int(os.getenv("OTP_LISTEN_TIMEOUT", 120))
+    OTP_SWEEP_CONCURRENCY = int(os.getenv("OTP_SWEEP_CONCURRENCY", 5))
+    
     # Security
     ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", "default-encryption-key-change-this")
     
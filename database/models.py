@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
+from utils.validators import normalize_phone_key
 
 # Simple models without pydantic for now
 # We'll use plain dictionaries for MongoDB
@@ -22,6 +23,7 @@ class Account:
         return {
             "user_id": user_id,
             "phone_number": phone_number,
+            "phone_key": kwargs.get("phone_key") or normalize_phone_key(phone_number),
             "api_id": api_id,
             "api_hash": api_hash,
             "session_string": session_string,
@@ -1,22 +1,103 @@
+import asyncio
+import json
+import threading
 import motor.motor_asyncio
+from pymongo import monitoring
 from config import Config
-from typing import Optional
+from utils.metrics import mongo_seconds
+from utils.perf import perf
+from typing import Optional, Dict, Any, List, Tuple
 import logging
 from datetime import datetime  # ADD THIS IMPORT
 
 logger = logging.getLogger(__name__)
 
+# Where each command keeps the filter shown in the slow query log
+FILTER_FIELDS = {
+    "find": ("filter",),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("query",),
+    "findAndModify": ("query",),
+    "update": ("updates", 0, "q"),
+    "delete": ("deletes", 0, "q"),
+}
+
+def redact_filter(value: Any) -> Any:
+    """Keep the field names and operators of a filter, replace values with ?"""
+    if isinstance(value, dict):
+        return {key: redact_filter(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_filter(item) for item in value[:3]] + (["..."] if len(value) > 3 else [])
+    return "?"
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    """Get the redacted filter shape of a command"""
+    value: Any = command
+    for field in FILTER_FIELDS.get(command_name, ()):
+        try:
+            value = value[field]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return redact_filter(value) if value is not command else None
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Times every MongoDB command by collection and logs the slow ones
+
+    Durations feed the metrics histogram and the /perf report. Commands
+    slower than slow_ms are logged with their filter shape, values redacted.
+    Callbacks run on the driver's threads.
+    """
+    
+    def __init__(self, slow_ms: float = 100):
+        self.slow_ms = slow_ms
+        self.pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self.slow_queries = 0
+    
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get("collection", event.database_name)
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = (collection, event.command)
+    
+    def _finish(self, event, status: str):
+        with self.lock:
+            collection, command = self.pending.pop((event.connection_id, event.request_id), ("unknown", {}))
+        seconds = event.duration_micros / 1e6
+        mongo_seconds.observe(seconds, collection=collection, command=event.command_name, status=status)
+        perf.record(f"mongo:{collection}.{event.command_name}", seconds, status != "ok")
+        
+        if seconds * 1000 >= self.slow_ms:
+            self.slow_queries += 1
+            shape = command_filter(event.command_name, command)
+            logger.warning(
+                f"🐢 Slow MongoDB {event.command_name} on {collection}: {seconds * 1000:.0f}ms "
+                f"({status}), filter={json.dumps(shape, default=str)}"
+            )
+    
+    def succeeded(self, event):
+        self._finish(event, "ok")
+    
+    def failed(self, event):
+        self._finish(event, "error")
+
 class Database:
     def __init__(self):
         self.config = Config()
         self.client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
         self.db: Optional[motor.motor_asyncio.AsyncIOMotorDatabase] = None
+        self.command_monitor = CommandMonitor(slow_ms=self.config.MONGO_SLOW_MS)
         
     async def connect(self):
         """Connect to MongoDB"""
         try:
             logger.info(f"🔌 Connecting to MongoDB: {self.config.MONGO_URI}")
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(self.config.MONGO_URI)
+            self.client = motor.motor_asyncio.AsyncIOMotorClient(
+                self.config.MONGO_URI,
+                event_listeners=[self.command_monitor]
+            )
             self.db = self.client[self.config.DB_NAME]
             
             # Test connection
@@ -35,21 +116,138 @@ class Database:
     async def create_indexes(self):
         """Create database indexes for better performance"""
         try:
-            # Users collection indexes
-            await self.db.users.create_index("user_id", unique=True)
-            
-            # Accounts collection indexes
-            await self.db.accounts.create_index("user_id")
-            await self.db.accounts.create_index("phone_number")
-            await self.db.accounts.create_index([("user_id", 1), ("is_active", 1)])
-            await self.db.accounts.create_index("is_active")
-            await self.db.accounts.create_index("updated_at")
+            # Independent index builds run concurrently
+            await asyncio.gather(
+                # Users collection indexes
+                self.db.users.create_index("user_id", unique=True),
+                
+                # Accounts collection indexes
+                self.db.accounts.create_index("user_id"),
+                self.db.accounts.create_index("phone_number"),
+                self.db.accounts.create_index([("user_id", 1), ("is_active", 1)]),
+                self.db.accounts.create_index("is_active"),
+                self.db.accounts.create_index("updated_at")
+            )
             
             logger.info("✅ Database indexes created")
             
         except Exception as e:
             logger.error(f"❌ Error creating indexes: {e}")
+        
+        # Registration relies on this index to reject duplicate phones,
+        # so startup fails without it
+        await self.create_phone_key_index()
             
+    async def create_phone_key_index(self) -> bool:
+        """
+        Canonical phone key, unique among live accounts
+
+        The index is not built while live accounts share a phone_key. They are
+        logged for an admin to resolve with python -m database.phone_key_migration,
+        returns False until then.
+        """
+        await self.backfill_phone_keys()
+        
+        duplicates = await self.find_duplicate_phone_keys()
+        if duplicates:
+            for group in duplicates:
+                logger.critical(
+                    f"❌ {len(group['accounts'])} live accounts share the phone ending {str(group['_id'])[-4:]}: "
+                    + ", ".join(f"{account['_id']} (user {account.get('user_id')})" for account in group["accounts"])
+                )
+            logger.critical(
+                f"❌ Unique phone_key index not built, {len(duplicates)} phones have duplicate live accounts "
+                f"and duplicate registrations are not prevented. "
+                f"Review them with python -m database.phone_key_migration"
+            )
+            return False
+        
+        try:
+            await self.db.accounts.create_index(
+                "phone_key",
+                unique=True,
+                partialFilterExpression={
+                    "is_deleted": False,
+                    "phone_key": {"$exists": True}
+                }
+            )
+        except Exception as e:
+            logger.critical(f"❌ Could not build the unique phone_key index, duplicate phones are not prevented: {e}")
+            raise
+        return True
+    
+    async def find_duplicate_phone_keys(self) -> List[Dict[str, Any]]:
+        """
+        Groups of live accounts sharing a phone_key, each ordered active and
+        most recently updated first
+        """
+        cursor = self.db.accounts.aggregate([
+            {"$match": {"is_deleted": False, "phone_key": {"$exists": True}}},
+            {"$sort": {"is_active": -1, "updated_at": -1}},
+            {"$group": {
+                "_id": "$phone_key",
+                "accounts": {"$push": {"_id": "$_id", "user_id": "$user_id", "is_active": "$is_active"}},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        return [group async for group in cursor]
+    
+    async def resolve_duplicate_phone_keys(self, groups: List[Dict[str, Any]]) -> int:
+        """
+        Mark all but the first account of each group as a deleted duplicate and
+        take it off its owner's account list, returns the number marked
+        """
+        marked = 0
+        for group in groups:
+            keeper = group["accounts"][0]["_id"]
+            duplicates = [account["_id"] for account in group["accounts"][1:]]
+            result = await self.db.accounts.update_many(
+                {"_id": {"$in": duplicates}},
+                {"$set": {
+                    "is_deleted": True,
+                    "is_active": False,
+                    "duplicate_of": keeper,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+            await self.db.users.update_many(
+                {"accounts": {"$in": duplicates}},
+                {"$pull": {"accounts": {"$in": duplicates}}}
+            )
+            marked += result.modified_count
+            logger.warning(
+                f"⚠️ {len(duplicates)} duplicate accounts for the phone ending {str(group['_id'])[-4:]} "
+                f"marked deleted, kept {keeper}: {duplicates}"
+            )
+        return marked
+    
+    async def backfill_phone_keys(self) -> int:
+        """Compute phone_key for accounts stored before it existed"""
+        from pymongo import UpdateOne
+        from utils.validators import normalize_phone_key
+        
+        cursor = self.db.accounts.find(
+            {"phone_key": {"$exists": False}},
+            {"phone_number": 1}
+        )
+        
+        updates = []
+        async for account in cursor:
+            phone_key = normalize_phone_key(account.get("phone_number", ""))
+            if phone_key:
+                updates.append(UpdateOne(
+                    {"_id": account["_id"]},
+                    {"$set": {"phone_key": phone_key}}
+                ))
+        
+        if not updates:
+            return 0
+        
+        result = await self.db.accounts.bulk_write(updates, ordered=False)
+        logger.info(f"✅ Backfilled phone_key on {result.modified_count} accounts")
+        return result.modified_count
+    
     async def close(self):
         """Close MongoDB connection"""
         if self.client:
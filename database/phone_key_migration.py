@@ -0,0 +1,54 @@
+"""
+One-off migration for live accounts that share a phone number
+
+    python -m database.phone_key_migration           # report only
+    python -m database.phone_key_migration --apply   # resolve and build the index
+
+The unique phone_key index is not built while duplicates exist. With
+--apply every group keeps its active, most recently updated account; the
+others are marked deleted with duplicate_of set and taken off their
+owners' account lists, then the index is built.
+"""
+
+import argparse
+import asyncio
+import sys
+from database.mongodb import db_instance
+
+async def migrate(apply: bool) -> int:
+    if not await db_instance.connect():
+        print("Could not connect to MongoDB")
+        return 1
+
+    try:
+        groups = await db_instance.find_duplicate_phone_keys()
+        if not groups:
+            print("No live accounts share a phone number, the unique index is in place.")
+            return 0
+
+        for group in groups:
+            print(f"Phone ending {str(group['_id'])[-4:]}:")
+            for index, account in enumerate(group["accounts"]):
+                action = "keep" if index == 0 else "mark deleted"
+                state = "active" if account.get("is_active") else "inactive"
+                print(f"  {account['_id']}  user {account.get('user_id')}  {state}  -> {action}")
+
+        if not apply:
+            print(f"\n{len(groups)} phones with duplicates. Nothing changed, rerun with --apply to resolve them.")
+            return 1
+
+        marked = await db_instance.resolve_duplicate_phone_keys(groups)
+        built = await db_instance.create_phone_key_index()
+        print(f"\nMarked {marked} accounts deleted, unique phone_key index {'built' if built else 'still not built'}.")
+        return 0 if built else 1
+    finally:
+        await db_instance.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve live accounts that share a phone number")
+    parser.add_argument("--apply", action="store_true", help="mark the duplicates deleted and build the index")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(migrate(args.apply)))
+
+if __name__ == "__main__":
+    main()
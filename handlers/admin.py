@@ -5,13 +5,18 @@ from telegram.ext import ContextTypes
 from utils.helpers import (
     get_user_accounts, format_account_info,
     check_admin, check_owner, log_to_channel,
-    split_list, get_active_accounts_count
+    split_list, get_active_accounts_count, format_time_delta
 )
 from database.mongodb import (
     get_accounts_collection, get_users_collection,
     get_config_collection, get_admin_logs_collection
 )
 from config import Config
+from utils.conversation import FlowStates
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.monitor import bot_monitor
+from utils.metrics import pyrogram_seconds
 from bson.objectid import ObjectId
 from datetime import datetime
 
@@ -19,15 +24,16 @@ config = Config()
 logger = logging.getLogger(__name__)
 
 # Admin states
-admin_states: Dict[int, Dict] = {}
+admin_states = FlowStates("admin")
 
+@timed()
 async def handle_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /admin command - Admin panel"""
     user_id = update.effective_user.id
     
     # Check if user is admin
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ You are not authorized to use admin commands!")
+        await update.effective_message.reply_text("❌ You are not authorized to use admin commands!")
         return
     
     keyboard = [
@@ -52,49 +58,17 @@ async def handle_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "🔧 **Admin Panel**\n\n"
         "Select an option:",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
-async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle admin callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    # Check admin access
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    # Route to appropriate handler
-    if data == "admin_all_accounts":
-        await show_all_accounts(query, context)
-    elif data == "admin_remove_menu":
-        await admin_remove_menu(query, context)
-    elif data == "admin_refresh":
-        await admin_refresh_accounts(query, context)
-    elif data == "admin_set_string":
-        await set_string_channel(query, context)
-    elif data == "admin_remove_string":
-        await remove_string_channel(query, context)
-    elif data == "admin_management":
-        await admin_management_menu(query, context)
-    elif data == "admin_account_settings":
-        await account_settings_menu(query, context)
-    elif data == "admin_stats":
-        await show_bot_stats(query, context)
-    elif data.startswith("admin_log_"):
-        await handle_log_channel_setup(query, context, data)
-    elif data.startswith("admin_action_"):
-        await handle_admin_action(query, context, data)
-    elif data == "admin_back":
-        await handle_admin(update, context)
+async def show_all_accounts_page(query, context, page: int):
+    """Show a page of all accounts in the system"""
+    context.user_data["admin_account_page"] = page
+    await show_all_accounts(query, context)
 
 async def show_all_accounts(query, context):
     """Show all accounts in the system"""
@@ -277,8 +251,10 @@ async def check_account_status(account):
             session_string=account['session_string']
         )
         
-        await app.connect()
-        await app.get_me()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
+        with pyrogram_seconds.time(operation="get_me"):
+            await app.get_me()
         await app.disconnect()
         
         return {"status": "active"}
@@ -413,7 +389,7 @@ async def show_bot_stats(query, context):
         f"🟢 Active Accounts: {active_accounts}\n"
         f"❄️ Frozen Accounts: {frozen_accounts}\n"
         f"📈 New Today: {recent_accounts}\n\n"
-        f"⚙️ Bot Uptime: N/A\n"
+        f"⚙️ Bot Uptime: {format_time_delta(bot_monitor.uptime_seconds())}\n"
         f"🔄 Last Refresh: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
     )
     
@@ -430,10 +406,10 @@ async def show_bot_stats(query, context):
         parse_mode="Markdown"
     )
 
-async def handle_log_channel_setup(query, context, data):
+@timed()
+async def handle_log_channel_setup(query, context, log_type: str):
     """Handle log channel setup"""
     user_id = query.from_user.id
-    log_type = data.replace("admin_log_", "").replace("set_", "")
     
     admin_states[user_id] = {
         "action": f"set_{log_type}_log",
@@ -458,6 +434,7 @@ async def handle_log_channel_setup(query, context, data):
         parse_mode="Markdown"
     )
 
+@timed()
 async def handle_admin_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle admin-related messages"""
     user_id = update.effective_user.id
@@ -604,6 +581,77 @@ async def process_log_channel_input_admin(update, context, text, state):
         logger.error(f"Error setting log channel: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+async def prompt_admin_change(query, context, action: str):
+    """Ask the owner for the user ID to add or remove as admin"""
+    admin_states[query.from_user.id] = {"action": f"{action}_admin"}
+    
+    await query.edit_message_text(
+        f"👨‍💼 **{action.title()} Admin**\n\n"
+        f"Send the user ID to {action} as admin.\n\n"
+        f"To cancel, send /cancel",
+        parse_mode="Markdown"
+    )
+
+async def parse_admin_target(update, text) -> Optional[int]:
+    """User ID from the owner's message, None after telling them it is invalid"""
+    if not await check_owner(update.effective_user.id):
+        await update.message.reply_text("❌ Only owner can manage admins!")
+        return None
+    
+    text = text.strip()
+    if not text.lstrip("-").isdigit():
+        await update.message.reply_text("❌ Please send a numeric user ID!")
+        return None
+    return int(text)
+
+async def process_add_admin(update, context, text):
+    """Process add admin input"""
+    target_id = await parse_admin_target(update, text)
+    if target_id is None:
+        return
+    
+    try:
+        config_collection = await get_config_collection()
+        users_collection = await get_users_collection()
+        await config_collection.update_one({}, {"$addToSet": {"admins": target_id}}, upsert=True)
+        await users_collection.update_one(
+            {"user_id": target_id},
+            {"$set": {"is_admin": True, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        
+        await update.message.reply_text(f"✅ User {target_id} is now an admin!")
+        await log_admin_action(update.effective_user.id, "add_admin", details={"user_id": target_id})
+        
+    except Exception as e:
+        logger.error(f"Error adding admin: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def process_remove_admin(update, context, text):
+    """Process remove admin input"""
+    target_id = await parse_admin_target(update, text)
+    if target_id is None:
+        return
+    
+    try:
+        config_collection = await get_config_collection()
+        users_collection = await get_users_collection()
+        await config_collection.update_one({}, {"$pull": {"admins": target_id}})
+        result = await users_collection.update_one(
+            {"user_id": target_id, "is_admin": True},
+            {"$set": {"is_admin": False, "updated_at": datetime.utcnow()}}
+        )
+        
+        if result.modified_count:
+            await update.message.reply_text(f"✅ User {target_id} is no longer an admin!")
+        else:
+            await update.message.reply_text(f"ℹ️ User {target_id} was not an admin.")
+        await log_admin_action(update.effective_user.id, "remove_admin", details={"user_id": target_id})
+        
+    except Exception as e:
+        logger.error(f"Error removing admin: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
 async def log_admin_action(admin_id: int, action: str, details: Dict = None):
     """Log admin actions"""
     admin_logs_collection = await get_admin_logs_collection()
@@ -616,3 +664,21 @@ async def log_admin_action(admin_id: int, action: str, details: Dict = None):
     }
     
     await admin_logs_collection.insert_one(log_entry)
+
+# Callback routes
+LOG_TYPES = "report|send|otp|join|leave"
+
+callback_router.add("admin_all_accounts", show_all_accounts, guard=check_admin)
+callback_router.add("admin_accounts_page_{page:int}", show_all_accounts_page, guard=check_admin)
+callback_router.add("admin_remove_menu", admin_remove_menu, guard=check_admin)
+callback_router.add("admin_refresh", admin_refresh_accounts, guard=check_admin)
+callback_router.add("admin_set_string", set_string_channel, guard=check_admin)
+callback_router.add("admin_remove_string", remove_string_channel, guard=check_admin)
+callback_router.add("admin_management", admin_management_menu, guard=check_admin)
+callback_router.add("admin_list", admin_management_menu, guard=check_owner)
+callback_router.add("admin_{action:add|remove}", prompt_admin_change, guard=check_owner)
+callback_router.add("admin_account_settings", account_settings_menu, guard=check_admin)
+callback_router.add("admin_stats", show_bot_stats, guard=check_admin)
+callback_router.add(f"admin_log_{{log_type:{LOG_TYPES}}}", handle_log_channel_setup, guard=check_admin)
+callback_router.add(f"admin_set_{{log_type:{LOG_TYPES}}}_log", handle_log_channel_setup, guard=check_admin)
+callback_router.add("admin_back", handle_admin, with_update=True)
@@ -1,7 +1,7 @@
 import logging
 import asyncio
 import re
-from typing import Dict, List, Optional
+from typing import List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.helpers import (
@@ -10,27 +10,27 @@ from utils.helpers import (
 )
 from database.mongodb import get_accounts_collection
 from config import Config
-from pyrogram import Client
-from pyrogram.errors import (
-    FloodWait, UsernameInvalid, InviteHashInvalid,
-    UserAlreadyParticipant, ChannelPrivate
-)
+from utils.conversation import FlowStates
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.task_manager import task_manager, TaskLimitError
+from utils.metrics import pyrogram_seconds
+from datetime import datetime
 
 config = Config()
 logger = logging.getLogger(__name__)
 
 # States for join/leave operations
-join_states: Dict[int, Dict] = {}
-leave_states: Dict[int, Dict] = {}
-active_join_tasks: Dict[int, asyncio.Task] = {}
-active_leave_tasks: Dict[int, asyncio.Task] = {}
+join_states = FlowStates("join")
+leave_states = FlowStates("leave")
 
+@timed()
 async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /join command"""
     user_id = update.effective_user.id
     
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
     join_states[user_id] = {
@@ -38,7 +38,7 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "step": "get_target"
     }
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "👥 **Join Groups/Channels**\n\n"
         "Send the group/channel link or username:\n"
         "• For single group: @username or https://t.me/username\n"
@@ -48,12 +48,13 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+@timed()
 async def handle_leave(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /leave command"""
     user_id = update.effective_user.id
     
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
     leave_states[user_id] = {
@@ -61,7 +62,7 @@ async def handle_leave(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "step": "get_target"
     }
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "🚪 **Leave Groups/Channels**\n\n"
         "Send the group/channel link or username:\n"
         "• For single group: @username or https://t.me/username\n"
@@ -71,44 +72,7 @@ async def handle_leave(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
-async def handle_join_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle join callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    if data == "join_start":
-        await start_join_process(query, context)
-    elif data == "join_stop":
-        await stop_join_process(query, context)
-    elif data == "join_back":
-        await handle_join(update, context)
-
-async def handle_leave_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle leave callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    if data == "leave_start":
-        await start_leave_process(query, context)
-    elif data == "leave_stop":
-        await stop_leave_process(query, context)
-    elif data == "leave_back":
-        await handle_leave(update, context)
-
+@timed()
 async def handle_join_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle join message input"""
     user_id = update.effective_user.id
@@ -161,6 +125,7 @@ async def handle_join_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         if user_id in join_states:
             del join_states[user_id]
 
+@timed()
 async def handle_leave_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle leave message input"""
     user_id = update.effective_user.id
@@ -234,10 +199,15 @@ async def start_join_process(query, context):
         return
     
     # Start join task
-    task = asyncio.create_task(
-        join_targets_task(context, accounts, targets, user_id)
-    )
-    active_join_tasks[user_id] = task
+    try:
+        task_manager.spawn(
+            join_targets_task(context, accounts, targets, user_id),
+            owner=user_id,
+            kind="join"
+        )
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
     
     await query.edit_message_text(
         f"🚀 **Starting Join Process**\n\n"
@@ -270,10 +240,15 @@ async def start_leave_process(query, context):
         return
     
     # Start leave task
-    task = asyncio.create_task(
-        leave_targets_task(context, accounts, targets, user_id)
-    )
-    active_leave_tasks[user_id] = task
+    try:
+        task_manager.spawn(
+            leave_targets_task(context, accounts, targets, user_id),
+            owner=user_id,
+            kind="leave"
+        )
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
     
     await query.edit_message_text(
         f"🚀 **Starting Leave Process**\n\n"
@@ -308,19 +283,11 @@ async def join_targets_task(context, accounts, targets, user_id):
         )
     
     for account in accounts:
-        # Check if task was stopped
-        if user_id not in active_join_tasks:
-            break
-        
         account_success = 0
         account_failed = 0
         
         for target in targets:
             try:
-                # Check if task was stopped
-                if user_id not in active_join_tasks:
-                    break
-                
                 result = await join_single_target(account, target)
                 
                 if result:
@@ -358,9 +325,6 @@ async def join_targets_task(context, accounts, targets, user_id):
         await asyncio.sleep(3)
     
     # Clean up
-    if user_id in active_join_tasks:
-        del active_join_tasks[user_id]
-    
     if user_id in join_states:
         del join_states[user_id]
     
@@ -424,19 +388,11 @@ async def leave_targets_task(context, accounts, targets, user_id):
         )
     
     for account in accounts:
-        # Check if task was stopped
-        if user_id not in active_leave_tasks:
-            break
-        
         account_success = 0
         account_failed = 0
         
         for target in targets:
             try:
-                # Check if task was stopped
-                if user_id not in active_leave_tasks:
-                    break
-                
                 result = await leave_single_target(account, target)
                 
                 if result:
@@ -474,9 +430,6 @@ async def leave_targets_task(context, accounts, targets, user_id):
         await asyncio.sleep(3)
     
     # Clean up
-    if user_id in active_leave_tasks:
-        del active_leave_tasks[user_id]
-    
     if user_id in leave_states:
         del leave_states[user_id]
     
@@ -519,6 +472,12 @@ async def leave_targets_task(context, accounts, targets, user_id):
 
 async def join_single_target(account, target):
     """Join a single target from an account"""
+    from pyrogram import Client
+    from pyrogram.errors import (
+        FloodWait, UsernameInvalid, InviteHashInvalid,
+        UserAlreadyParticipant, ChannelPrivate
+    )
+    
     try:
         # Create Pyrogram client
         app = Client(
@@ -528,7 +487,8 @@ async def join_single_target(account, target):
             session_string=account['session_string']
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
         # Check if it's a chat folder link
         if "addlist" in target:
@@ -560,6 +520,9 @@ async def join_single_target(account, target):
 
 async def leave_single_target(account, target):
     """Leave a single target from an account"""
+    from pyrogram import Client
+    from pyrogram.errors import FloodWait
+    
     try:
         # Create Pyrogram client
         app = Client(
@@ -569,7 +532,8 @@ async def leave_single_target(account, target):
             session_string=account['session_string']
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
         # Check if it's a chat folder link
         if "addlist" in target:
@@ -682,9 +646,7 @@ async def stop_join_process(query, context):
     """Stop join process"""
     user_id = query.from_user.id
     
-    if user_id in active_join_tasks:
-        active_join_tasks[user_id].cancel()
-        del active_join_tasks[user_id]
+    task_manager.cancel(user_id, "join")
     
     if user_id in join_states:
         del join_states[user_id]
@@ -695,11 +657,17 @@ async def stop_leave_process(query, context):
     """Stop leave process"""
     user_id = query.from_user.id
     
-    if user_id in active_leave_tasks:
-        active_leave_tasks[user_id].cancel()
-        del active_leave_tasks[user_id]
+    task_manager.cancel(user_id, "leave")
     
     if user_id in leave_states:
         del leave_states[user_id]
     
     await query.edit_message_text("🛑 Leave process stopped!")
+
+# Callback routes
+callback_router.add("join_start", start_join_process, guard=check_admin)
+callback_router.add("join_stop", stop_join_process, guard=check_admin)
+callback_router.add("join_back", handle_join, with_update=True)
+callback_router.add("leave_start", start_leave_process, guard=check_admin)
+callback_router.add("leave_stop", stop_leave_process, guard=check_admin)
+callback_router.add("leave_back", handle_leave, with_update=True)
@@ -1,16 +1,34 @@
 import logging
 import asyncio
-from typing import Dict, Any
+import time
+from typing import Dict
 from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime
 import re
+from config import Config
+from utils.login_store import LoginStateStore
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.validators import normalize_phone_key
+from utils.metrics import pyrogram_seconds
 
 logger = logging.getLogger(__name__)
 
-# Store login states
-login_states: Dict[int, Dict[str, Any]] = {}
+# Attempts to link a saved account to its user before it is rolled back
+ACCOUNT_LINK_RETRIES = 3
 
+# Store login states; idle clients are disconnected per step timeout
+login_states = LoginStateStore(
+    step_timeout=Config.LOGIN_STEP_TIMEOUT,
+    step_timeouts={
+        "otp": Config.LOGIN_CODE_TIMEOUT,
+        "password": Config.LOGIN_CODE_TIMEOUT
+    },
+    max_pending=Config.MAX_PENDING_LOGINS
+)
+
+@timed()
 async def handle_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /login command"""
     user_id = update.effective_user.id
@@ -43,6 +61,15 @@ async def handle_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Error checking account limits. Please try again.")
         return
     
+    # Drop any previous login still pending for this user
+    await login_states.discard(user_id)
+    
+    if login_states.is_full():
+        await update.message.reply_text(
+            "⏳ Too many logins are in progress right now. Please try again in a few minutes."
+        )
+        return
+    
     # Initialize login state
     login_states[user_id] = {
         "step": "api_id",
@@ -75,6 +102,7 @@ def validate_phone_number(phone: str) -> bool:
     
     return True
 
+@timed()
 async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle login process messages"""
     user_id = update.effective_user.id
@@ -99,7 +127,7 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 return
             
             state["data"]["api_id"] = api_id
-            state["step"] = "api_hash"
+            login_states.set_step(user_id, "api_hash")
             
             await update.message.reply_text(
                 "✅ API ID saved!\n\n"
@@ -115,7 +143,7 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 return
             
             state["data"]["api_hash"] = text
-            state["step"] = "phone_number"
+            login_states.set_step(user_id, "phone_number")
             
             await update.message.reply_text(
                 "✅ API Hash saved!\n\n"
@@ -133,14 +161,22 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 )
                 return
             
+            phone_key = normalize_phone_key(text)
+            if not phone_key:
+                await update.message.reply_text(
+                    "❌ Invalid phone number format!\n"
+                    "Please use international format: +1234567890"
+                )
+                return
+            
             # Check if phone number already exists
             try:
                 from database.mongodb import get_accounts_collection
                 accounts_collection = await get_accounts_collection()
-                existing_account = await accounts_collection.find_one({
-                    "phone_number": text,
-                    "is_deleted": False
-                })
+                existing_account = await accounts_collection.find_one(
+                    {"phone_key": phone_key, "is_deleted": False},
+                    {"_id": 1}
+                )
                 
                 if existing_account:
                     await update.message.reply_text(
@@ -153,7 +189,8 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 logger.error(f"Error checking existing account: {e}")
             
             state["data"]["phone_number"] = text
-            state["step"] = "account_name"
+            state["data"]["phone_key"] = phone_key
+            login_states.set_step(user_id, "account_name")
             
             await update.message.reply_text(
                 "✅ Phone number saved!\n\n"
@@ -183,6 +220,7 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 return
             
             state["data"]["otp_code"] = text
+            state["submitted_at"] = time.monotonic()
             await verify_otp(update, context, state)
             
         elif step == "password":
@@ -191,6 +229,7 @@ async def handle_login_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 return
             
             state["data"]["password"] = text
+            state["submitted_at"] = time.monotonic()
             await verify_password(update, context, state)
             
     except Exception as e:
@@ -231,7 +270,8 @@ async def start_pyrogram_login(update: Update, context: ContextTypes.DEFAULT_TYP
             workdir="sessions"
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
         # Send verification code
         sent_code = await app.send_code(phone_number=phone)
@@ -239,7 +279,7 @@ async def start_pyrogram_login(update: Update, context: ContextTypes.DEFAULT_TYP
         # Store app instance and phone code hash
         state["app"] = app
         state["data"]["phone_code_hash"] = sent_code.phone_code_hash
-        state["step"] = "otp"
+        login_states.set_step(user_id, "otp")
         
         await update.message.reply_text(
             "📲 **Verification Code Sent!**\n\n"
@@ -313,7 +353,7 @@ async def verify_otp(update: Update, context: ContextTypes.DEFAULT_TYPE, state:
         
     except SessionPasswordNeeded:
         # 2FA password required
-        state["step"] = "password"
+        login_states.set_step(user_id, "password")
         await update.message.reply_text(
             "🔒 **Two-Step Verification Required**\n\n"
             "This account has 2FA enabled.\n"
@@ -328,7 +368,7 @@ async def verify_otp(update: Update, context: ContextTypes.DEFAULT_TYPE, state:
             "Send the correct OTP:"
         )
         # Keep in OTP step
-        state["step"] = "otp"
+        login_states.set_step(user_id, "otp")
         
     except PhoneCodeExpired:
         await update.message.reply_text(
@@ -385,7 +425,7 @@ async def verify_password(update: Update, context: ContextTypes.DEFAULT_TYPE, st
             "To cancel, send /cancel"
         )
         # Stay in password step
-        state["step"] = "password"
+        login_states.set_step(user_id, "password")
 
 async def complete_session_setup(update: Update, context: ContextTypes.DEFAULT_TYPE, state: Dict, signed_in):
     """Complete session setup and save to database"""
@@ -397,10 +437,16 @@ async def complete_session_setup(update: Update, context: ContextTypes.DEFAULT_T
         session_string = await app.export_session_string()
         
         # Get user info
-        me = await app.get_me()
+        with pyrogram_seconds.time(operation="get_me"):
+            me = await app.get_me()
         
         # Save to database
-        await save_account_to_db(update, context, state, session_string, me)
+        if not await save_account_to_db(update, context, state, session_string, me):
+            await update.message.reply_text(
+                "❌ This phone number is already registered!\n"
+                "Please use a different number or contact admin."
+            )
+            return
         
         # Success message
         await update.message.reply_text(
@@ -413,6 +459,12 @@ async def complete_session_setup(update: Update, context: ContextTypes.DEFAULT_T
             f"Use `/set` to manage your accounts."
         )
         
+        # Code submission to success reply
+        if "submitted_at" in state:
+            elapsed = time.monotonic() - state["submitted_at"]
+            login_states.record_completion(elapsed)
+            logger.info(f"⏱️ Login completed for {user_id} in {elapsed:.3f}s")
+        
     except Exception as e:
         logger.error(f"❌ Session setup error: {e}", exc_info=True)
         await update.message.reply_text(
@@ -426,16 +478,26 @@ async def complete_session_setup(update: Update, context: ContextTypes.DEFAULT_T
         if user_id in login_states:
             del login_states[user_id]
 
-async def save_account_to_db(update: Update, context: ContextTypes.DEFAULT_TYPE, state: Dict, session_string: str, me):
-    """Save account to MongoDB"""
+async def save_account_to_db(update: Update, context: ContextTypes.DEFAULT_TYPE, state: Dict, session_string: str, me) -> bool:
+    """Save account to MongoDB, returns False if the phone number is already registered"""
     from database.mongodb import get_accounts_collection, get_users_collection
+    from pymongo.errors import DuplicateKeyError
+    from bson.objectid import ObjectId
     
     accounts_collection = await get_accounts_collection()
     users_collection = await get_users_collection()
     
+    user_id = update.effective_user.id
+    phone_key = state["data"]["phone_key"]
+    now = datetime.utcnow()
+    
+    # Generate the id up front so both writes can go out together
+    account_id = ObjectId()
+    
     # Create account document
     account_data = {
-        "user_id": update.effective_user.id,
+        "_id": account_id,
+        "user_id": user_id,
         "phone_number": state["data"]["phone_number"],
         "api_id": state["data"]["api_id"],
         "api_hash": state["data"]["api_hash"],
@@ -447,72 +509,100 @@ async def save_account_to_db(update: Update, context: ContextTypes.DEFAULT_TYPE,
         "telegram_id": me.id,
         "is_active": True,
         "is_frozen": False,
-        "is_deleted": False,
         "two_step_enabled": "password" in state["data"],
-        "last_seen": datetime.utcnow(),
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "last_seen": now,
+        "created_at": now,
+        "updated_at": now
     }
     
-    # Insert account
-    result = await accounts_collection.insert_one(account_data)
+    # Insert account atomically; the unique phone_key index settles races
+    insert_account = accounts_collection.update_one(
+        {"phone_key": phone_key, "is_deleted": False},
+        {"$setOnInsert": account_data},
+        upsert=True
+    )
     
     # Update user document
-    await users_collection.update_one(
-        {"user_id": update.effective_user.id},
-        {
-            "$set": {
-                "username": update.effective_user.username,
-                "first_name": update.effective_user.first_name,
-                "last_name": update.effective_user.last_name,
-                "updated_at": datetime.utcnow()
-            },
-            "$addToSet": {"accounts": result.inserted_id},
-            "$setOnInsert": {
-                "is_admin": False,
-                "is_owner": update.effective_user.id == context.bot.id,
-                "created_at": datetime.utcnow()
-            }
+    user_update = {
+        "$set": {
+            "username": update.effective_user.username,
+            "first_name": update.effective_user.first_name,
+            "last_name": update.effective_user.last_name,
+            "updated_at": now
         },
-        upsert=True
+        "$addToSet": {"accounts": account_id},
+        "$setOnInsert": {
+            "is_admin": False,
+            "is_owner": user_id == context.bot.id,
+            "created_at": now
+        }
+    }
+    
+    # Two commands, sent concurrently so the reply waits about one round
+    # trip instead of two. A standalone server has no transactions, so a
+    # failure of either write is compensated below.
+    account_result, user_result = await asyncio.gather(
+        insert_account,
+        users_collection.update_one({"user_id": user_id}, user_update, upsert=True),
+        return_exceptions=True
     )
     
-    # Log to main channel if configured
-    try:
-        from config import Config
-        from utils.helpers import log_to_channel
-        
-        config = Config()
-        if config.MAIN_LOG_CHANNEL:
-            await log_to_channel(
-                context.bot,
-                config.MAIN_LOG_CHANNEL,
-                f"✅ **New Account Added**\n\n"
-                f"👤 **User:** {update.effective_user.id}\n"
-                f"📱 **Account:** {state['data']['account_name']}\n"
-                f"📞 **Phone:** {state['data']['phone_number']}\n"
-                f"👥 **Telegram:** @{me.username if me.username else 'No username'}"
+    account_failed = isinstance(account_result, Exception)
+    if account_failed or account_result.upserted_id is None:
+        # No account was written, undo the user link
+        try:
+            await users_collection.update_one(
+                {"user_id": user_id},
+                {"$pull": {"accounts": account_id}}
             )
-    except Exception as e:
-        logger.error(f"Error logging to channel: {e}")
-
-async def handle_login_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle login callback queries"""
-    query = update.callback_query
-    await query.answer()
+        except Exception as e:
+            logger.error(f"❌ Could not unlink unsaved account {account_id} from user {user_id}: {e}")
+        
+        if account_failed and not isinstance(account_result, DuplicateKeyError):
+            raise account_result
+        # Lost the race to another login
+        return False
     
-    # Handle different callback actions
-    data = query.data
+    if isinstance(user_result, Exception):
+        await link_account_to_user(accounts_collection, users_collection, user_id, account_id, user_update, user_result)
     
-    if data == "login_cancel":
-        user_id = query.from_user.id
-        if user_id in login_states:
-            app = login_states[user_id].get("app")
-            if app:
-                try:
-                    await app.disconnect()
-                except:
-                    pass
-            del login_states[user_id]
-        
-        await query.edit_message_text("❌ Login cancelled!")
+    # Log to main channel, queued for the next digest
+    from config import Config
+    from utils.helpers import log_to_channel
+    
+    config = Config()
+    if config.MAIN_LOG_CHANNEL:
+        await log_to_channel(
+            context.bot,
+            config.MAIN_LOG_CHANNEL,
+            f"✅ **New Account Added**\n\n"
+            f"👤 **User:** {user_id}\n"
+            f"📱 **Account:** {state['data']['account_name']}\n"
+            f"📞 **Phone:** {state['data']['phone_number']}\n"
+            f"👥 **Telegram:** @{me.username if me.username else 'No username'}"
+        )
+    
+    return True
+
+async def link_account_to_user(accounts_collection, users_collection, user_id: int, account_id, user_update: Dict, error: Exception):
+    """Retry linking a saved account to its user, remove the account if that keeps failing"""
+    for attempt in range(1, ACCOUNT_LINK_RETRIES + 1):
+        logger.warning(f"⚠️ Linking account {account_id} to user {user_id} failed ({error}), retry {attempt}")
+        await asyncio.sleep(0.2 * attempt)
+        try:
+            await users_collection.update_one({"user_id": user_id}, user_update, upsert=True)
+            return
+        except Exception as e:
+            error = e
+    
+    logger.error(f"❌ Could not link account {account_id} to user {user_id}, removing it: {error}")
+    await accounts_collection.delete_one({"_id": account_id})
+    raise error
+
+async def cancel_login(query, context):
+    """Cancel a pending login from its inline button"""
+    await login_states.discard(query.from_user.id)
+    await query.edit_message_text("❌ Login cancelled!")
+
+# Callback routes
+callback_router.add("login_cancel", cancel_login)
@@ -7,24 +7,39 @@ from utils.helpers import (
     check_admin, log_to_channel,
     get_user_accounts, split_list
 )
+from utils.otp_parser import extract_otp_from_text
+from utils.otp_store import otp_store
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.task_manager import task_manager, TaskLimitError
 from database.mongodb import get_accounts_collection
 from config import Config
-from pyrogram import Client
-from pyrogram.errors import FloodWait
+from utils.metrics import pyrogram_seconds
+from bson.objectid import ObjectId
+from datetime import datetime
 
 config = Config()
 logger = logging.getLogger(__name__)
 
 # OTP states
 otp_states: Dict[int, Dict] = {}
-active_otp_tasks: Dict[int, asyncio.Task] = {}
 
+# Telegram service notifications account that sends login codes
+SERVICE_USER_ID = 777000
+
+# OTP sweep results shown per page
+OTP_RESULTS_PER_PAGE = 10
+
+# Service messages read per history request
+OTP_HISTORY_PAGE_SIZE = 20
+
+@timed()
 async def handle_otp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /otp command"""
     user_id = update.effective_user.id
     
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
     keyboard = [
@@ -35,36 +50,13 @@ async def handle_otp(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "📲 **OTP Manager**\n\n"
         "Select an option:",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
-async def handle_otp_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle OTP callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    if data == "otp_single":
-        await select_account_for_otp(query, context)
-    elif data == "otp_all":
-        await get_all_otps(query, context)
-    elif data == "otp_refresh":
-        await refresh_otps(query, context)
-    elif data.startswith("otp_account_"):
-        await get_account_otp(query, context, data)
-    elif data == "otp_back":
-        await handle_otp(update, context)
-
 async def select_account_for_otp(query, context):
     """Select account to get OTP from"""
     user_id = query.from_user.id
@@ -131,13 +123,10 @@ async def select_account_for_otp(query, context):
         parse_mode="Markdown"
     )
 
-async def get_account_otp(query, context, data):
+async def get_account_otp(query, context, account_id: ObjectId):
     """Get OTP from specific account"""
     user_id = query.from_user.id
     
-    # Extract account ID
-    account_id = data.replace("otp_account_", "")
-    
     accounts_collection = await get_accounts_collection()
     account = await accounts_collection.find_one({"_id": account_id})
     
@@ -171,6 +160,9 @@ async def get_account_otp(query, context, data):
                 InlineKeyboardButton("📩 Forward Latest OTP", callback_data=f"otp_forward_{account_id}")
             ])
         
+        keyboard.append([
+            InlineKeyboardButton("⏳ Await Next Code", callback_data=f"otp_wait_{account_id}")
+        ])
         keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="otp_back")])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -193,13 +185,158 @@ async def get_account_otp(query, context, data):
                 f"🔢 Latest OTP: {otp_info[0].get('code', 'N/A')}"
             )
     else:
+        keyboard = [
+            [InlineKeyboardButton("⏳ Await Next Code", callback_data=f"otp_wait_{account_id}")],
+            [InlineKeyboardButton("⬅️ Back", callback_data="otp_back")]
+        ]
+        
         await query.edit_message_text(
             f"❌ No OTP found for {account.get('account_name')}!\n"
-            f"The account might not have received any OTPs recently."
+            f"The account might not have received any OTPs recently.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+async def await_account_otp(query, context, account_id: ObjectId):
+    """Listen for the next login code on a specific account"""
+    user_id = query.from_user.id
+    
+    if task_manager.is_running(user_id, "otp_listen"):
+        await query.edit_message_text("⏳ Already waiting for a code on another account!")
+        return
+    
+    accounts_collection = await get_accounts_collection()
+    account = await accounts_collection.find_one({"_id": account_id})
+    
+    if not account:
+        await query.edit_message_text("❌ Account not found!")
+        return
+    
+    try:
+        task_manager.spawn(
+            await_account_otp_task(context, account, user_id),
+            owner=user_id,
+            kind="otp_listen"
+        )
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
+    
+    await query.edit_message_text(
+        f"⏳ **Waiting for Next Code**\n\n"
+        f"🏷️ Account: {account.get('account_name', 'N/A')}\n"
+        f"📱 Phone: {account.get('phone_number', 'N/A')}\n\n"
+        f"Request the code now. It will be sent here the moment it arrives.\n"
+        f"Listening for {config.OTP_LISTEN_TIMEOUT} seconds.",
+        parse_mode="Markdown"
+    )
+
+async def await_account_otp_task(context, account, user_id):
+    """Task to wait for the next login code and deliver it to the admin"""
+    otp = await wait_for_next_otp(account, config.OTP_LISTEN_TIMEOUT)
+    
+    if otp:
+        message = (
+            f"📲 **New Login Code**\n\n"
+            f"🏷️ Account: {account.get('account_name', 'N/A')}\n"
+            f"📱 Phone: {account.get('phone_number', 'N/A')}\n"
+            f"🔢 Code: `{otp['code']}`\n"
+            f"📅 Received: {otp['time']}"
+        )
+    else:
+        message = (
+            f"⌛ No code received for {account.get('account_name', 'N/A')} "
+            f"within {config.OTP_LISTEN_TIMEOUT} seconds."
+        )
+    
+    try:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=message,
+            parse_mode="Markdown"
         )
+    except:
+        pass
+    
+    # Log to OTP channel
+    if config.OTP_LOG_CHANNEL and otp:
+        await log_to_channel(
+            context.bot,
+            config.OTP_LOG_CHANNEL,
+            f"📲 **OTP Received**\n\n"
+            f"👤 Admin: {user_id}\n"
+            f"🏷️ Account: {account.get('account_name', 'N/A')}\n"
+            f"📱 Phone: {account.get('phone_number', 'N/A')}\n"
+            f"🔢 Code: {otp['code']}"
+        )
+
+async def wait_for_next_otp(account, timeout: int) -> Optional[Dict]:
+    """Wait up to timeout seconds for a login code pushed to an account"""
+    from pyrogram import Client, filters as pyrogram_filters
+    from pyrogram.errors import FloodWait
+    from pyrogram.handlers import MessageHandler as PyrogramMessageHandler
+    
+    loop = asyncio.get_running_loop()
+    received = loop.create_future()
+    
+    async def on_service_message(client, message):
+        text = message.text or message.caption
+        otp = extract_otp_from_text(text)
+        if otp and not received.done():
+            date = datetime.utcfromtimestamp(message.date.timestamp())
+            received.set_result({
+                "id": message.id,
+                "code": otp,
+                "date": date,
+                "time": date.strftime("%Y-%m-%d %H:%M:%S"),
+                "source": "Telegram",
+                "text": text[:50] + "..."
+            })
+    
+    app = Client(
+        f"otp_listen_{account['phone_number']}",
+        api_id=account['api_id'],
+        api_hash=account['api_hash'],
+        session_string=account['session_string']
+    )
+    app.add_handler(
+        PyrogramMessageHandler(
+            on_service_message,
+            pyrogram_filters.user(SERVICE_USER_ID)
+        )
+    )
+    
+    try:
+        await app.start()
+        
+        try:
+            otp = await asyncio.wait_for(received, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        
+        # Add the pushed code to the store but leave the watermark alone,
+        # older unread messages are still picked up by the next fetch
+        entry = otp_store.get_stale(account["_id"]) or {}
+        watermarks = dict(entry.get("watermarks") or account.get("otp_watermarks") or {})
+        known_otps = list(entry.get("codes") or account.get("recent_otps") or [])
+        otp_store.put(account["_id"], [otp] + known_otps, watermarks)
+        
+        return otp
+        
+    except FloodWait as e:
+        logger.warning(f"Flood wait for {account['phone_number']}: {e.value}s")
+        return None
+    except Exception as e:
+        logger.error(f"OTP listener failed for {account['phone_number']}: {e}")
+        return None
+    finally:
+        if app.is_connected:
+            try:
+                await app.stop()
+            except Exception as e:
+                logger.error(f"Error stopping OTP listener for {account['phone_number']}: {e}")
 
-async def get_all_otps(query, context):
-    """Get OTPs from all accounts"""
+async def get_all_otps(query, context, force: bool = False):
+    """Get OTPs from all accounts, force skips the OTP store's TTL cache"""
     user_id = query.from_user.id
     
     await query.edit_message_text("📋 Fetching OTPs from all accounts...")
@@ -214,53 +351,54 @@ async def get_all_otps(query, context):
         return
     
     # Start task to get all OTPs
-    task = asyncio.create_task(
-        get_all_otps_task(context, accounts, user_id)
-    )
-    active_otp_tasks[user_id] = task
+    try:
+        task_manager.spawn(
+            get_all_otps_task(context, accounts, user_id, force),
+            owner=user_id,
+            kind="otp_sweep"
+        )
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
     
     await query.edit_message_text(
         f"🚀 **Fetching OTPs from {len(accounts)} accounts**\n\n"
-        f"⏳ This may take a while...\n"
+        f"⏳ Checking {config.OTP_SWEEP_CONCURRENCY} accounts at a time...\n"
         f"Results will be sent here.",
         parse_mode="Markdown"
     )
 
-async def get_all_otps_task(context, accounts, user_id):
+async def get_all_otps_task(context, accounts, user_id, force: bool = False):
     """Task to get OTPs from all accounts"""
-    otp_results = []
-    successful = 0
-    failed = 0
+    semaphore = asyncio.Semaphore(config.OTP_SWEEP_CONCURRENCY)
     
-    for account in accounts:
-        try:
-            # Check if task was stopped
-            if user_id not in active_otp_tasks:
-                break
-            
-            otp_info = await get_single_account_otp(account)
-            
-            if otp_info:
-                otp_results.append({
-                    "account": account,
-                    "otps": otp_info
-                })
-                successful += 1
-            else:
-                failed += 1
-            
-            # Delay between accounts
-            await asyncio.sleep(2)
-            
-        except Exception as e:
-            logger.error(f"OTP fetch error for {account.get('phone_number')}: {e}")
-            failed += 1
-            await asyncio.sleep(5)
+    async def fetch_account_otps(account):
+        async with semaphore:
+            try:
+                return await get_single_account_otp(account, force)
+            except Exception as e:
+                logger.error(f"OTP fetch error for {account.get('phone_number')}: {e}")
+                return None
+    
+    # Sweep accounts with bounded concurrency; results land in the OTP store
+    results = await asyncio.gather(
+        *(fetch_account_otps(account) for account in accounts)
+    )
     
-    # Clean up
-    if user_id in active_otp_tasks:
-        del active_otp_tasks[user_id]
+    otp_results = []
+    for account, otps in zip(accounts, results):
+        if otps:
+            otp_results.append({
+                "account_name": account.get("account_name", "Account"),
+                "phone_number": account.get("phone_number", "N/A"),
+                "latest_otp": otps[0].get("code", "None"),
+                "otp_count": len(otps)
+            })
+    
+    successful = len(otp_results)
+    failed = len(accounts) - successful
     
+    # Clean up
     # Send results
     if not otp_results:
         await context.bot.send_message(
@@ -269,71 +407,137 @@ async def get_all_otps_task(context, accounts, user_id):
         )
         return
     
-    # Group results and send
-    for i in range(0, len(otp_results), 10):
-        batch = otp_results[i:i+10]
-        
-        message = f"📋 **OTP Results** ({i+1}-{i+len(batch)} of {len(otp_results)})\n\n"
-        
-        for j, result in enumerate(batch, start=i+1):
-            account = result["account"]
-            otps = result["otps"]
-            
-            latest_otp = otps[0].get("code", "None") if otps else "None"
-            
-            message += (
-                f"{j}. **{account.get('account_name', 'Account')}**\n"
-                f"   📱: {account.get('phone_number', 'N/A')}\n"
-                f"   🔢 Latest OTP: {latest_otp}\n"
-                f"   📅 OTPs found: {len(otps)}\n\n"
-            )
-        
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode="Markdown"
-            )
-        except:
-            pass
-        
-        await asyncio.sleep(1)
-    
-    # Send summary
-    summary = (
-        f"✅ **OTP Fetch Complete**\n\n"
-        f"📊 Statistics:\n"
-        f"✅ Successful: {successful}\n"
-        f"❌ Failed: {failed}\n"
-        f"📈 Total accounts: {len(accounts)}\n"
-        f"🔢 Accounts with OTPs: {len(otp_results)}"
-    )
+    # Keep results for paging through a single message
+    otp_states[user_id] = {
+        "results": otp_results,
+        "total_accounts": len(accounts),
+        "successful": successful,
+        "failed": failed
+    }
+    
+    message, reply_markup = build_otp_results_page(otp_states[user_id], 0)
     
     try:
         await context.bot.send_message(
             chat_id=user_id,
-            text=summary,
+            text=message,
+            reply_markup=reply_markup,
             parse_mode="Markdown"
         )
     except:
         pass
 
+def build_otp_results_page(state: Dict, page: int):
+    """Build OTP results message and keyboard for a page"""
+    results = state["results"]
+    total_pages = (len(results) + OTP_RESULTS_PER_PAGE - 1) // OTP_RESULTS_PER_PAGE
+    page = max(0, min(page, total_pages - 1))
+    start_idx = page * OTP_RESULTS_PER_PAGE
+    
+    message = (
+        f"📋 **OTP Results**\n\n"
+        f"✅ Successful: {state['successful']} | ❌ Failed: {state['failed']}\n"
+        f"📈 Total accounts: {state['total_accounts']}\n\n"
+    )
+    
+    for i, result in enumerate(results[start_idx:start_idx + OTP_RESULTS_PER_PAGE], start=start_idx + 1):
+        message += (
+            f"{i}. **{result['account_name']}**\n"
+            f"   📱: {result['phone_number']}\n"
+            f"   🔢 Latest OTP: {result['latest_otp']}\n"
+            f"   📅 OTPs found: {result['otp_count']}\n\n"
+        )
+    
+    # Navigation buttons
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"otp_results_page_{page-1}"))
+    
+    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="otp_results_page_current"))
+    
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("➡️ Next", callback_data=f"otp_results_page_{page+1}"))
+    
+    return message, InlineKeyboardMarkup([nav_buttons])
+
+async def show_otp_results_page(query, context, page: int):
+    """Show a page of the last OTP sweep results"""
+    user_id = query.from_user.id
+    
+    if user_id not in otp_states or "results" not in otp_states[user_id]:
+        await query.edit_message_text("❌ OTP results expired! Run Get All OTPs again.")
+        return
+    
+    message, reply_markup = build_otp_results_page(otp_states[user_id], page)
+    
+    await query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode="Markdown"
+    )
+
+async def show_otp_accounts_page(query, context, page: int):
+    """Show a page of the OTP account picker"""
+    context.user_data["otp_page"] = page
+    await select_account_for_otp(query, context)
+
 async def refresh_otps(query, context):
     """Refresh and get latest OTPs"""
     user_id = query.from_user.id
     
     await query.edit_message_text("🔄 Refreshing OTPs...")
     
-    # This would typically involve:
-    # 1. Requesting new OTPs from services
-    # 2. Checking for new messages
-    # 3. Updating OTP cache
-    
-    # For now, just get fresh OTPs
-    await get_all_otps(query, context)
+    # Ask Telegram again even for accounts checked within the cache TTL
+    await get_all_otps(query, context, force=True)
+
+async def fetch_history_since(app, source: str, min_id: int) -> List:
+    """
+    Messages of source newer than min_id, paging back until min_id is
+    reached. Without a watermark only the latest page is read, older login
+    codes have expired anyway.
+    """
+    from pyrogram.raw.functions.messages import GetHistory
+    
+    peer = await app.resolve_peer(source)
+    messages = []
+    offset_id = 0
+    while True:
+        history = await app.invoke(
+            GetHistory(
+                peer=peer,
+                offset_id=offset_id,
+                offset_date=0,
+                add_offset=0,
+                limit=OTP_HISTORY_PAGE_SIZE,
+                max_id=0,
+                min_id=min_id,
+                hash=0
+            )
+        )
+        page = [message for message in history.messages if message.id > min_id]
+        messages.extend(page)
+        if not min_id or len(history.messages) < OTP_HISTORY_PAGE_SIZE or not page:
+            return messages
+        offset_id = min(message.id for message in page)
 
-async def get_single_account_otp(account):
-    """Get OTP from a single account"""
+async def get_single_account_otp(account, force: bool = False):
+    """Get OTP from a single account, force skips the OTP store's TTL cache"""
+    from pyrogram import Client
+    from pyrogram.errors import FloodWait
+    
+    account_id = account["_id"]
+    
+    # Serve from the OTP store if this account was checked recently
+    if not force:
+        cached = otp_store.get(account_id)
+        if cached is not None:
+            return cached
+    
+    # Resume from the last processed message id of each source
+    entry = otp_store.get_stale(account_id) or {}
+    watermarks = dict(entry.get("watermarks") or account.get("otp_watermarks") or {})
+    known_otps = list(entry.get("codes") or account.get("recent_otps") or [])
+    
     try:
         # Create Pyrogram client
         app = Client(
@@ -343,10 +547,10 @@ async def get_single_account_otp(account):
             session_string=account['session_string']
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
-        # Get recent messages (last 50)
-        otp_messages = []
+        new_otps = []
         
         # Check different sources for OTPs
         sources = [
@@ -354,29 +558,54 @@ async def get_single_account_otp(account):
             ("Service", "service_notifications"),
         ]
         
-        for source_name, source in sources:
-            try:
-                # Get messages from source
-                async for message in app.get_chat_history(source, limit=20):
-                    if message.text:
-                        # Look for OTP patterns
-                        otp = extract_otp_from_text(message.text)
-                        if otp:
-                            otp_messages.append({
-                                "code": otp,
-                                "time": message.date.strftime("%Y-%m-%d %H:%M:%S"),
-                                "source": source_name,
-                                "text": message.text[:50] + "..."
-                            })
-            except:
-                continue
+        try:
+            for source_name, source in sources:
+                try:
+                    min_id = watermarks.get(source_name, 0)
+                    messages = await fetch_history_since(app, source, min_id)
+                except Exception as e:
+                    # The watermark stays put so the next fetch retries this source
+                    logger.debug(f"OTP history of {source_name} failed for {account['phone_number']}: {e}")
+                    continue
+                
+                for message in messages:
+                    watermarks[source_name] = max(watermarks.get(source_name, 0), message.id)
+                    
+                    text = getattr(message, "message", None)
+                    if not text:
+                        continue
+                    
+                    # Look for OTP patterns
+                    otp = extract_otp_from_text(text)
+                    if otp:
+                        date = datetime.utcfromtimestamp(message.date)
+                        new_otps.append({
+                            "id": message.id,
+                            "code": otp,
+                            "date": date,
+                            "time": date.strftime("%Y-%m-%d %H:%M:%S"),
+                            "source": source_name,
+                            "text": text[:50] + "..."
+                        })
+        finally:
+            await app.disconnect()
         
-        await app.disconnect()
+        # Merge with known OTPs, newest first by real timestamp
+        otp_messages = otp_store.put(account_id, known_otps + new_otps, watermarks)
         
-        # Sort by time (newest first)
-        otp_messages.sort(key=lambda x: x["time"], reverse=True)
+        if watermarks != (account.get("otp_watermarks") or {}):
+            accounts_collection = await get_accounts_collection()
+            await accounts_collection.update_one(
+                {"_id": account_id},
+                {
+                    "$set": {
+                        "otp_watermarks": watermarks,
+                        "recent_otps": otp_messages
+                    }
+                }
+            )
         
-        return otp_messages[:10]  # Return top 10 OTPs
+        return otp_messages
         
     except FloodWait as e:
         logger.warning(f"Flood wait for {account['phone_number']}: {e.value}s")
@@ -386,22 +615,12 @@ async def get_single_account_otp(account):
         logger.error(f"OTP fetch failed for {account['phone_number']}: {e}")
         return []
 
-def extract_otp_from_text(text: str) -> Optional[str]:
-    """Extract OTP from text message"""
-    # Common OTP patterns
-    patterns = [
-        r'\b\d{4,6}\b',  # 4-6 digit OTP
-        r'code[\s:]*(\d{4,6})',
-        r'OTP[\s:]*(\d{4,6})',
-        r'password[\s:]*(\d{4,6})',
-        r'verification[\s:]*(\d{4,6})',
-        r'\b(\d{4,6})\s+is your',
-        r'your code is[\s:]*(\d{4,6})',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            return matches[0]
-    
-    return None
+# Callback routes
+callback_router.add("otp_single", select_account_for_otp, guard=check_admin)
+callback_router.add("otp_all", get_all_otps, guard=check_admin)
+callback_router.add("otp_refresh", refresh_otps, guard=check_admin)
+callback_router.add("otp_page_{page:int}", show_otp_accounts_page, guard=check_admin)
+callback_router.add("otp_account_{account_id:oid}", get_account_otp, guard=check_admin)
+callback_router.add("otp_wait_{account_id:oid}", await_account_otp, guard=check_admin)
+callback_router.add("otp_results_page_{page:int}", show_otp_results_page, guard=check_admin)
+callback_router.add("otp_back", handle_otp, with_update=True)
@@ -0,0 +1,116 @@
+import io
+import logging
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.helpers import check_owner
+from utils.perf import timed
+from utils.profiling import profiler
+from utils.task_manager import task_manager, TaskLimitError
+from config import Config
+
+config = Config()
+logger = logging.getLogger(__name__)
+
+# /profile modes and /heap actions
+PROFILE_MODES = {"cpu", "sample"}
+HEAP_ACTIONS = {"start", "diff", "stop"}
+
+async def send_report(context, chat_id: int, name: str, report: str, caption: str):
+    """Upload a text report to the chat as a document"""
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.txt"
+    await context.bot.send_document(
+        chat_id=chat_id,
+        document=io.BytesIO(report.encode("utf-8")),
+        filename=filename,
+        caption=caption
+    )
+
+async def profile_task(context, chat_id: int, mode: str, seconds: int):
+    """Run a profile in the background and upload the result"""
+    try:
+        if mode == "sample":
+            report = await profiler.sample(seconds, interval=config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        else:
+            report = await profiler.profile(seconds)
+        await send_report(context, chat_id, f"profile-{mode}", report, f"⏱️ {mode} profile, {seconds}s")
+        logger.info(f"⏱️ {mode} profile of {seconds}s sent to {chat_id}")
+    except Exception as e:
+        logger.error(f"❌ Profile failed: {e}")
+        await context.bot.send_message(chat_id=chat_id, text=f"❌ Profile failed: {e}")
+
+@timed()
+async def handle_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /profile command - /profile [seconds] [cpu|sample]"""
+    user_id = update.effective_user.id
+
+    if not await check_owner(user_id):
+        await update.effective_message.reply_text("❌ Owner only command!")
+        return
+
+    seconds = config.PROFILE_DEFAULT_SECONDS
+    mode = "cpu"
+    for arg in context.args or []:
+        if arg.isdigit():
+            seconds = max(1, min(int(arg), config.PROFILE_MAX_SECONDS))
+        elif arg.lower() in PROFILE_MODES:
+            mode = arg.lower()
+        else:
+            await update.effective_message.reply_text(
+                "Usage: /profile [seconds] [cpu|sample]\n\n"
+                "• cpu - cProfile of every call, exact but slows the bot while it runs\n"
+                "• sample - stack samples, low overhead"
+            )
+            return
+
+    if profiler.running:
+        await update.effective_message.reply_text(f"⏳ A {profiler.running} profile is already running.")
+        return
+
+    try:
+        task_manager.spawn(profile_task(context, update.effective_chat.id, mode, seconds), owner=user_id, kind="profile")
+    except TaskLimitError as e:
+        await update.effective_message.reply_text(f"⏳ {e}")
+        return
+
+    await update.effective_message.reply_text(
+        f"⏱️ Profiling the bot for {seconds}s ({mode})...\n"
+        f"The report will be sent here as a file."
+    )
+
+@timed()
+async def handle_heap(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /heap command - /heap start [frames] | diff | stop"""
+    user_id = update.effective_user.id
+
+    if not await check_owner(user_id):
+        await update.effective_message.reply_text("❌ Owner only command!")
+        return
+
+    args = context.args or []
+    action = args[0].lower() if args else "diff"
+    if action not in HEAP_ACTIONS:
+        await update.effective_message.reply_text(
+            "Usage: /heap start [frames] | diff | stop\n\n"
+            "• start - trace allocations and take a baseline snapshot\n"
+            "• diff - top allocation sites and growth since the baseline\n"
+            "• stop - stop tracing and free the snapshots"
+        )
+        return
+
+    try:
+        if action == "start":
+            frames = max(1, min(int(args[1]), 50)) if len(args) > 1 and args[1].isdigit() else 10
+            profiler.heap_start(frames)
+            await update.effective_message.reply_text(
+                f"🧠 Allocation tracing started with {frames} frames.\n"
+                f"Use /heap diff to see what grew, /heap stop when done."
+            )
+        elif action == "stop":
+            profiler.heap_stop()
+            await update.effective_message.reply_text("✅ Allocation tracing stopped.")
+        else:
+            report = await profiler.heap_report()
+            await send_report(context, update.effective_chat.id, "heap", report, "🧠 Heap snapshot diff")
+    except RuntimeError as e:
+        await update.effective_message.reply_text(f"❌ {e}")
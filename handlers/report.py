@@ -1,7 +1,7 @@
 import logging
 import asyncio
 import random
-from typing import Dict, List, Optional
+from typing import List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.helpers import (
@@ -10,15 +10,18 @@ from utils.helpers import (
 )
 from database.mongodb import get_accounts_collection, get_report_jobs_collection
 from config import Config
-from pyrogram import Client
-from pyrogram.errors import FloodWait, PeerIdInvalid
+from utils.conversation import FlowStates
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.task_manager import task_manager, TaskLimitError
+from utils.metrics import pyrogram_seconds
+from datetime import datetime
 
 config = Config()
 logger = logging.getLogger(__name__)
 
 # Report states
-report_states: Dict[int, Dict] = {}
-active_report_tasks: Dict[int, asyncio.Task] = {}
+report_states = FlowStates("report", transient_keys=("accounts",))
 report_reasons = [
     "Child Abuse",
     "Copyright",
@@ -37,12 +40,13 @@ report_reasons = [
     "Other"
 ]
 
+@timed()
 async def handle_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /report command"""
     user_id = update.effective_user.id
     
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
     keyboard = [
@@ -56,55 +60,26 @@ async def handle_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "🚨 **Report Content**\n\n"
         "Select what you want to report:",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
+@timed()
 async def handle_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stop command to stop reporting"""
     user_id = update.effective_user.id
     
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
-    if user_id in active_report_tasks:
-        active_report_tasks[user_id].cancel()
-        del active_report_tasks[user_id]
-        await update.message.reply_text("🛑 Reporting stopped!")
+    if task_manager.cancel(user_id, "report"):
+        await update.effective_message.reply_text("🛑 Reporting stopped!")
     else:
-        await update.message.reply_text("ℹ️ No active reporting process found.")
-
-async def handle_report_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle report callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    if data == "report_stop":
-        await handle_stop(update, context)
-        return
-    
-    # Parse report type
-    report_type = data.replace("report_", "")
-    
-    if report_type in ["bot", "group", "channel", "user", "post"]:
-        await start_report_process(query, context, report_type)
-    elif data.startswith("report_reason_"):
-        await handle_report_reason(query, context, data)
-    elif data.startswith("report_accounts_"):
-        await handle_report_accounts(query, context, data)
-    elif data == "report_back":
-        await handle_report(update, context)
+        await update.effective_message.reply_text("ℹ️ No active reporting process found.")
 
 async def start_report_process(query, context, report_type):
     """Start report process for a specific type"""
@@ -136,6 +111,7 @@ async def start_report_process(query, context, report_type):
         parse_mode="Markdown"
     )
 
+@timed()
 async def handle_report_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle report process messages"""
     user_id = update.effective_user.id
@@ -216,7 +192,8 @@ async def handle_report_message(update: Update, context: ContextTypes.DEFAULT_TY
         if user_id in report_states:
             del report_states[user_id]
 
-async def handle_report_reason(query, context, data):
+@timed()
+async def handle_report_reason(query, context, reason_idx: int):
     """Handle report reason selection"""
     user_id = query.from_user.id
     
@@ -224,8 +201,6 @@ async def handle_report_reason(query, context, data):
         await query.edit_message_text("❌ Report process expired!")
         return
     
-    # Get reason index from callback data
-    reason_idx = int(data.replace("report_reason_", ""))
     if 0 <= reason_idx < len(report_reasons):
         report_states[user_id]["reason"] = report_reasons[reason_idx]
         report_states[user_id]["step"] = "get_description"
@@ -238,7 +213,8 @@ async def handle_report_reason(query, context, data):
             parse_mode="Markdown"
         )
 
-async def handle_report_accounts(query, context, data):
+@timed()
+async def handle_report_accounts(query, context, account_type: str):
     """Handle account selection for reporting"""
     user_id = query.from_user.id
     
@@ -246,7 +222,6 @@ async def handle_report_accounts(query, context, data):
         await query.edit_message_text("❌ Report process expired!")
         return
     
-    account_type = data.replace("report_accounts_", "")
     state = report_states[user_id]
     
     # Get accounts based on selection
@@ -279,6 +254,12 @@ async def start_reporting_task(query, context, state):
     """Start the reporting task"""
     user_id = query.from_user.id
     
+    try:
+        task_manager.check(user_id, "report")
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
+    
     # Save report job to database
     report_jobs_collection = await get_report_jobs_collection()
     
@@ -300,10 +281,15 @@ async def start_reporting_task(query, context, state):
     state["job_id"] = job_result.inserted_id
     
     # Start task
-    task = asyncio.create_task(
-        report_target_task(context, state, user_id)
-    )
-    active_report_tasks[user_id] = task
+    try:
+        task_manager.spawn(
+            report_target_task(context, state, user_id),
+            owner=user_id,
+            kind="report"
+        )
+    except TaskLimitError as e:
+        await query.edit_message_text(f"⏳ {e}")
+        return
     
     await query.edit_message_text(
         f"🚀 **Reporting Started**\n\n"
@@ -340,44 +326,49 @@ async def report_target_task(context, state, user_id):
             f"⏰ Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}"
         )
     
-    for account in state["accounts"]:
-        # Check if task was stopped
-        if user_id not in active_report_tasks:
-            break
-        
-        account_success = 0
-        
-        for i in range(state["reports_per_account"]):
-            try:
-                # Check if task was stopped
-                if user_id not in active_report_tasks:
-                    break
-                
-                result = await report_from_account(account, state)
-                
-                if result:
-                    account_success += 1
-                    successful_reports += 1
-                else:
+    try:
+        for account in state["accounts"]:
+            account_success = 0
+            
+            for i in range(state["reports_per_account"]):
+                try:
+                    result = await report_from_account(account, state)
+                    
+                    if result:
+                        account_success += 1
+                        successful_reports += 1
+                    else:
+                        failed_reports += 1
+                    
+                    # Random delay between reports (mimic human behavior)
+                    delay = random.uniform(3, 8)
+                    await asyncio.sleep(delay)
+                    
+                except Exception as e:
+                    logger.error(f"Report error for {account.get('phone_number')}: {e}")
                     failed_reports += 1
-                
-                # Random delay between reports (mimic human behavior)
-                delay = random.uniform(3, 8)
-                await asyncio.sleep(delay)
-                
-            except Exception as e:
-                logger.error(f"Report error for {account.get('phone_number')}: {e}")
-                failed_reports += 1
-                await asyncio.sleep(5)
-        
-        # Random delay between accounts
-        delay = random.uniform(5, 15)
-        await asyncio.sleep(delay)
+                    await asyncio.sleep(5)
+            
+            # Random delay between accounts
+            delay = random.uniform(5, 15)
+            await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        # Stopped with /stop or at shutdown, record the partial run
+        report_states.pop(user_id, None)
+        report_jobs_collection = await get_report_jobs_collection()
+        await report_jobs_collection.update_one(
+            {"_id": state["job_id"]},
+            {
+                "$set": {
+                    "status": "stopped",
+                    "total_reports": successful_reports,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+        raise
     
     # Clean up
-    if user_id in active_report_tasks:
-        del active_report_tasks[user_id]
-    
     if user_id in report_states:
         del report_states[user_id]
     
@@ -433,6 +424,9 @@ async def report_target_task(context, state, user_id):
 
 async def report_from_account(account, state):
     """Report from a single account"""
+    from pyrogram import Client
+    from pyrogram.errors import FloodWait
+    
     try:
         # Create Pyrogram client
         app = Client(
@@ -442,7 +436,8 @@ async def report_from_account(account, state):
             session_string=account['session_string']
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
         target = state["target"]
         report_type = state["type"]
@@ -576,3 +571,10 @@ async def report_post(app, post_link, reason, description):
         
     except Exception as e:
         raise e
+
+# Callback routes
+callback_router.add("report_{report_type:bot|group|channel|user|post}", start_report_process, guard=check_admin)
+callback_router.add("report_reason_{reason_idx:int}", handle_report_reason, guard=check_admin)
+callback_router.add("report_accounts_{account_type:all|my|select}", handle_report_accounts, guard=check_admin)
+callback_router.add("report_stop", handle_stop, with_update=True)
+callback_router.add("report_back", handle_report, with_update=True)
@@ -1,6 +1,6 @@
 import logging
 import asyncio
-from typing import Dict, List
+from typing import List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.helpers import (
@@ -9,23 +9,27 @@ from utils.helpers import (
 )
 from database.mongodb import get_accounts_collection
 from config import Config
-from pyrogram import Client
-from pyrogram.errors import FloodWait, PeerIdInvalid, UsernameInvalid
+from utils.conversation import FlowStates
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.task_manager import task_manager, TaskLimitError
+from utils.metrics import pyrogram_seconds
+from datetime import datetime
 
 config = Config()
 logger = logging.getLogger(__name__)
 
 # Send states
-send_states: Dict[int, Dict] = {}
-active_send_tasks: Dict[int, asyncio.Task] = {}
+send_states = FlowStates("send")
 
+@timed()
 async def handle_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /send command"""
     user_id = update.effective_user.id
     
     # Check if user is admin
     if not await check_admin(user_id):
-        await update.message.reply_text("❌ Admin only command!")
+        await update.effective_message.reply_text("❌ Admin only command!")
         return
     
     keyboard = [
@@ -37,38 +41,13 @@ async def handle_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "📤 **Send Messages**\n\n"
         "Select destination type:",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
-async def handle_send_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle send callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
-    
-    if not await check_admin(user_id):
-        await query.edit_message_text("❌ Unauthorized!")
-        return
-    
-    if data == "send_bot":
-        await send_bot_menu(query, context)
-    elif data == "send_user":
-        await send_user_menu(query, context)
-    elif data == "send_group":
-        await send_group_menu(query, context)
-    elif data == "send_stop":
-        await stop_sending(query, context)
-    elif data.startswith("send_type_"):
-        await handle_send_type(query, context, data)
-    elif data == "send_back":
-        await handle_send(update, context)
-
 async def send_bot_menu(query, context):
     """Menu for sending to bot"""
     keyboard = [
@@ -120,37 +99,33 @@ async def send_group_menu(query, context):
         parse_mode="Markdown"
     )
 
-async def handle_send_type(query, context, data):
+@timed()
+async def handle_send_type(query, context, target_type: str, message_type: str):
     """Handle send type selection"""
     user_id = query.from_user.id
     
-    # Parse data: send_[bot/user/group]_[single/multiple]
-    parts = data.split("_")
-    if len(parts) >= 3:
-        target_type = parts[1]  # bot, user, or group
-        message_type = parts[2]  # single or multiple
-        
-        send_states[user_id] = {
-            "action": "send_message",
-            "target_type": target_type,
-            "message_type": message_type,
-            "step": "get_target"
-        }
-        
-        target_names = {
-            "bot": "bot",
-            "user": "user",
-            "group": "group/channel"
-        }
-        
-        await query.edit_message_text(
-            f"📤 **Send to {target_names[target_type].title()}**\n\n"
-            f"Please send the {target_names[target_type]} username or link:\n"
-            f"Example: @username or https://t.me/username\n\n"
-            f"To cancel, send /cancel",
-            parse_mode="Markdown"
-        )
+    send_states[user_id] = {
+        "action": "send_message",
+        "target_type": target_type,
+        "message_type": message_type,
+        "step": "get_target"
+    }
+    
+    target_names = {
+        "bot": "bot",
+        "user": "user",
+        "group": "group/channel"
+    }
+    
+    await query.edit_message_text(
+        f"📤 **Send to {target_names[target_type].title()}**\n\n"
+        f"Please send the {target_names[target_type]} username or link:\n"
+        f"Example: @username or https://t.me/username\n\n"
+        f"To cancel, send /cancel",
+        parse_mode="Markdown"
+    )
 
+@timed()
 async def handle_send_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle send message process"""
     user_id = update.effective_user.id
@@ -254,10 +229,15 @@ async def start_sending(update, context, account_ids):
         return
     
     # Start sending task
-    task = asyncio.create_task(
-        send_messages_task(context, accounts, state, user_id)
-    )
-    active_send_tasks[user_id] = task
+    try:
+        task_manager.spawn(
+            send_messages_task(context, accounts, state, user_id),
+            owner=user_id,
+            kind="send"
+        )
+    except TaskLimitError as e:
+        await update.message.reply_text(f"⏳ {e}")
+        return
     
     await update.message.reply_text(
         f"🚀 Started sending to {len(accounts)} accounts!\n\n"
@@ -276,10 +256,6 @@ async def send_messages_task(context, accounts, state, user_id):
     
     for i, account in enumerate(accounts, 1):
         try:
-            # Check if task was stopped
-            if user_id not in active_send_tasks:
-                break
-            
             # Send message
             result = await send_single_message(account, state)
             
@@ -309,9 +285,6 @@ async def send_messages_task(context, accounts, state, user_id):
             await asyncio.sleep(5)  # Longer delay on error
     
     # Clean up
-    if user_id in active_send_tasks:
-        del active_send_tasks[user_id]
-    
     if user_id in send_states:
         del send_states[user_id]
     
@@ -339,6 +312,9 @@ async def send_messages_task(context, accounts, state, user_id):
 
 async def send_single_message(account, state):
     """Send message from a single account"""
+    from pyrogram import Client
+    from pyrogram.errors import FloodWait, PeerIdInvalid, UsernameInvalid
+    
     try:
         # Create Pyrogram client
         app = Client(
@@ -348,7 +324,8 @@ async def send_single_message(account, state):
             session_string=account['session_string']
         )
         
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         
         target = state["target"]
         message_type = state["message_type"]
@@ -397,11 +374,21 @@ async def stop_sending(query, context):
     """Stop sending process"""
     user_id = query.from_user.id
     
-    if user_id in active_send_tasks:
-        active_send_tasks[user_id].cancel()
-        del active_send_tasks[user_id]
+    task_manager.cancel(user_id, "send")
     
     if user_id in send_states:
         del send_states[user_id]
     
     await query.edit_message_text("🛑 Sending stopped successfully!")
+
+# Callback routes
+callback_router.add("send_bot", send_bot_menu, guard=check_admin)
+callback_router.add("send_user", send_user_menu, guard=check_admin)
+callback_router.add("send_group", send_group_menu, guard=check_admin)
+callback_router.add("send_stop", stop_sending, guard=check_admin)
+callback_router.add(
+    "send_{target_type:bot|user|group}_{message_type:single|multiple}",
+    handle_send_type,
+    guard=check_admin
+)
+callback_router.add("send_back", handle_send, with_update=True)
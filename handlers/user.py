@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, List, Optional
+from typing import List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.helpers import (
@@ -8,14 +8,20 @@ from utils.helpers import (
 )
 from database.mongodb import get_accounts_collection, get_users_collection
 from config import Config
+from utils.conversation import FlowStates
+from utils.callback_router import callback_router
+from utils.perf import timed
+from utils.metrics import pyrogram_seconds
 from bson.objectid import ObjectId
+from datetime import datetime
 
 config = Config()
 logger = logging.getLogger(__name__)
 
 # User states for various operations
-user_states: Dict[int, Dict] = {}
+user_states = FlowStates("user")
 
+@timed()
 async def handle_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /set command - User settings menu"""
     user_id = update.effective_user.id
@@ -30,37 +36,17 @@ async def handle_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "⚙️ **User Settings Menu**\n\n"
         "Select an option:",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
 
-async def handle_user_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle user callback queries"""
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    user_id = query.from_user.id
-    
-    if data == "user_accounts":
-        await show_user_accounts(query, context)
-    elif data == "user_remove_menu":
-        await show_remove_menu(query, context)
-    elif data == "user_refresh":
-        await refresh_accounts(query, context)
-    elif data == "user_set_log":
-        await set_log_channel(query, context)
-    elif data == "user_remove_log":
-        await remove_log_channel(query, context)
-    elif data.startswith("user_account_"):
-        await handle_account_action(query, context, data)
-    elif data.startswith("user_remove_"):
-        await handle_remove_action(query, context, data)
-    elif data == "user_back":
-        await handle_settings(update, context)
+async def show_user_accounts_page(query, context, page: int):
+    """Show a page of the user's accounts"""
+    context.user_data["account_page"] = page
+    await show_user_accounts(query, context)
 
 async def show_user_accounts(query, context):
     """Show user's accounts"""
@@ -181,8 +167,10 @@ async def refresh_accounts(query, context):
                 session_string=account['session_string']
             )
             
-            await app.connect()
-            me = await app.get_me()
+            with pyrogram_seconds.time(operation="connect"):
+                await app.connect()
+            with pyrogram_seconds.time(operation="get_me"):
+                me = await app.get_me()
             await app.disconnect()
             
             # Update account status
@@ -275,6 +263,7 @@ async def remove_log_channel(query, context):
         "✅ Log channel removed successfully!"
     )
 
+@timed()
 async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle user settings related messages"""
     user_id = update.effective_user.id
@@ -354,3 +343,12 @@ async def process_log_channel_input(update, context, text):
     except Exception as e:
         logger.error(f"Error setting log channel: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
+
+# Callback routes
+callback_router.add("user_accounts", show_user_accounts)
+callback_router.add("user_page_{page:int}", show_user_accounts_page)
+callback_router.add("user_remove_menu", show_remove_menu)
+callback_router.add("user_refresh", refresh_accounts)
+callback_router.add("user_set_log", set_log_channel)
+callback_router.add("user_remove_log", remove_log_channel)
+callback_router.add("user_back", handle_settings, with_update=True)
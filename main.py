@@ -7,6 +7,7 @@ import logging
 import asyncio
 import os
 import sys
+import time
 from datetime import datetime
 
 # Add current directory to path
@@ -15,17 +16,34 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from telegram import Update
 from config import Config
-from utils.helpers import setup_logging
+from utils.helpers import setup_logging, stop_logging
 from database.mongodb import init_database, get_database
 
+from utils.conversation import conversations
+from utils.state_store import init_state_store
+from utils.callback_router import callback_router
+from utils.update_processor import update_processor
+from utils.task_manager import task_manager
+from utils.rate_limiter import rate_limiter, init_rate_limiter
+from utils.rate_limit_middleware import rate_limit_middleware
+from utils.channel_sink import channel_sink
+from utils.monitor import bot_monitor
+from utils.perf import perf, timed
+from utils.watchdog import loop_watchdog, enable_asyncio_debug
+from utils.metrics import (
+    metrics, MetricsServer, InstrumentedRequest, timed_handler,
+    queue_depth, loop_lag_seconds
+)
+
 # Import handlers
-from handlers.login import handle_login, handle_login_message
+from handlers.login import handle_login, handle_login_message, login_states
 from handlers.user import handle_settings, handle_user_message
-from handlers.admin import handle_admin
-from handlers.send import handle_send
-from handlers.join_leave import handle_join, handle_leave
-from handlers.report import handle_report, handle_stop
+from handlers.admin import handle_admin, handle_admin_message
+from handlers.send import handle_send, handle_send_message
+from handlers.join_leave import handle_join, handle_leave, handle_join_message, handle_leave_message
+from handlers.report import handle_report, handle_stop, handle_report_message
 from handlers.otp import handle_otp
+from handlers.profiling import handle_profile, handle_heap
 
 # Setup logging
 setup_logging()
@@ -36,8 +54,16 @@ config = Config()
 class AccountManagerBot:
     def __init__(self):
         self.config = config
-        self.app = Application.builder().token(self.config.BOT_TOKEN).build()
+        self.app = (
+            Application.builder()
+            .token(self.config.BOT_TOKEN)
+            .concurrent_updates(update_processor)
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .build()
+        )
         self.db = None
+        self.webhook = None
+        self.metrics_server = None
         
     async def initialize(self):
         """Initialize the bot"""
@@ -49,12 +75,22 @@ class AccountManagerBot:
             logger.error("Please get a token from @BotFather and add it to .env")
             sys.exit(1)
         
-        # Initialize database
+        # Connect to MongoDB and the Bot API (get_me) concurrently
         logger.info("📊 Initializing database...")
-        if not await init_database():
+        db_ready, _ = await asyncio.gather(init_database(), self.app.initialize())
+        if not db_ready:
             logger.error("❌ Failed to initialize database!")
             sys.exit(1)
         
+        # Restore conversation states left by the previous run
+        await init_state_store(conversations, self.config)
+        
+        # Share rate limits through Redis when configured
+        await init_rate_limiter()
+        
+        # Reaped logins are reported to their users
+        login_states.bot = self.app.bot
+        
         # Setup handlers
         self.setup_handlers()
         
@@ -62,22 +98,41 @@ class AccountManagerBot:
         
     def setup_handlers(self):
         """Setup all command handlers"""
+        # Rate limits, checked before any other handler group
+        self.app.add_handler(rate_limit_middleware.handler(), group=-1)
+        
         # Basic commands
-        self.app.add_handler(CommandHandler("start", self.start))
-        self.app.add_handler(CommandHandler("help", self.help))
-        self.app.add_handler(CommandHandler("stats", self.stats))
-        self.app.add_handler(CommandHandler("cancel", self.cancel))
+        self.add_command("start", self.start)
+        self.add_command("help", self.help)
+        self.add_command("stats", self.stats)
+        self.add_command("tasks", self.tasks)
+        self.add_command("perf", self.perf)
+        self.add_command("cancel", self.cancel)
         
         # Feature commands
-        self.app.add_handler(CommandHandler("login", handle_login))
-        self.app.add_handler(CommandHandler("set", handle_settings))
-        self.app.add_handler(CommandHandler("admin", handle_admin))
-        self.app.add_handler(CommandHandler("otp", handle_otp))
-        self.app.add_handler(CommandHandler("send", handle_send))
-        self.app.add_handler(CommandHandler("join", handle_join))
-        self.app.add_handler(CommandHandler("leave", handle_leave))
-        self.app.add_handler(CommandHandler("report", handle_report))
-        self.app.add_handler(CommandHandler("stop", handle_stop))
+        self.add_command("login", handle_login)
+        self.add_command("set", handle_settings)
+        self.add_command("admin", handle_admin)
+        self.add_command("otp", handle_otp)
+        self.add_command("send", handle_send)
+        self.add_command("join", handle_join)
+        self.add_command("leave", handle_leave)
+        self.add_command("report", handle_report)
+        self.add_command("stop", handle_stop)
+        self.add_command("profile", handle_profile)
+        self.add_command("heap", handle_heap)
+        
+        # Conversation flows for state-based inputs
+        conversations.register_handler("login", handle_login_message)
+        conversations.register_handler("user", handle_user_message)
+        conversations.register_handler("admin", handle_admin_message)
+        conversations.register_handler("send", handle_send_message)
+        conversations.register_handler("join", handle_join_message)
+        conversations.register_handler("leave", handle_leave_message)
+        conversations.register_handler("report", handle_report_message)
+        
+        # Inline buttons, resolved through the callback router
+        self.app.add_handler(CallbackQueryHandler(self.handle_callback))
         
         # Message handlers for state-based inputs
         self.app.add_handler(MessageHandler(
@@ -88,6 +143,32 @@ class AccountManagerBot:
         # Error handler
         self.app.add_error_handler(self.error_handler)
         
+    def add_command(self, name: str, callback):
+        """Register a command handler whose latency is recorded"""
+        self.app.add_handler(CommandHandler(name, timed_handler("command", name, callback)))
+    
+    async def start_metrics(self):
+        """Serve Prometheus metrics, a failure here never stops the bot"""
+        queue_depth.set_function(lambda: update_processor.get_stats()["queue_depth"], queue="updates")
+        queue_depth.set_function(lambda: self.app.update_queue.qsize(), queue="update_queue")
+        queue_depth.set_function(lambda: channel_sink.get_stats()["queued"], queue="channel_log")
+        queue_depth.set_function(lambda: task_manager.get_stats()["running"], queue="background_tasks")
+        if conversations.store:
+            queue_depth.set_function(lambda: conversations.store.queue.qsize(), queue="state_writes")
+        # No sample is taken until the monitor has run for one interval
+        loop_lag_seconds.set_function(lambda: bot_monitor.samples[-1].loop_lag if bot_monitor.samples else 0)
+        
+        if not self.config.METRICS_ENABLED:
+            return
+        
+        self.metrics_server = MetricsServer(metrics, host=self.config.METRICS_HOST, port=self.config.METRICS_PORT)
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            logger.error(f"❌ Could not start metrics server: {e}")
+            self.metrics_server = None
+    
+    @timed(kind="command")
     async def start(self, update: Update, context):
         """Handle /start command"""
         user = update.effective_user
@@ -117,6 +198,7 @@ class AccountManagerBot:
             disable_web_page_preview=True
         )
     
+    @timed(kind="command")
     async def help(self, update: Update, context):
         """Handle /help command"""
         help_msg = (
@@ -136,6 +218,10 @@ class AccountManagerBot:
             "• /join - Join groups/channels\n"
             "• /leave - Leave groups/channels\n"
             "• /report - Report content\n"
+            "• /tasks - List running background tasks\n"
+            "• /perf - Slowest handlers by latency\n"
+            "• /profile - Profile the bot and get the report (owner)\n"
+            "• /heap - Trace memory allocations (owner)\n"
             "• /stop - Stop current operation\n\n"
             "⚠️ **Note:** Some commands require admin privileges.\n"
             "Only the bot owner can grant admin access."
@@ -146,9 +232,11 @@ class AccountManagerBot:
             parse_mode="Markdown"
         )
     
+    @timed(kind="command")
     async def stats(self, update: Update, context):
         """Handle /stats command"""
         from database.mongodb import get_accounts_collection, get_users_collection
+        from utils.helpers import format_time_delta
         
         try:
             accounts_collection = await get_accounts_collection()
@@ -161,14 +249,37 @@ class AccountManagerBot:
             })
             total_users = await users_collection.count_documents({})
             
+            login_stats = login_states.get_stats()
+            queue_stats = update_processor.get_stats()
+            sink_stats = channel_sink.get_stats()
+            system = bot_monitor.summary(60)
+            
             stats_msg = (
                 "📊 **Bot Statistics**\n\n"
                 f"👥 **Total Users:** {total_users}\n"
                 f"📱 **Total Accounts:** {total_accounts}\n"
                 f"🟢 **Active Accounts:** {active_accounts}\n"
-                f"🔴 **Inactive Accounts:** {total_accounts - active_accounts}\n\n"
-                f"⚙️ **Bot Version:** 1.0.0\n"
-                f"📅 **Uptime:** Starting up..."
+                f"🔴 **Inactive Accounts:** {total_accounts - active_accounts}\n"
+                f"🔐 **Pending Logins:** {login_stats['pending_logins']} "
+                f"({login_stats['open_clients']} open clients, {login_stats['reaped']} reaped)\n"
+                f"⏱️ **Login Completion:** {login_stats['avg_completion_seconds']:.2f}s avg, "
+                f"{login_stats['max_completion_seconds']:.2f}s max\n"
+                f"📥 **Update Queue:** {queue_stats['queue_depth']} waiting, "
+                f"{queue_stats['running']}/{queue_stats['max_workers']} running, "
+                f"{queue_stats['avg_wait_ms']:.1f}ms avg wait\n"
+                f"📝 **Channel Logs:** {sink_stats['queued']} queued, "
+                f"{sink_stats['events']} events in {sink_stats['messages_sent']} messages\n"
+            )
+            if system["samples"]:
+                stats_msg += (
+                    f"🖥️ **Process (1m):** CPU {system['cpu']['avg']:.1f}% avg / {system['cpu']['max']:.1f}% peak, "
+                    f"RSS {system['rss']['max'] / 1024 / 1024:.0f} MB, "
+                    f"{system['fds']['max']} fds, {system['sockets']['max']} sockets, "
+                    f"loop lag {system['loop_lag']['max'] * 1000:.0f}ms peak\n"
+                )
+            stats_msg += (
+                f"\n⚙️ **Bot Version:** 1.0.0\n"
+                f"📅 **Uptime:** {format_time_delta(bot_monitor.uptime_seconds())}"
             )
             
             await update.message.reply_text(
@@ -182,6 +293,71 @@ class AccountManagerBot:
                 "❌ Error retrieving statistics. Please try again later."
             )
     
+    @timed(kind="command")
+    async def tasks(self, update: Update, context):
+        """Handle /tasks command - list running background tasks"""
+        from utils.helpers import check_admin, format_time_delta
+        
+        if not await check_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Admin only command!")
+            return
+        
+        tasks = task_manager.list_tasks()
+        stats = task_manager.get_stats()
+        
+        lines = [
+            "🧵 **Background Tasks**\n",
+            f"Running: {stats['user_tasks']}/{stats['max_total']} user tasks "
+            f"(max {stats['max_per_user']} per user), {stats['running']} total\n"
+        ]
+        for task in tasks[:30]:
+            owner = task["owner"] if task["owner"] is not None else "system"
+            lines.append(f"• `{task['kind']}` — {owner} — {format_time_delta(task['age_seconds'])}")
+        if len(tasks) > 30:
+            lines.append(f"... and {len(tasks) - 30} more")
+        if not tasks:
+            lines.append("No tasks running.")
+        
+        await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+    
+    @timed(kind="command")
+    async def perf(self, update: Update, context):
+        """Handle /perf command - slowest routes by p95 latency"""
+        from utils.helpers import check_admin, format_time_delta
+        
+        if not await check_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Admin only command!")
+            return
+        
+        if context.args and context.args[0].lower() == "reset":
+            perf.reset()
+            await update.message.reply_text("✅ Performance stats reset.")
+            return
+        
+        from database.mongodb import db_instance
+        
+        routes = perf.slowest(15)
+        monitor = db_instance.command_monitor
+        watchdog = loop_watchdog.get_stats()
+        lines = [
+            "⏱️ **Slowest Routes (p95)**\n",
+            f"Since {format_time_delta(time.time() - perf.since)} ago, p50 / p95 / p99 / max in ms",
+            f"🐢 Slow MongoDB commands: {monitor.slow_queries} (over {monitor.slow_ms:.0f}ms)",
+            f"🧊 Event loop stalls: {watchdog['stalls']} (over {watchdog['threshold_ms']:.0f}ms), "
+            f"max lag {watchdog['max_lag_ms']:.0f}ms\n"
+        ]
+        for route in routes:
+            errors = f", {route['errors']} errors" if route["errors"] else ""
+            lines.append(
+                f"• `{route['route']}` — {route['calls']} calls{errors}\n"
+                f"   {route['p50_ms']:.1f} / {route['p95_ms']:.1f} / {route['p99_ms']:.1f} / {route['max_ms']:.1f}"
+            )
+        if not routes:
+            lines.append("No timed calls yet.")
+        
+        await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+    
+    @timed(kind="command")
     async def cancel(self, update: Update, context):
         """Handle /cancel command"""
         user_id = update.effective_user.id
@@ -190,20 +366,9 @@ class AccountManagerBot:
         if 'user_data' in context.__dict__:
             context.user_data.clear()
         
-        # Import and clear states from all handlers
+        # End the active conversation, whichever flow it is in
         try:
-            from handlers.login import login_states
-            if user_id in login_states:
-                del login_states[user_id]
-                
-            from handlers.user import user_states
-            if user_id in user_states:
-                del user_states[user_id]
-                
-            from handlers.admin import admin_states
-            if user_id in admin_states:
-                del admin_states[user_id]
-                
+            conversations.cancel(user_id)
         except Exception as e:
             logger.error(f"❌ Error clearing states: {e}")
         
@@ -212,36 +377,36 @@ class AccountManagerBot:
             "You can start a new command."
         )
     
+    @timed(kind="update")
     async def handle_message(self, update: Update, context):
         """Handle regular messages for state-based operations"""
         user_id = update.effective_user.id
         text = update.message.text
         
-        logger.info(f"📨 Message from {user_id}: {text[:50]}...")
+        logger.info("📨 Message from %s: %s...", user_id, text[:50], extra={"sampled": True})
         
-        # Try to handle login messages
-        try:
-            from handlers.login import login_states, handle_login_message
-            if user_id in login_states:
-                await handle_login_message(update, context)
-                return
-        except Exception as e:
-            logger.error(f"❌ Error in login message handler: {e}")
-        
-        # Try to handle user messages
-        try:
-            from handlers.user import user_states, handle_user_message
-            if user_id in user_states:
-                await handle_user_message(update, context)
-                return
-        except Exception as e:
-            logger.error(f"❌ Error in user message handler: {e}")
+        # Route to the active conversation flow
+        if await conversations.dispatch(update, context):
+            return
         
         # If no state matched, send help
         await update.message.reply_text(
             "I didn't understand that command. Use /help to see available commands."
         )
     
+    @timed(kind="update")
+    async def handle_callback(self, update: Update, context):
+        """Handle inline button callbacks"""
+        user_id = update.effective_user.id
+        
+        # Callbacks read conversation states too, restore them first
+        flow = conversations.active.get(user_id)
+        if flow and user_id in flow.pending:
+            await conversations.load(user_id)
+        
+        await callback_router.dispatch(update, context)
+        conversations.persist(user_id)
+    
     async def error_handler(self, update: Update, context):
         """Handle errors"""
         logger.error(f"❌ Error occurred: {context.error}")
@@ -261,18 +426,27 @@ class AccountManagerBot:
             # Initialize
             await self.initialize()
             
-            # Start polling
-            logger.info("🔄 Starting bot polling...")
-            await self.app.initialize()
             await self.app.start()
             
-            # Get updater
-            updater = self.app.updater
-            if updater:
-                await updater.start_polling()
+            # Sample CPU, memory and loop lag in the background
+            bot_monitor.start()
+            if self.config.LOOP_WATCHDOG_ENABLED:
+                loop_watchdog.start()
+            if self.config.ASYNCIO_DEBUG:
+                enable_asyncio_debug(asyncio.get_running_loop(), self.config.LOOP_BLOCK_THRESHOLD_MS)
+            await self.start_metrics()
+            
+            if self.config.UPDATE_MODE.lower() == "webhook":
+                await self.start_webhook()
+            else:
+                # Start polling
+                logger.info("🔄 Starting bot polling...")
+                updater = self.app.updater
+                if updater:
+                    await updater.start_polling()
             
             logger.info("✅ Bot is now running! Press Ctrl+C to stop.")
-            logger.info(f"🤖 Bot username: @{(await self.app.bot.get_me()).username}")
+            logger.info(f"🤖 Bot username: @{self.app.bot.username}")
             
             # Keep running until interrupted
             await asyncio.Event().wait()
@@ -284,16 +458,69 @@ class AccountManagerBot:
         finally:
             await self.shutdown()
     
+    async def start_webhook(self):
+        """Serve updates over a webhook instead of polling"""
+        from utils.webhook import WebhookServer
+        
+        if not self.config.WEBHOOK_URL:
+            logger.error("❌ WEBHOOK_URL not set, UPDATE_MODE=webhook needs a public HTTPS URL!")
+            sys.exit(1)
+        
+        logger.info("🌐 Starting webhook server...")
+        self.webhook = WebhookServer(
+            self.app,
+            path=self.config.WEBHOOK_PATH,
+            secret_token=self.config.WEBHOOK_SECRET,
+            host=self.config.WEBHOOK_HOST,
+            port=self.config.WEBHOOK_PORT
+        )
+        await self.webhook.start(
+            self.config.WEBHOOK_URL,
+            max_connections=self.config.WEBHOOK_MAX_CONNECTIONS
+        )
+    
     async def shutdown(self):
         """Shutdown the bot gracefully"""
         logger.info("🔌 Shutting down bot...")
         
         try:
+            # Stop accepting webhook updates
+            if self.webhook:
+                await self.webhook.stop()
+            
+            if self.metrics_server:
+                await self.metrics_server.stop()
+            
+            loop_watchdog.stop()
+            
             # Stop the application
             if self.app:
+                if self.app.updater and self.app.updater.running:
+                    await self.app.updater.stop()
                 await self.app.stop()
+            
+            # Let background tasks finish, cancel what outlives the deadline
+            finished, cancelled = await task_manager.drain(self.config.SHUTDOWN_DRAIN_TIMEOUT)
+            if finished or cancelled:
+                logger.info(f"🧵 Background tasks: {finished} finished, {cancelled} cancelled")
+            
+            # Send queued channel logs while the bot can still reach the Bot API
+            await channel_sink.close(self.config.SHUTDOWN_DRAIN_TIMEOUT)
+            
+            if self.app:
                 await self.app.shutdown()
                 
+            # Disconnect clients of logins still pending
+            for user_id, state in list(login_states.items()):
+                if state.get("app"):
+                    await login_states.discard(user_id)
+            
+            # Flush conversation states still being written
+            await conversations.close()
+            
+            # Close the Redis rate limit connection
+            await rate_limiter.close()
+            
             # Close database connections
             from database.mongodb import db_instance
             if db_instance:
@@ -303,6 +530,7 @@ class AccountManagerBot:
             logger.error(f"❌ Error during shutdown: {e}")
         
         logger.info("👋 Bot shutdown complete")
+        stop_logging()
 
 def main():
     """Main function"""
@@ -0,0 +1,57 @@
+"""
+Synthetic login-code messages for the OTP parser test and benchmark
+
+Templates cover the languages our accounts receive codes in, with decoy
+numbers (years, IPs, order ids, phone numbers) around the real code.
+Negative templates hold no code at all and must parse to None.
+"""
+
+import random
+from typing import Iterator, Optional, Tuple
+
+CODE_TEMPLATES = [
+    "Login code: {c}. Do not give this code to anyone, even if they say they are from Telegram!\n\n"
+    "This code can be used to log in to your Telegram account. We never ask it for anything else.\n\n"
+    "If you didn't request this code by trying to log in on another device, simply ignore this message.",
+    "Код для входа в Telegram: {c}. Не давайте код никому, даже если его требуют от имени Telegram!",
+    "Код для входу в Telegram: {c}. Нікому не давайте цей код.",
+    "Código de inicio de sesión: {c}. ¡No des este código a nadie!",
+    "Código de acesso: {c}. Não dê este código a ninguém.",
+    "Code de connexion : {c}. Ne donnez ce code à personne.",
+    "Codice di accesso: {c}. Non dare questo codice a nessuno.",
+    "Login-Code: {c}. Gib diesen Code niemandem weiter.",
+    "Anmeldecode {c} für Konto 4471",
+    "Giriş kodu: {c}. Bu kodu kimseyle paylaşmayın.",
+    "Kode masuk: {c}. Jangan berikan kode ini kepada siapa pun.",
+    "رمز تسجيل الدخول: {c}. لا تعطِ هذا الرمز لأي شخص.",
+    "کد ورود: {c}. این کد را به هیچ کس ندهید.",
+    "लॉगिन कोड: {c}. यह कोड किसी को न दें।",
+    "登录代码：{c}。请勿将此代码告诉任何人。",
+    "{c} is your verification code for account 2024.",
+    "Your OTP is {c}",
+    "Order #20231 shipped. Your code: {c}",
+    "New login from 192.168.10.22 at 12:45 on 2024-03-11. Login code: {c}",
+    "Call +14155552671 if needed. Verification code {c}",
+]
+
+NEGATIVE_TEMPLATES = [
+    "Telegram update {y} released with new features",
+    "Price 12.50 on {y}-01-01, order 1234",
+    "New login to your account from 10.0.{n}.1 on {y}-02-03 at 10:{n:02d}",
+    "Your order #{y} is on its way",
+    "Call us at +1 415 555 {n:04d}",
+]
+
+def generate(count: int, seed: int = 1, negative_share: float = 0.1) -> Iterator[Tuple[str, Optional[str]]]:
+    """Yield (message, expected code) pairs, expected is None for negatives"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < negative_share:
+            template = rng.choice(NEGATIVE_TEMPLATES)
+            yield template.format(y=rng.randint(1990, 2030), n=rng.randint(0, 59)), None
+            continue
+        if rng.random() < 0.8:
+            code = str(rng.randint(10000, 99999))
+        else:
+            code = str(rng.randint(100000, 999999))
+        yield rng.choice(CODE_TEMPLATES).format(c=code), code
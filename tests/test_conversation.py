@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+from utils.conversation import ConversationRegistry, FlowStates
+
+def message_from(user_id: int):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+
+def test_dispatch_runs_the_active_flow_handler():
+    registry = ConversationRegistry()
+    flow = FlowStates("send", registry=registry)
+    seen = []
+
+    async def handler(update, context):
+        seen.append(update.effective_user.id)
+        flow[update.effective_user.id]["step"] = "done"
+
+    registry.register_handler("send", handler)
+    flow[1] = {"step": "start"}
+
+    assert asyncio.run(registry.dispatch(message_from(1), None)) is True
+    assert asyncio.run(registry.dispatch(message_from(2), None)) is False
+    assert seen == [1]
+    stats = registry.get_stats()
+    assert stats["routed"] == 1 and stats["unrouted"] == 1
+    assert stats["avg_routing_us"] > 0
+
+def test_starting_a_flow_evicts_the_previous_one():
+    registry = ConversationRegistry()
+    send, join = FlowStates("send", registry=registry), FlowStates("join", registry=registry)
+    send[1] = {"step": "start"}
+    join[1] = {"step": "start"}
+    assert 1 not in send and registry.active[1] is join
+
+def test_routing_overhead_reaches_handler_metrics_and_perf():
+    from utils.metrics import handler_seconds
+    from utils.perf import perf
+
+    registry = ConversationRegistry()
+    flow = FlowStates("routing_test", registry=registry)
+
+    async def handler(update, context):
+        pass
+
+    registry.register_handler("routing_test", handler)
+    flow[1] = {"step": "start"}
+    asyncio.run(registry.dispatch(message_from(1), None))
+
+    series = handler_seconds.series[("routing", "routing_test")]
+    assert series[2] == 1 and series[1] > 0
+    assert perf.routes["routing:routing_test"].count == 1
+    assert 'bot_handler_seconds_count{kind="routing",name="routing_test"} 1' in handler_seconds.render()
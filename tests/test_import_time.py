@@ -0,0 +1,5 @@
+from benchmarks.import_time import DEFAULT_BUDGET_MS, check
+
+def test_startup_import_time_within_budget():
+    problems, total_ms, _ = check(DEFAULT_BUDGET_MS, runs=3)
+    assert not problems, f"{problems} (import main: {total_ms:.0f}ms)"
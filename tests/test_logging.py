@@ -0,0 +1,28 @@
+import logging
+from logging.handlers import QueueHandler
+from utils import helpers
+
+def test_records_after_stop_logging_are_still_written(tmp_path, monkeypatch):
+    log_file = tmp_path / "bot.log"
+    monkeypatch.setattr(helpers.config, "LOG_FILE", str(log_file))
+    monkeypatch.setattr(helpers.config, "LOG_SAMPLE_RATE", 1.0)
+    root = logging.getLogger()
+    level = root.level
+
+    try:
+        helpers.setup_logging()
+        logging.getLogger("test").warning("queued record")
+        helpers.stop_logging()
+
+        assert not any(isinstance(handler, QueueHandler) for handler in root.handlers)
+        logging.getLogger("test").warning("record after stop")
+    finally:
+        for handler in helpers.log_direct_handlers:
+            root.removeHandler(handler)
+            handler.close()
+        helpers.log_direct_handlers.clear()
+        root.setLevel(level)
+
+    written = log_file.read_text(encoding="utf-8")
+    assert "queued record" in written
+    assert "record after stop" in written
@@ -0,0 +1,44 @@
+import asyncio
+import time
+from utils.conversation import ConversationRegistry
+from utils.login_store import LoginStateStore
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+def make_store(**kwargs) -> LoginStateStore:
+    return LoginStateStore(step_timeout=60, registry=ConversationRegistry(), **kwargs)
+
+def test_set_step_starts_the_step_clock():
+    store = make_store()
+    store[1] = {"step": "api_id", "data": {}}
+    store.step_seen[1] = ("api_id", time.monotonic() - 100)
+
+    store.set_step(1, "api_hash")
+    step, since = store.step_seen[1]
+    assert step == "api_hash" and time.monotonic() - since < 1
+
+    # Repeating the current step does not extend its timeout
+    store.set_step(1, "api_hash")
+    assert store.step_seen[1][1] == since
+
+def test_reaped_login_is_reported():
+    store = make_store()
+    store.bot = FakeBot()
+    store[1] = {"step": "otp", "data": {}}
+    store.step_seen[1] = ("otp", time.monotonic() - 100)
+
+    assert asyncio.run(store.reap_expired()) == 1
+    assert 1 not in store
+    assert store.bot.sent and store.bot.sent[0][0] == 1
+
+def test_setdefault_and_update_are_tracked():
+    store = make_store()
+    store.setdefault(1, {"step": "api_id"})
+    store.update({2: {"step": "api_id"}})
+    assert store.registry.active[1] is store and store.registry.active[2] is store
+    assert set(store.step_seen) == {1, 2}
@@ -0,0 +1,54 @@
+import asyncio
+import re
+import aiohttp
+import pytest
+from utils.metrics import Gauge, Histogram, MetricsRegistry, MetricsServer
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="[^"]*"(,[a-zA-Z_][a-zA-Z0-9_]*="[^"]*")*\})? \S+$')
+
+def make_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    latency = registry.register(Histogram("test_handler_seconds", "Handler latency", ("kind",), buckets=(0.1, 1.0)))
+    depth = registry.register(Gauge("test_queue_depth", "Queue depth", ("queue",)))
+    latency.observe(0.05, kind="command")
+    latency.observe(0.5, kind="command")
+    latency.observe(5, kind="command")
+    depth.set_function(lambda: 3, queue="updates")
+    return registry
+
+def test_scrape_returns_the_exposition_format():
+    async def run():
+        server = MetricsServer(make_registry(), host="127.0.0.1", port=0)
+        await server.start()
+        try:
+            host, port = server.runner.addresses[0][:2]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://{host}:{port}/metrics") as response:
+                    return response.status, response.headers["Content-Type"], await response.text(), server.scrapes
+        finally:
+            await server.stop()
+
+    status, content_type, body, scrapes = asyncio.run(run())
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert scrapes == 1
+
+    lines = body.splitlines()
+    assert "# HELP test_handler_seconds Handler latency" in lines
+    assert "# TYPE test_handler_seconds histogram" in lines
+    assert "# TYPE test_queue_depth gauge" in lines
+    for line in lines:
+        assert line.startswith("# ") or SAMPLE_LINE.match(line), line
+
+    assert 'test_handler_seconds_bucket{kind="command",le="0.1"} 1' in lines
+    assert 'test_handler_seconds_bucket{kind="command",le="1.0"} 2' in lines
+    assert 'test_handler_seconds_bucket{kind="command",le="+Inf"} 3' in lines
+    assert 'test_handler_seconds_sum{kind="command"} 5.55' in lines
+    assert 'test_handler_seconds_count{kind="command"} 3' in lines
+    assert 'test_queue_depth{queue="updates"} 3.0' in lines
+
+def test_failing_gauge_callback_is_not_hidden():
+    gauge = Gauge("test_broken", "Broken gauge")
+    gauge.set_function(lambda: [][-1])
+    with pytest.raises(IndexError):
+        gauge.render()
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from handlers.otp import OTP_HISTORY_PAGE_SIZE, fetch_history_since
+from utils.otp_store import OTPStore
+
+class FakeHistoryClient:
+    """Serves GetHistory pages over message ids 1..last, newest first"""
+
+    def __init__(self, last: int):
+        self.ids = list(range(last, 0, -1))
+        self.requests = 0
+
+    async def resolve_peer(self, source):
+        return source
+
+    async def invoke(self, request):
+        self.requests += 1
+        ids = [i for i in self.ids if i > request.min_id and (not request.offset_id or i < request.offset_id)]
+        return SimpleNamespace(messages=[SimpleNamespace(id=i) for i in ids[:request.limit]])
+
+def test_pages_back_to_watermark():
+    client = FakeHistoryClient(last=100)
+    messages = asyncio.run(fetch_history_since(client, "telegram", min_id=30))
+    assert sorted(message.id for message in messages) == list(range(31, 101))
+    assert client.requests == 70 // OTP_HISTORY_PAGE_SIZE + 1
+
+def test_first_fetch_reads_latest_page():
+    client = FakeHistoryClient(last=100)
+    messages = asyncio.run(fetch_history_since(client, "telegram", min_id=0))
+    assert len(messages) == OTP_HISTORY_PAGE_SIZE
+    assert client.requests == 1
+
+def test_store_drops_repeated_messages():
+    store = OTPStore()
+    pushed = {"id": 7, "code": "12345", "time": "t", "source": "Telegram"}
+    codes = store.put("a", [pushed, dict(pushed), {"id": 8, "code": "54321", "time": "t", "source": "Telegram"}])
+    assert [otp["id"] for otp in codes] == [7, 8]
+
+class FakePyrogramClient(FakeHistoryClient):
+    """Pyrogram Client stand-in whose history holds one login code"""
+
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(last=1)
+        FakePyrogramClient.created += 1
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def invoke(self, request):
+        history = await super().invoke(request)
+        for message in history.messages:
+            message.message = "Login code: 24680. Do not give this code to anyone"
+            message.date = 1_700_000_000
+        return history
+
+class FakeAccounts:
+    async def update_one(self, *args, **kwargs):
+        pass
+
+def test_forced_fetch_skips_the_cache(monkeypatch):
+    pyrogram = pytest.importorskip("pyrogram")
+    import handlers.otp as otp_handlers
+
+    async def accounts_collection():
+        return FakeAccounts()
+
+    store = OTPStore(ttl=60)
+    monkeypatch.setattr(pyrogram, "Client", FakePyrogramClient)
+    monkeypatch.setattr(otp_handlers, "otp_store", store)
+    monkeypatch.setattr(otp_handlers, "get_accounts_collection", accounts_collection)
+    FakePyrogramClient.created = 0
+
+    account = {"_id": "a", "phone_number": "+10000000000", "api_id": 1, "api_hash": "h", "session_string": "s"}
+    store.put("a", [{"id": 1, "code": "11111", "time": "t", "source": "Telegram"}])
+
+    cached = asyncio.run(otp_handlers.get_single_account_otp(account))
+    assert [otp["code"] for otp in cached] == ["11111"]
+    assert FakePyrogramClient.created == 0
+
+    fresh = asyncio.run(otp_handlers.get_single_account_otp(account, force=True))
+    assert FakePyrogramClient.created == 1
+    assert "24680" in [otp["code"] for otp in fresh]
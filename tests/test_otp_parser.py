@@ -0,0 +1,20 @@
+from tests.otp_corpus import generate
+from utils.otp_parser import extract_otp_from_text, extract_otp_with_rank
+
+CORPUS_SIZE = 100_000
+MIN_ACCURACY = 0.999
+
+def test_corpus_accuracy():
+    messages = list(generate(CORPUS_SIZE))
+    wrong = [(text, code) for text, code in messages if extract_otp_from_text(text) != code]
+    accuracy = 1 - len(wrong) / len(messages)
+    assert accuracy >= MIN_ACCURACY, f"accuracy {accuracy:.4%}, first misses: {wrong[:5]}"
+
+def test_login_phrase_beats_decoys():
+    text = "Order 55555 from 2024-03-11. Login code: 71234"
+    assert extract_otp_with_rank(text) == ("71234", 3)
+
+def test_no_code():
+    assert extract_otp_with_rank("") == (None, 0)
+    assert extract_otp_from_text("Telegram update 2024 released") is None
+    assert extract_otp_from_text("Connect to 192.168.10.22") is None
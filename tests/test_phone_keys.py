@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from database.mongodb import Database
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+def make_database() -> Database:
+    database = Database()
+    database.db = mongomock_motor.AsyncMongoMockClient()["test"]
+    return database
+
+async def insert_accounts(database: Database):
+    await database.db.accounts.insert_many([
+        {"_id": 1, "user_id": 10, "phone_number": "+1 415 555 0100", "is_deleted": False, "is_active": False,
+         "updated_at": datetime(2024, 1, 3)},
+        {"_id": 2, "user_id": 20, "phone_number": "14155550100", "is_deleted": False, "is_active": True,
+         "updated_at": datetime(2024, 1, 1)},
+        {"_id": 3, "user_id": 10, "phone_number": "+14155550199", "is_deleted": False, "is_active": True,
+         "updated_at": datetime(2024, 1, 1)},
+    ])
+
+def test_startup_reports_duplicates_without_changing_them():
+    database = make_database()
+
+    async def run():
+        await insert_accounts(database)
+        built = await database.create_phone_key_index()
+        return built, {doc["_id"]: doc async for doc in database.db.accounts.find({})}
+
+    built, accounts = asyncio.run(run())
+    assert built is False
+    assert not any(account["is_deleted"] for account in accounts.values())
+    assert all("duplicate_of" not in account for account in accounts.values())
+
+def test_migration_marks_duplicates_and_unlinks_them():
+    database = make_database()
+
+    async def run():
+        await insert_accounts(database)
+        await database.db.users.insert_many([
+            {"user_id": 10, "accounts": [1, 3]},
+            {"user_id": 20, "accounts": [2]},
+        ])
+        await database.backfill_phone_keys()
+        groups = await database.find_duplicate_phone_keys()
+        marked = await database.resolve_duplicate_phone_keys(groups)
+        accounts = {doc["_id"]: doc async for doc in database.db.accounts.find({})}
+        users = {doc["user_id"]: doc["accounts"] async for doc in database.db.users.find({})}
+        return groups, marked, accounts, users
+
+    groups, marked, accounts, users = asyncio.run(run())
+    assert [[account["_id"] for account in group["accounts"]] for group in groups] == [[2, 1]]
+    assert marked == 1
+    assert accounts[1]["is_deleted"] is True and accounts[1]["duplicate_of"] == 2
+    assert accounts[2]["is_deleted"] is False and accounts[3]["is_deleted"] is False
+    assert users == {10: [3], 20: [2]}
+
+class FailingPhoneKeyIndex:
+    """Accounts collection whose phone_key index build fails"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def create_index(self, keys, **kwargs):
+        if keys == "phone_key":
+            raise RuntimeError("index build failed")
+        return await self.collection.create_index(keys, **kwargs)
+
+def test_index_failure_is_not_swallowed():
+    database = make_database()
+    db = database.db
+    database.db = SimpleNamespace(users=db.users, accounts=FailingPhoneKeyIndex(db.accounts))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(database.create_indexes())
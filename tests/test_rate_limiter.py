@@ -0,0 +1,59 @@
+import asyncio
+import sys
+from utils.rate_limiter import RateLimiter
+
+# utils re-exports the rate_limiter instance under the module's name
+rate_limiter_module = sys.modules["utils.rate_limiter"]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_live_long_period_key_does_not_block_eviction(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", clock)
+    limiter = RateLimiter(evict_batch=2)
+
+    # A 5 minute key first, then seven 1 minute keys behind it
+    limiter.hit(1, "login", 3, 300)
+    for user_id in range(2, 9):
+        limiter.hit(user_id, "command", 20, 60)
+
+    clock.now += 150
+    for user_id in range(100, 110):
+        limiter.hit(user_id, "command", 20, 60)
+
+    assert limiter.evicted == 7
+    assert (1, "login") in limiter.user_limits
+    assert not any((user_id, "command") in limiter.user_limits for user_id in range(2, 9))
+
+def test_evict_idle_drops_only_expired_keys(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", clock)
+    limiter = RateLimiter()
+    limiter.hit(1, "login", 3, 300)
+    limiter.hit(2, "command", 20, 60)
+
+    clock.now += 150
+    assert limiter.evict_idle() == 1
+    assert list(limiter.user_limits) == [(1, "login")]
+
+def test_sweeper_runs_as_a_daemon():
+    async def run():
+        from utils.task_manager import task_manager
+        limiter = RateLimiter(sweep_interval=0.01)
+        limiter.hit(1, "command", 20, 60)
+        limiter.user_limits[(1, "command")].window_start -= 120
+
+        limiter.start_sweeper()
+        await asyncio.sleep(0.05)
+        daemon = task_manager.tasks[limiter.sweeper_task].daemon
+        limiter.sweeper_task.cancel()
+        return limiter, daemon
+
+    limiter, daemon = asyncio.run(run())
+    assert daemon
+    assert not limiter.user_limits
@@ -0,0 +1,106 @@
+import asyncio
+import sys
+import pytest
+
+pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+fake_aioredis = pytest.importorskip("fakeredis.aioredis")
+pytest.importorskip("lupa")
+
+from utils.rate_limiter import RateLimiter, RedisRateLimiter, SLIDING_WINDOW_SCRIPT
+
+# utils re-exports the rate_limiter instance under the module's name
+rate_limiter_module = sys.modules["utils.rate_limiter"]
+
+class Clock:
+    """Stands in for both time.time and time.monotonic"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_limiter(server) -> RedisRateLimiter:
+    limiter = RedisRateLimiter("redis://localhost:6379/0", retry_after=30)
+    limiter.client = fake_aioredis.FakeRedis(server=server)
+    limiter.script = limiter.client.register_script(SLIDING_WINDOW_SCRIPT)
+    return limiter
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Start on a window boundary for the 60s period
+    clock = Clock(60 * 1_000_000)
+    monkeypatch.setattr(rate_limiter_module.time, "time", clock)
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", clock)
+    return clock
+
+def test_sliding_window_matches_the_local_limiter(clock):
+    async def run():
+        limiter = make_limiter(fakeredis.FakeServer())
+        local = RateLimiter()
+        results = []
+
+        # Fill the first window, then check halfway and near the end of the next
+        for offset in (0, 0, 0, 0, 0, 0, 90, 90, 90, 90, 110, 110, 110):
+            clock.now = 60 * 1_000_000 + offset
+            redis_allowed, redis_wait = await limiter.acquire(7, "command", 5, 60)
+            local_allowed, local_wait = await local.acquire(7, "command", 5, 60)
+            results.append((offset, redis_allowed, local_allowed, redis_wait, local_wait))
+
+        clock.now = 60 * 1_000_000 + 150
+        for _ in range(4):
+            redis_allowed, redis_wait = await limiter.acquire(7, "command", 5, 60)
+            local_allowed, local_wait = await local.acquire(7, "command", 5, 60)
+            results.append((150, redis_allowed, local_allowed, redis_wait, local_wait))
+        return results, limiter
+
+    results, limiter = asyncio.run(run())
+    for offset, redis_allowed, local_allowed, redis_wait, local_wait in results:
+        assert redis_allowed == local_allowed, offset
+        # Redis rounds the wait up to whole milliseconds
+        assert redis_wait == pytest.approx(local_wait, abs=0.001), offset
+
+    assert [allowed for _, allowed, *_ in results[:6]] == [True] * 5 + [False]
+    # 30s into the next window half of the 5 previous requests still count
+    assert [allowed for offset, allowed, *_ in results if offset == 90] == [True, True, False, False]
+    assert limiter.fallbacks == 0
+
+def test_wait_time_is_returned_when_denied(clock):
+    async def run():
+        limiter = make_limiter(fakeredis.FakeServer())
+        for _ in range(3):
+            await limiter.acquire(1, "login", 3, 300)
+        clock.now += 100
+        allowed, wait = await limiter.acquire(1, "login", 3, 300)
+        peek = await limiter.get_wait_time(1, "login", 3, 300)
+        return allowed, wait, peek
+
+    allowed, wait, peek = asyncio.run(run())
+    assert not allowed
+    # Next window starts in 200s, then a third of it must pass for the 3 to weigh 2
+    assert wait == pytest.approx(200 + 300 / 3, abs=0.001)
+    assert peek == pytest.approx(wait, abs=0.001)
+
+def test_falls_back_to_local_limits_while_redis_is_down(clock):
+    async def run():
+        server = fakeredis.FakeServer()
+        server.connected = False
+        limiter = make_limiter(server)
+
+        results = [await limiter.acquire(3, "command", 2, 60) for _ in range(3)]
+        down = (await limiter.get_stats())["redis_available"]
+
+        # Once retry_after has passed Redis is tried again
+        server.connected = True
+        clock.now += 31
+        after = await limiter.acquire(3, "command", 2, 60)
+        return results, down, limiter, after
+
+    results, down, limiter, after = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[2][1] > 0
+    assert down is False
+    assert after == (True, 0)
+    # Only the checks made while Redis was down went to the local limiter
+    assert limiter.fallbacks == 3
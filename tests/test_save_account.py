@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import database.mongodb
+import handlers.login as login
+from config import Config
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+class Failing:
+    """Collection whose update_one fails matching calls"""
+
+    def __init__(self, collection, should_fail):
+        self.collection = collection
+        self.should_fail = should_fail
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def update_one(self, filter, update, **kwargs):
+        if self.should_fail(update):
+            raise RuntimeError("write failed")
+        return await self.collection.update_one(filter, update, **kwargs)
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    collections = SimpleNamespace(accounts=db.accounts, users=db.users)
+
+    async def get_accounts_collection():
+        return collections.accounts
+
+    async def get_users_collection():
+        return collections.users
+
+    monkeypatch.setattr(database.mongodb, "get_accounts_collection", get_accounts_collection)
+    monkeypatch.setattr(database.mongodb, "get_users_collection", get_users_collection)
+    monkeypatch.setattr(Config, "MAIN_LOG_CHANNEL", None)
+    monkeypatch.setattr(login, "ACCOUNT_LINK_RETRIES", 1)
+    return SimpleNamespace(raw=db, collections=collections)
+
+def save(phone_key="14155550100"):
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=7, username="u", first_name="U", last_name=""))
+    context = SimpleNamespace(bot=SimpleNamespace(id=1))
+    state = {"data": {
+        "phone_key": phone_key, "phone_number": "+" + phone_key, "api_id": 1,
+        "api_hash": "h", "account_name": "a"
+    }}
+    me = SimpleNamespace(first_name="A", last_name=None, username=None, id=99)
+    return login.save_account_to_db(update, context, state, "session", me)
+
+async def linked_accounts(db):
+    user = await db.raw.users.find_one({"user_id": 7})
+    return user.get("accounts", []) if user else []
+
+def test_saves_and_links_account(db):
+    async def run():
+        assert await save() is True
+        account = await db.raw.accounts.find_one({})
+        assert await linked_accounts(db) == [account["_id"]]
+    asyncio.run(run())
+
+def test_failed_account_insert_is_unlinked(db):
+    db.collections.accounts = Failing(db.raw.accounts, lambda update: "$setOnInsert" in update)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await save()
+        assert await linked_accounts(db) == []
+    asyncio.run(run())
+
+def test_unlinked_account_is_rolled_back(db):
+    db.collections.users = Failing(db.raw.users, lambda update: "$addToSet" in update)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await save()
+        assert await db.raw.accounts.count_documents({}) == 0
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+from utils.state_store import SQLiteStateBackend, StateStore
+
+def test_secrets_are_stripped_and_saves_coalesce(tmp_path):
+    async def run():
+        backend = SQLiteStateBackend(str(tmp_path / "states.db"))
+        await backend.setup()
+        store = StateStore(backend)
+
+        state = {
+            "step": "get_target",
+            "data": {"api_id": 1, "api_hash": "hash", "password": "hunter2"},
+            "accounts": [{"phone_number": "+1", "session_string": "secret"}],
+            "app": object()
+        }
+        for step in ("get_target", "get_message", "get_accounts"):
+            state["step"] = step
+            store.save("send", 1, state, {"app"}, None)
+        await store.close()
+
+        await backend.setup()
+        loaded = await store.load("send", 1)
+        await backend.close()
+        return store, loaded
+
+    store, loaded = asyncio.run(run())
+    assert store.writes == 1 and store.coalesced == 2
+    assert loaded == {
+        "step": "get_accounts",
+        "data": {"api_id": 1},
+        "accounts": [{"phone_number": "+1"}]
+    }
+
+def test_delete_replaces_a_pending_save(tmp_path):
+    async def run():
+        backend = SQLiteStateBackend(str(tmp_path / "states.db"))
+        await backend.setup()
+        store = StateStore(backend)
+        store.save("send", 1, {"step": "get_target"}, set(), None)
+        store.delete("send", 1)
+        await store.close()
+        await backend.setup()
+        loaded = await store.load("send", 1)
+        await backend.close()
+        return loaded
+
+    assert asyncio.run(run()) is None
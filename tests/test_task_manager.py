@@ -0,0 +1,44 @@
+import asyncio
+import time
+from utils.task_manager import TaskManager
+
+def test_drain_does_not_wait_on_a_task_that_ignores_cancellation():
+    async def stubborn():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            await asyncio.sleep(1)
+
+    async def run():
+        manager = TaskManager()
+        manager.spawn(stubborn(), owner=1, kind="send")
+        await asyncio.sleep(0)
+
+        start = time.monotonic()
+        finished, cancelled = await manager.drain(timeout=0.05, cancel_timeout=0.1)
+        return finished, cancelled, time.monotonic() - start
+
+    finished, cancelled, elapsed = asyncio.run(run())
+    assert (finished, cancelled) == (0, 1)
+    assert elapsed < 0.5
+
+def test_cancel_stops_a_running_loop():
+    processed = []
+
+    async def loop():
+        for item in range(100):
+            processed.append(item)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        manager = TaskManager()
+        task = manager.spawn(loop(), owner=1, kind="send")
+        await asyncio.sleep(0.035)
+        assert manager.cancel(1, "send") == 1
+        await asyncio.wait([task])
+        return task, manager
+
+    task, manager = asyncio.run(run())
+    assert task.cancelled()
+    assert len(processed) < 10
+    assert not manager.is_running(1, "send")
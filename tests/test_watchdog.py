@@ -0,0 +1,21 @@
+import asyncio
+import time
+import pytest
+from utils.watchdog import BlockingCallError, detect_blocking
+
+def test_synchronous_sleep_is_reported():
+    async def run():
+        async with detect_blocking(50):
+            time.sleep(0.2)
+
+    with pytest.raises(BlockingCallError, match="limit 50ms"):
+        asyncio.run(run())
+
+def test_awaited_io_passes():
+    async def run():
+        async with detect_blocking(50):
+            await asyncio.sleep(0.2)
+            # Blocking work moved off the loop does not count either
+            await asyncio.to_thread(time.sleep, 0.2)
+
+    asyncio.run(run())
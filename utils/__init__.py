@@ -4,6 +4,7 @@ Utilities package for Telegram Account Manager Bot
 
 from .helpers import (
     setup_logging,
+    stop_logging,
     log_to_channel,
     create_pyrogram_session,
     validate_phone_number,
@@ -18,6 +19,77 @@ from .helpers import (
     sanitize_text
 )
 
+from .otp_parser import (
+    extract_otp_with_rank,
+    OTP_PATTERN
+)
+
+from .otp_store import (
+    OTPStore,
+    otp_store
+)
+
+from .conversation import (
+    FlowStates,
+    ConversationRegistry,
+    conversations
+)
+
+from .login_store import LoginStateStore
+
+from .callback_router import (
+    CallbackRouter,
+    callback_router
+)
+
+from .channel_sink import (
+    ChannelLogSink,
+    channel_sink
+)
+
+from .task_manager import (
+    TaskManager,
+    TaskLimitError,
+    task_manager
+)
+
+from .metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    metrics
+)
+
+from .perf import (
+    LatencySketch,
+    PerfRegistry,
+    perf,
+    timed
+)
+
+from .watchdog import (
+    LoopWatchdog,
+    BlockingCallError,
+    detect_blocking,
+    loop_watchdog
+)
+
+from .profiling import (
+    Profiler,
+    profiler
+)
+
+from .update_processor import (
+    UserOrderedUpdateProcessor,
+    update_processor
+)
+
+from .state_store import (
+    StateStore,
+    MongoStateBackend,
+    SQLiteStateBackend,
+    init_state_store
+)
+
 from .session_manager import (
     SessionManager,
     session_manager,
@@ -33,13 +105,19 @@ from .session_manager import (
 try:
     from .rate_limiter import (
         RateLimiter,
+        RedisRateLimiter,
         rate_limiter,
+        init_rate_limiter,
         check_rate_limit,
         RATE_LIMITS,
         get_wait_time,
         reset_limits,
         get_stats as get_rate_limiter_stats
     )
+    from .rate_limit_middleware import (
+        RateLimitMiddleware,
+        rate_limit_middleware
+    )
     RATE_LIMITER_AVAILABLE = True
 except ImportError:
     RATE_LIMITER_AVAILABLE = False
@@ -51,6 +129,7 @@ except ImportError:
     rate_limiter = DummyRateLimiter()
     RATE_LIMITS = {}
     
+    async def init_rate_limiter(): return False
     async def check_rate_limit(*args, **kwargs): return True, None
     async def get_wait_time(*args, **kwargs): return 0
     async def reset_limits(*args, **kwargs): pass
@@ -95,11 +174,11 @@ except ImportError:
 try:
     from .monitor import (
         BotMonitor,
+        bot_monitor,
         get_system_stats,
         get_bot_stats
     )
     MONITOR_AVAILABLE = True
-    bot_monitor = BotMonitor()
 except ImportError:
     MONITOR_AVAILABLE = False
     bot_monitor = None
@@ -116,6 +195,7 @@ except ImportError:
 __all__ = [
     # Helpers
     'setup_logging',
+    'stop_logging',
     'log_to_channel',
     'create_pyrogram_session',
     'validate_phone_number',
@@ -129,6 +209,44 @@ __all__ = [
     'format_time_delta',
     'sanitize_text',
     
+    # OTP Parser
+    'extract_otp_with_rank',
+    'OTP_PATTERN',
+    'OTPStore',
+    'otp_store',
+    
+    # Conversations
+    'FlowStates',
+    'ConversationRegistry',
+    'conversations',
+    'LoginStateStore',
+    'StateStore',
+    'CallbackRouter',
+    'callback_router',
+    'ChannelLogSink',
+    'channel_sink',
+    'TaskManager',
+    'TaskLimitError',
+    'task_manager',
+    'MetricsRegistry',
+    'MetricsServer',
+    'metrics',
+    'LatencySketch',
+    'PerfRegistry',
+    'perf',
+    'timed',
+    'LoopWatchdog',
+    'BlockingCallError',
+    'detect_blocking',
+    'loop_watchdog',
+    'Profiler',
+    'profiler',
+    'UserOrderedUpdateProcessor',
+    'update_processor',
+    'MongoStateBackend',
+    'SQLiteStateBackend',
+    'init_state_store',
+    
     # Session Manager
     'SessionManager',
     'session_manager',
@@ -141,7 +259,11 @@ __all__ = [
     
     # Rate Limiter
     'RateLimiter',
+    'RedisRateLimiter',
     'rate_limiter',
+    'init_rate_limiter',
+    'RateLimitMiddleware',
+    'rate_limit_middleware',
     'check_rate_limit',
     'RATE_LIMITS',
     'get_wait_time',
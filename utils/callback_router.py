@@ -0,0 +1,192 @@
+import re
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
+from bson import ObjectId
+import logging
+from utils.metrics import handler_seconds
+from utils.perf import perf
+
+logger = logging.getLogger(__name__)
+
+# Typed route parameters, anything else after the colon is a set of choices
+PARAM_TYPES = {
+    "int": (r"-?\d+", int),
+    "oid": (r"[0-9a-fA-F]{24}", ObjectId),
+    "str": (r"[^_]+", str),
+}
+
+PARAM_PATTERN = re.compile(r"\{(\w+)(?::([^}]+))?\}")
+
+class Route:
+    """A registered callback pattern and its latency counters"""
+
+    def __init__(
+        self,
+        pattern: str,
+        handler: Callable[..., Awaitable],
+        guard: Optional[Callable[[int], Awaitable[bool]]] = None,
+        with_update: bool = False
+    ):
+        self.pattern = pattern
+        self.handler = handler
+        self.guard = guard
+        self.with_update = with_update
+        self.converters: Dict[str, Callable] = {}
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+        match = PARAM_PATTERN.search(pattern)
+        self.prefix = pattern[:match.start()] if match else pattern
+        self.regex = self._compile(pattern[len(self.prefix):]) if match else None
+
+    def _compile(self, tail: str):
+        regex = ""
+        position = 0
+        for match in PARAM_PATTERN.finditer(tail):
+            name, kind = match.group(1), match.group(2) or "str"
+            if kind in PARAM_TYPES:
+                expression, converter = PARAM_TYPES[kind]
+            else:
+                expression = "|".join(re.escape(choice) for choice in kind.split("|"))
+                converter = str
+            regex += re.escape(tail[position:match.start()]) + f"(?P<{name}>{expression})"
+            self.converters[name] = converter
+            position = match.end()
+        regex += re.escape(tail[position:])
+        return re.compile(regex)
+
+    def parse(self, remainder: str) -> Optional[Dict[str, Any]]:
+        """Parse typed parameters from the data after the prefix"""
+        match = self.regex.fullmatch(remainder)
+        if not match:
+            return None
+        return {name: self.converters[name](value) for name, value in match.groupdict().items()}
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+class TrieNode:
+    __slots__ = ("children", "exact", "patterns")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.exact: Optional[Route] = None
+        self.patterns: List[Route] = []
+
+class CallbackRouter:
+    """Resolves callback data to its handler through a prefix trie"""
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.routes: Dict[str, Route] = {}
+        self.unmatched = 0
+
+    def add(
+        self,
+        pattern: str,
+        handler: Callable[..., Awaitable],
+        guard: Optional[Callable[[int], Awaitable[bool]]] = None,
+        with_update: bool = False
+    ) -> Route:
+        """
+        Register a callback pattern such as "otp_account_{account_id:oid}"
+
+        Handlers are called as handler(query, context, **params), or with the
+        update instead of the query when with_update is set. Exact patterns win
+        over parameterized ones, longer prefixes over shorter ones.
+        """
+        if pattern in self.routes:
+            raise ValueError(f"Callback route already registered: {pattern}")
+
+        route = Route(pattern, handler, guard, with_update)
+        node = self.root
+        for char in route.prefix:
+            node = node.children.setdefault(char, TrieNode())
+
+        if route.regex is None:
+            node.exact = route
+        else:
+            node.patterns.append(route)
+
+        self.routes[pattern] = route
+        return route
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], Dict[str, Any]]:
+        """Find the route and parameters for callback data"""
+        node = self.root
+        candidates: List[Tuple[int, TrieNode]] = []
+
+        for index, char in enumerate(data):
+            if node.patterns:
+                candidates.append((index, node))
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if node.exact:
+                return node.exact, {}
+            if node.patterns:
+                candidates.append((len(data), node))
+
+        for index, candidate in reversed(candidates):
+            remainder = data[index:]
+            for route in candidate.patterns:
+                params = route.parse(remainder)
+                if params is not None:
+                    return route, params
+
+        return None, {}
+
+    async def dispatch(self, update, context) -> bool:
+        """Answer a callback query and run its route, returns False if none matched"""
+        query = update.callback_query
+        await query.answer()
+
+        route, params = self.resolve(query.data or "")
+        if route is None:
+            self.unmatched += 1
+            logger.debug(f"No callback route for {query.data}")
+            return False
+
+        start = time.perf_counter()
+        error = False
+        try:
+            if route.guard and not await route.guard(query.from_user.id):
+                await query.edit_message_text("❌ Unauthorized!")
+                return True
+
+            await route.handler(update if route.with_update else query, context, **params)
+        except Exception:
+            route.errors += 1
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            route.record(elapsed)
+            handler_seconds.observe(elapsed, kind="callback", name=route.pattern)
+            perf.record(f"callback:{route.pattern}", elapsed, error)
+
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-route call counts and latency"""
+        return {
+            "routes": {
+                pattern: {
+                    "calls": route.calls,
+                    "errors": route.errors,
+                    "avg_ms": (route.total_seconds / route.calls * 1000) if route.calls else 0.0,
+                    "max_ms": route.max_seconds * 1000
+                }
+                for pattern, route in self.routes.items()
+                if route.calls
+            },
+            "unmatched": self.unmatched
+        }
+
+# Global callback router
+callback_router = CallbackRouter()
@@ -0,0 +1,211 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Deque, Tuple, List
+from telegram.error import RetryAfter, TimedOut, NetworkError, BadRequest, Forbidden
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖\n\n"
+
+class ChannelQueue:
+    """Pending log events of one channel and the worker that sends them"""
+
+    __slots__ = ("channel_id", "bot", "events", "wakeup", "worker", "last_sent", "backoff_until")
+
+    def __init__(self, channel_id: int, bot):
+        self.channel_id = channel_id
+        self.bot = bot
+        self.events: Deque[Tuple[str, Optional[str]]] = deque()
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+        self.last_sent = 0.0
+        self.backoff_until = 0.0
+
+class ChannelLogSink:
+    """
+    Coalesces channel log events into digest messages
+
+    Each channel gets its own queue and worker. The worker waits up to window
+    seconds after the first event, packs everything queued into messages of
+    at most 4096 characters and keeps min_interval seconds between sends to
+    the same chat. 429 responses are retried after the delay Telegram asks for.
+    """
+
+    def __init__(
+        self,
+        window: float = 5.0,
+        min_interval: float = 3.0,
+        max_queue: int = 1000,
+        max_retries: int = 5
+    ):
+        self.window = window
+        self.min_interval = min_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.channels: Dict[int, ChannelQueue] = {}
+        self.closing = False
+        self.events = 0
+        self.messages_sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+
+    def enqueue(self, bot, channel_id: int, message: str, parse_mode: Optional[str] = "HTML") -> bool:
+        """Queue a log event for channel_id, returns False if it was dropped"""
+        if not channel_id:
+            return False
+
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = ChannelQueue(channel_id, bot)
+
+        if len(channel.events) >= self.max_queue:
+            channel.events.popleft()
+            self.dropped += 1
+
+        channel.events.append((message, parse_mode))
+        channel.bot = bot
+        channel.wakeup.set()
+        self.events += 1
+
+        if channel.worker is None or channel.worker.done():
+            try:
+                channel.worker = asyncio.get_running_loop().create_task(
+                    self._worker(channel), name=f"channel_sink:{channel_id}"
+                )
+            except RuntimeError:
+                pass
+
+        return True
+
+    def build_digests(self, events: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+        """Pack events into as few messages as fit, never mixing parse modes"""
+        digests: List[Tuple[str, Optional[str]]] = []
+        text, mode = "", None
+
+        for message, parse_mode in events:
+            if len(message) > MESSAGE_LIMIT:
+                # Cutting markup could leave it unbalanced, send the cut as plain text
+                message, parse_mode = message[:MESSAGE_LIMIT - 1] + "…", None
+
+            if text and parse_mode == mode and len(text) + len(DIGEST_SEPARATOR) + len(message) <= MESSAGE_LIMIT:
+                text += DIGEST_SEPARATOR + message
+                continue
+
+            if text:
+                digests.append((text, mode))
+            text, mode = message, parse_mode
+
+        if text:
+            digests.append((text, mode))
+        return digests
+
+    async def _worker(self, channel: ChannelQueue):
+        while True:
+            if not channel.events:
+                if self.closing:
+                    return
+                channel.wakeup.clear()
+                await channel.wakeup.wait()
+                continue
+
+            # Collect events for one window, unless we are flushing
+            if not self.closing:
+                try:
+                    await asyncio.wait_for(self._until_closing(channel), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+
+            events = list(channel.events)
+            channel.events.clear()
+
+            for text, parse_mode in self.build_digests(events):
+                await self._send(channel, text, parse_mode)
+
+    async def _until_closing(self, channel: ChannelQueue):
+        while not self.closing:
+            channel.wakeup.clear()
+            await channel.wakeup.wait()
+
+    async def _send(self, channel: ChannelQueue, text: str, parse_mode: Optional[str]):
+        for attempt in range(self.max_retries + 1):
+            delay = max(
+                channel.last_sent + self.min_interval - time.monotonic(),
+                channel.backoff_until - time.monotonic()
+            )
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                await channel.bot.send_message(
+                    chat_id=channel.channel_id,
+                    text=text,
+                    parse_mode=parse_mode
+                )
+                channel.last_sent = time.monotonic()
+                self.messages_sent += 1
+                return
+            except RetryAfter as e:
+                retry_after = float(e.retry_after)
+                channel.backoff_until = time.monotonic() + retry_after
+                logger.warning(f"⚠️ Log channel {channel.channel_id} rate limited, retrying in {retry_after}s")
+            except (BadRequest, Forbidden) as e:
+                # Retrying will not fix a bad message or a missing channel
+                logger.error(f"❌ Failed to log to channel {channel.channel_id}: {e}")
+                self.failed += 1
+                return
+            except (TimedOut, NetworkError) as e:
+                channel.backoff_until = time.monotonic() + min(2 ** attempt, 60)
+                logger.warning(f"⚠️ Network error logging to channel {channel.channel_id}: {e}")
+            except Exception as e:
+                logger.error(f"❌ Failed to log to channel {channel.channel_id}: {e}")
+                self.failed += 1
+                return
+
+            self.retries += 1
+
+        self.failed += 1
+        logger.error(f"❌ Giving up on log message for channel {channel.channel_id} after {self.max_retries} retries")
+
+    async def close(self, timeout: float = 30):
+        """Send everything still queued, cancel what is left after timeout"""
+        self.closing = True
+        workers = []
+        for channel in self.channels.values():
+            channel.wakeup.set()
+            if channel.worker and not channel.worker.done():
+                workers.append(channel.worker)
+
+        if not workers:
+            return
+
+        done, not_done = await asyncio.wait(workers, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            unsent = sum(len(channel.events) for channel in self.channels.values())
+            logger.warning(f"⚠️ Channel log flush timed out, {len(not_done)} channels cut short ({unsent} queued events lost)")
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get channel log statistics"""
+        return {
+            "channels": len(self.channels),
+            "queued": sum(len(channel.events) for channel in self.channels.values()),
+            "events": self.events,
+            "messages_sent": self.messages_sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries
+        }
+
+# Global channel log sink
+channel_sink = ChannelLogSink(
+    window=Config.CHANNEL_LOG_WINDOW,
+    min_interval=Config.CHANNEL_LOG_INTERVAL,
+    max_queue=Config.CHANNEL_LOG_MAX_QUEUE
+)
@@ -0,0 +1,263 @@
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterable
+import logging
+from utils.metrics import handler_seconds
+from utils.perf import perf
+
+logger = logging.getLogger(__name__)
+
+class FlowStates(dict):
+    """Conversation states of one flow, kept in step with the registry"""
+
+    def __init__(
+        self,
+        name: str,
+        registry: Optional["ConversationRegistry"] = None,
+        ttl: Optional[int] = None,
+        transient_keys: Iterable[str] = ()
+    ):
+        super().__init__()
+        self.name = name
+        self.registry = registry or conversations
+        self.handler: Optional[Callable[..., Awaitable]] = None
+        self.ttl = ttl
+        self.transient_keys = set(transient_keys)
+        self.expires: Dict[int, float] = {}
+        self.pending = set()
+        self.registry.flows[name] = self
+
+    def __setitem__(self, user_id: int, state: Dict[str, Any]):
+        self.registry.activate(user_id, self)
+        self.pending.discard(user_id)
+        super().__setitem__(user_id, state)
+        self.registry.persist(user_id)
+
+    def __delitem__(self, user_id: int):
+        super().__delitem__(user_id)
+        self.registry.deactivate(user_id, self)
+
+    def pop(self, user_id: int, *default):
+        state = super().pop(user_id, *default)
+        self.registry.deactivate(user_id, self)
+        return state
+
+    def setdefault(self, user_id: int, state: Optional[Dict[str, Any]] = None):
+        if user_id not in self:
+            self[user_id] = state
+        return dict.__getitem__(self, user_id)
+
+    def update(self, *args, **kwargs):
+        for user_id, state in dict(*args, **kwargs).items():
+            self[user_id] = state
+
+    def clear(self):
+        for user_id in list(self) + list(self.pending):
+            self.registry.deactivate(user_id, self)
+        super().clear()
+
+    def on_evict(self, user_id: int, state: Optional[Dict[str, Any]]):
+        """Called when a state is dropped because another flow took over"""
+        pass
+
+    def on_load(self, user_id: int, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Called when a persisted state is restored, None drops it"""
+        return state
+
+class ConversationRegistry:
+    """Maps each user to their single active flow and its message handler"""
+
+    def __init__(self):
+        self.flows: Dict[str, FlowStates] = {}
+        self.active: Dict[int, FlowStates] = {}
+        self.store = None
+        self.default_ttl: Optional[int] = None
+        self.routed = 0
+        self.unrouted = 0
+        self.expired = 0
+        self.restored = 0
+        self.routing_seconds = 0.0
+
+    def register_handler(self, name: str, handler: Callable[..., Awaitable]):
+        """Attach the message handler of a flow"""
+        flow = self.flows.get(name)
+        if flow is None:
+            raise KeyError(f"Unknown conversation flow: {name}")
+        flow.handler = handler
+
+    def attach(self, store, default_ttl: Optional[int] = None):
+        """Use store for write-behind persistence, None keeps states in memory"""
+        self.store = store
+        self.default_ttl = default_ttl
+
+    def activate(self, user_id: int, flow: FlowStates):
+        """Make flow the active one for user, evicting any other flow's state"""
+        current = self.active.get(user_id)
+        if current is not None and current is not flow:
+            state = dict.pop(current, user_id, None)
+            self._forget(user_id, current)
+            current.on_evict(user_id, state)
+        self.active[user_id] = flow
+
+    def deactivate(self, user_id: int, flow: FlowStates):
+        """Forget the active flow for user if it is flow"""
+        if self.active.get(user_id) is flow:
+            del self.active[user_id]
+            self._forget(user_id, flow)
+
+    def _forget(self, user_id: int, flow: FlowStates):
+        flow.expires.pop(user_id, None)
+        flow.pending.discard(user_id)
+        if self.store:
+            self.store.delete(flow.name, user_id)
+
+    def persist(self, user_id: int):
+        """Refresh the TTL of user's state and queue it for the store's writer"""
+        flow = self.active.get(user_id)
+        if flow is None or not dict.__contains__(flow, user_id):
+            return
+
+        ttl = flow.ttl or self.default_ttl
+        if ttl:
+            flow.expires[user_id] = time.time() + ttl
+
+        if self.store:
+            self.store.save(
+                flow.name,
+                user_id,
+                dict.__getitem__(flow, user_id),
+                flow.transient_keys,
+                flow.expires.get(user_id)
+            )
+
+    def resolve(self, user_id: int) -> Optional[FlowStates]:
+        """Get the active flow for user"""
+        flow = self.active.get(user_id)
+        if flow is not None:
+            expires_at = flow.expires.get(user_id)
+            if expires_at and expires_at < time.time():
+                self.expired += 1
+                self.cancel(user_id)
+                flow = None
+
+        if flow is None or flow.handler is None:
+            self.unrouted += 1
+            return None
+
+        self.routed += 1
+        return flow
+
+    async def dispatch(self, update, context) -> bool:
+        """
+        Run the message handler of user's active flow and queue its state for
+        the store, False if the user has no active flow. Time spent outside the
+        handler (resolving, lazy loading, persisting) is the routing overhead,
+        recorded as kind="routing" in handler_seconds and as routing:<flow>
+        in perf.
+        """
+        user_id = update.effective_user.id
+        start = time.perf_counter()
+        flow = self.resolve(user_id)
+        if flow and user_id in flow.pending:
+            flow = await self.load(user_id)
+        if flow is None:
+            self._record_routing("unrouted", time.perf_counter() - start)
+            return False
+
+        overhead = time.perf_counter() - start
+        try:
+            with handler_seconds.time(kind="message", name=flow.name):
+                await flow.handler(update, context)
+        except Exception as e:
+            logger.error(f"❌ Error in {flow.name} message handler: {e}")
+            self._record_routing(flow.name, overhead)
+            return True
+
+        # Handlers mutate states in place, queue the result for the writer
+        persist_start = time.perf_counter()
+        self.persist(user_id)
+        self._record_routing(flow.name, overhead + time.perf_counter() - persist_start)
+        return True
+
+    def _record_routing(self, name: str, seconds: float):
+        self.routing_seconds += seconds
+        handler_seconds.observe(seconds, kind="routing", name=name)
+        perf.record(f"routing:{name}", seconds)
+
+    async def load(self, user_id: int) -> Optional[FlowStates]:
+        """Bring user's persisted state back into memory if it was not loaded yet"""
+        flow = self.active.get(user_id)
+        if flow is None or user_id not in flow.pending:
+            return flow
+
+        flow.pending.discard(user_id)
+        state = None
+        try:
+            state = await self.store.load(flow.name, user_id)
+        except Exception as e:
+            logger.error(f"❌ Error loading {flow.name} state for {user_id}: {e}")
+
+        if state is not None:
+            state = flow.on_load(user_id, state)
+
+        if state is None:
+            self.deactivate(user_id, flow)
+            return None
+
+        dict.__setitem__(flow, user_id, state)
+        self.restored += 1
+        return flow
+
+    async def rehydrate(self) -> int:
+        """Restore the user to flow index from the store, states load lazily"""
+        if not self.store:
+            return 0
+
+        now = time.time()
+        count = 0
+        for name, user_id, expires_at in await self.store.load_index():
+            flow = self.flows.get(name)
+            if flow is None or (expires_at and expires_at < now) or user_id in self.active:
+                self.store.delete(name, user_id)
+                continue
+
+            self.active[user_id] = flow
+            flow.pending.add(user_id)
+            if expires_at:
+                flow.expires[user_id] = expires_at
+            count += 1
+
+        return count
+
+    def cancel(self, user_id: int) -> Optional[str]:
+        """End the active conversation of user, returns the flow name"""
+        flow = self.active.get(user_id)
+        if flow is None:
+            return None
+
+        state = flow.pop(user_id, None)
+        flow.on_evict(user_id, state)
+        return flow.name
+
+    async def close(self):
+        """Flush pending state writes"""
+        if self.store:
+            await self.store.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get conversation routing statistics"""
+        total = self.routed + self.unrouted
+        stats = {
+            "active_conversations": len(self.active),
+            "flows": {name: len(flow) + len(flow.pending) for name, flow in self.flows.items()},
+            "routed": self.routed,
+            "unrouted": self.unrouted,
+            "expired": self.expired,
+            "restored": self.restored,
+            "avg_routing_us": (self.routing_seconds / total * 1e6) if total else 0.0
+        }
+        if self.store:
+            stats["store"] = self.store.get_stats()
+        return stats
+
+# Global conversation registry
+conversations = ConversationRegistry()
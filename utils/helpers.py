@@ -1,31 +1,101 @@
 import logging
 import asyncio
+import atexit
+import json
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from config import Config
-from pyrogram import Client
-from pyrogram.errors import (
-    SessionPasswordNeeded, PhoneCodeInvalid,
-    PhoneCodeExpired, FloodWait, AuthKeyUnregistered
-)
 import re
+from utils.otp_parser import extract_otp_from_text
+from utils.channel_sink import channel_sink
+from utils.metrics import pyrogram_seconds
 
 config = Config()
 
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records logged with extra={"sampled": True}"""
+    
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+log_listener: Optional[QueueListener] = None
+log_queue_handler: Optional[QueueHandler] = None
+# File and stdout handlers put back on the root logger by stop_logging
+log_direct_handlers: List[logging.Handler] = []
+
 def setup_logging():
-    """Setup logging configuration"""
+    """
+    Setup logging configuration
+    
+    Records are put on a queue by the calling thread and written to the
+    rotating log file and stdout by a listener thread, so the event loop
+    never waits on disk or terminal writes.
+    """
+    global log_listener, log_queue_handler
+    if log_listener is not None:
+        return
+    
+    root = logging.getLogger()
+    for handler in log_direct_handlers:
+        root.removeHandler(handler)
+        handler.close()
+    log_direct_handlers.clear()
+    
     # Create logs directory if it doesn't exist
-    os.makedirs("logs", exist_ok=True)
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/bot.log'),
-            logging.StreamHandler()
-        ]
+    log_dir = os.path.dirname(config.LOG_FILE)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    
+    if config.LOG_JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    file_handler = RotatingFileHandler(
+        config.LOG_FILE,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8"
     )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    
+    # Sampled records are dropped before they reach the queue
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE))
+    
+    root.setLevel(getattr(logging, config.LOG_LEVEL.upper(), logging.INFO))
+    root.addHandler(queue_handler)
+    log_queue_handler = queue_handler
+    
+    log_listener = QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_logging)
     
     # Set specific log levels
     logging.getLogger('pyrogram').setLevel(logging.WARNING)
@@ -34,19 +104,33 @@ def setup_logging():
     logger = logging.getLogger(__name__)
     logger.info("✅ Logging setup complete")
 
+def stop_logging():
+    """
+    Write out queued log records and stop the listener thread
+
+    The queue handler is taken off the root logger and the file and stdout
+    handlers are attached directly, so records logged after this are still
+    written instead of queued for a listener that is gone.
+    """
+    global log_listener, log_queue_handler
+    if log_listener is None:
+        return
+    
+    log_listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(log_queue_handler)
+    for handler in log_listener.handlers:
+        for log_filter in log_queue_handler.filters:
+            handler.addFilter(log_filter)
+        root.addHandler(handler)
+        log_direct_handlers.append(handler)
+    
+    log_listener = None
+    log_queue_handler = None
+
 async def log_to_channel(bot, channel_id: int, message: str, parse_mode: str = "HTML"):
-    """Log message to a channel"""
-    if channel_id:
-        try:
-            await bot.send_message(
-                chat_id=channel_id,
-                text=message,
-                parse_mode=parse_mode
-            )
-            return True
-        except Exception as e:
-            logging.error(f"❌ Failed to log to channel {channel_id}: {e}")
-    return False
+    """Queue a log message for a channel, it is sent with the next digest"""
+    return channel_sink.enqueue(bot, channel_id, message, parse_mode)
 
 async def create_pyrogram_session(
     api_id: int,
@@ -55,6 +139,8 @@ async def create_pyrogram_session(
     session_name: str = None
 ) -> Optional[str]:
     """Create Pyrogram session and return session string"""
+    from pyrogram import Client
+    
     if not session_name:
         session_name = f"sessions/{phone_number}"
     
@@ -66,7 +152,8 @@ async def create_pyrogram_session(
     )
     
     try:
-        await app.connect()
+        with pyrogram_seconds.time(operation="connect"):
+            await app.connect()
         sent_code = await app.send_code(phone_number)
         return None  # OTP needed
         
@@ -190,29 +277,6 @@ async def split_list(lst: List, n: int) -> List[List]:
     """Split list into chunks of size n"""
     return [lst[i:i + n] for i in range(0, len(lst), n)]
 
-def extract_otp_from_text(text: str) -> Optional[str]:
-    """Extract OTP from text message"""
-    if not text:
-        return None
-    
-    # Common OTP patterns
-    patterns = [
-        r'\b\d{4,6}\b',  # 4-6 digit OTP
-        r'code[\s:]*(\d{4,6})',
-        r'OTP[\s:]*(\d{4,6})',
-        r'password[\s:]*(\d{4,6})',
-        r'verification[\s:]*(\d{4,6})',
-        r'\b(\d{4,6})\s+is your',
-        r'your code is[\s:]*(\d{4,6})',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            return matches[0]
-    
-    return None
-
 def format_time_delta(delta_seconds: float) -> str:
     """Format time delta in human readable format"""
     if delta_seconds < 60:
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Tuple
+import logging
+from utils.conversation import FlowStates
+from utils.task_manager import task_manager
+
+logger = logging.getLogger(__name__)
+
+class LoginStateStore(FlowStates):
+    """Pending login states that disconnect and drop clients left idle on a step"""
+
+    def __init__(
+        self,
+        name: str = "login",
+        step_timeout: int = 300,
+        step_timeouts: Optional[Dict[str, int]] = None,
+        max_pending: int = 50,
+        sweep_interval: int = 30,
+        registry=None
+    ):
+        super().__init__(name, registry=registry, transient_keys=("app", "submitted_at"))
+        self.step_timeout = step_timeout
+        self.step_timeouts = step_timeouts or {}
+        self.max_pending = max_pending
+        self.sweep_interval = sweep_interval
+        self.step_seen: Dict[int, Tuple[Optional[str], float]] = {}
+        self.reaped = 0
+        self.completions = 0
+        self.completion_seconds = 0.0
+        self.max_completion_seconds = 0.0
+        self.reaper_task: Optional[asyncio.Task] = None
+        self.bot = None
+
+    def __setitem__(self, user_id: int, state: Dict[str, Any]):
+        super().__setitem__(user_id, state)
+        self.step_seen[user_id] = (state.get("step"), time.monotonic())
+        self.ensure_reaper()
+
+    def __delitem__(self, user_id: int):
+        super().__delitem__(user_id)
+        self.step_seen.pop(user_id, None)
+
+    def set_step(self, user_id: int, step: str):
+        """Move a pending login to step, its timeout starts now"""
+        state = dict.get(self, user_id)
+        if state is None or state.get("step") == step:
+            return
+        state["step"] = step
+        self.step_seen[user_id] = (step, time.monotonic())
+
+    def pop(self, user_id: int, *default):
+        self.step_seen.pop(user_id, None)
+        return super().pop(user_id, *default)
+
+    def clear(self):
+        super().clear()
+        self.step_seen.clear()
+
+    def on_evict(self, user_id: int, state: Optional[Dict[str, Any]]):
+        """Disconnect the client of a login dropped for another flow"""
+        self.step_seen.pop(user_id, None)
+        app = state.get("app") if state else None
+        if app:
+            task_manager.spawn(self._disconnect(user_id, app), kind="login_disconnect")
+
+    def on_load(self, user_id: int, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Drop restored logins that were waiting on a client lost in the restart,
+        or that need the api_hash, which is never persisted
+        """
+        if state.get("step") not in ("api_id", "api_hash"):
+            return None
+
+        self.step_seen[user_id] = (state.get("step"), time.monotonic())
+        self.ensure_reaper()
+        return state
+
+    async def _disconnect(self, user_id: int, app):
+        try:
+            await app.disconnect()
+        except Exception as e:
+            logger.error(f"❌ Error disconnecting login client for {user_id}: {e}")
+
+    def is_full(self) -> bool:
+        """Check if the global cap on pending logins is reached"""
+        return len(self) >= self.max_pending
+
+    def open_clients(self) -> int:
+        """Count pending logins holding a connected Pyrogram client"""
+        return sum(1 for state in self.values() if state.get("app"))
+
+    async def discard(self, user_id: int) -> bool:
+        """Disconnect and drop a pending login"""
+        state = self.pop(user_id, None)
+        if state is None:
+            return False
+
+        app = state.get("app")
+        if app:
+            await self._disconnect(user_id, app)
+        return True
+
+    async def reap_expired(self) -> int:
+        """Discard logins that stayed on the same step longer than its timeout"""
+        now = time.monotonic()
+        reaped = 0
+
+        for user_id, state in list(self.items()):
+            step = state.get("step")
+            seen_step, since = self.step_seen.get(user_id, (step, now))
+
+            # Step changed without set_step, restart its clock
+            if step != seen_step:
+                self.step_seen[user_id] = (step, now)
+                continue
+
+            timeout = self.step_timeouts.get(step, self.step_timeout)
+            if now - since > timeout:
+                if await self.discard(user_id):
+                    reaped += 1
+                    logger.info(f"🧹 Reaped stale login for {user_id} at step {step}")
+                    await self.notify_reaped(user_id, step)
+
+        self.reaped += reaped
+        return reaped
+
+    async def notify_reaped(self, user_id: int, step: str):
+        """Tell the user their login timed out"""
+        if self.bot is None:
+            return
+        try:
+            await self.bot.send_message(
+                chat_id=user_id,
+                text=f"⌛ Your login timed out while waiting for the {step.replace('_', ' ')}.\n"
+                     f"Send /login to start again."
+            )
+        except Exception as e:
+            logger.debug(f"Could not notify {user_id} of the reaped login: {e}")
+
+    def ensure_reaper(self):
+        """Start the background reaper if it is not running"""
+        if self.reaper_task and not self.reaper_task.done():
+            return
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self.reaper_task = task_manager.spawn(self._reaper_loop(), kind="login_reaper", daemon=True)
+
+    async def _reaper_loop(self):
+        """Sweep pending logins until none are left"""
+        while self:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.reap_expired()
+            except Exception as e:
+                logger.error(f"❌ Error reaping login states: {e}")
+
+    def record_completion(self, seconds: float):
+        """Record latency from code submission to the success reply"""
+        self.completions += 1
+        self.completion_seconds += seconds
+        self.max_completion_seconds = max(self.max_completion_seconds, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get login store statistics"""
+        return {
+            "pending_logins": len(self),
+            "open_clients": self.open_clients(),
+            "reaped": self.reaped,
+            "max_pending": self.max_pending,
+            "completions": self.completions,
+            "avg_completion_seconds": (
+                self.completion_seconds / self.completions if self.completions else 0.0
+            ),
+            "max_completion_seconds": self.max_completion_seconds
+        }
@@ -0,0 +1,174 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, Optional, Callable, Tuple, List, Awaitable
+from aiohttp import web
+from telegram.request import HTTPXRequest
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+class Histogram:
+    """Latency histogram in the Prometheus text format, safe to observe from any thread"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple[str, ...], List] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket counts, then sum and count
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block, also around awaits"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self.series.items()]
+
+        for key, counts, total, count in sorted(series):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': repr(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+class Gauge:
+    """Gauge whose values are read from callbacks when scraped, a failing callback fails the scrape"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set_function(self, function: Callable[[], float], **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self.functions[key] = function
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, function in sorted(self.functions.items()):
+            value = float(function())
+            lines.append(f"{self.name}{format_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+class MetricsRegistry:
+    """Collects metrics and renders them for a Prometheus scrape"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry and the bot's metrics
+metrics = MetricsRegistry()
+
+handler_seconds = metrics.register(Histogram(
+    "bot_handler_seconds", "Time spent in command, callback and message handlers", ("kind", "name")
+))
+mongo_seconds = metrics.register(Histogram(
+    "bot_mongo_command_seconds", "MongoDB command latency", ("collection", "command", "status")
+))
+pyrogram_seconds = metrics.register(Histogram(
+    "bot_pyrogram_seconds", "Pyrogram client operation latency", ("operation",)
+))
+bot_api_seconds = metrics.register(Histogram(
+    "bot_api_request_seconds", "Telegram Bot API request latency", ("method",)
+))
+queue_depth = metrics.register(Gauge(
+    "bot_queue_depth", "Items waiting in internal queues", ("queue",)
+))
+loop_lag_seconds = metrics.register(Gauge(
+    "bot_event_loop_lag_seconds", "Event loop lag of the latest monitor sample"
+))
+
+def timed_handler(kind: str, name: str, handler: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Wrap a handler callback so its latency is recorded"""
+    @wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with handler_seconds.time(kind=kind, name=name):
+            return await handler(*args, **kwargs)
+    return wrapper
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API request that records latency per API method"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with bot_api_seconds.time(method=url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+class MetricsServer:
+    """Embedded aiohttp server exposing /metrics"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+        self.scrapes = 0
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        self.scrapes += 1
+        return web.Response(
+            text=self.registry.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"📈 Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
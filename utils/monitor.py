@@ -1,25 +1,110 @@
 import asyncio
 import psutil
 import os
+import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple, Optional, List
 import logging
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+class Sample(NamedTuple):
+    """One reading of the process, taken by the sampler"""
+    timestamp: float
+    cpu: float
+    rss: int
+    fds: int
+    sockets: int
+    loop_lag: float
+
 class BotMonitor:
-    def __init__(self):
+    """
+    Samples process CPU, RSS, file descriptors, sockets and event loop lag
+    in the background
+
+    Samples go into a ring buffer of fixed size, so stats are read from
+    memory instead of measured while the caller waits.
+    """
+
+    def __init__(self, interval: float = 5.0, size: int = 720):
         self.start_time = datetime.now()
-        
+        self.interval = interval
+        self.samples: deque = deque(maxlen=size)
+        self.process = psutil.Process(os.getpid())
+        self.sampler_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the sampler task, once"""
+        if self.sampler_task and not self.sampler_task.done():
+            return
+        from utils.task_manager import task_manager
+
+        # The first cpu_percent call only sets the baseline
+        self.process.cpu_percent(None)
+        self.sampler_task = task_manager.spawn(self._sampler_loop(), kind="monitor_sampler", daemon=True)
+
+    async def _sampler_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            # Late wakeups mean something held the event loop
+            loop_lag = max(0.0, loop.time() - expected)
+            try:
+                self.samples.append(await asyncio.to_thread(self._collect, loop_lag))
+            except Exception as e:
+                logger.error(f"❌ Error sampling system stats: {e}")
+
+    def _collect(self, loop_lag: float) -> Sample:
+        with self.process.oneshot():
+            cpu = self.process.cpu_percent(None)
+            rss = self.process.memory_info().rss
+            fds = self.process.num_fds() if hasattr(self.process, "num_fds") else self.process.num_handles()
+        try:
+            sockets = len(self.process.connections(kind="inet"))
+        except psutil.Error:
+            sockets = 0
+        return Sample(time.time(), cpu, rss, fds, sockets, loop_lag)
+
+    def uptime_seconds(self) -> float:
+        return (datetime.now() - self.start_time).total_seconds()
+
+    def recent(self, window: float) -> List[Sample]:
+        """Samples taken in the last window seconds"""
+        cutoff = time.time() - window
+        recent = []
+        for sample in reversed(self.samples):
+            if sample.timestamp < cutoff:
+                break
+            recent.append(sample)
+        return recent
+
+    def summary(self, window: float = 60) -> Dict[str, Any]:
+        """Average and peak of each metric over the last window seconds"""
+        recent = self.recent(window)
+        if not recent:
+            return {"samples": 0}
+
+        summary: Dict[str, Any] = {"samples": len(recent)}
+        for field in ("cpu", "rss", "fds", "sockets", "loop_lag"):
+            values = [getattr(sample, field) for sample in recent]
+            summary[field] = {"avg": sum(values) / len(values), "max": max(values)}
+        return summary
+
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
-            
+            latest = self.samples[-1] if self.samples else None
+
             return {
-                "cpu": cpu_percent,
+                "cpu": latest.cpu if latest else None,
+                "process": latest._asdict() if latest else {},
+                "last_minute": self.summary(60),
+                "last_5_minutes": self.summary(300),
                 "memory": {
                     "total": memory.total,
                     "available": memory.available,
@@ -35,17 +120,17 @@ class BotMonitor:
         except Exception as e:
             logger.error(f"❌ Error getting system stats: {e}")
             return {"error": str(e)}
-    
+
     async def get_bot_stats(self) -> Dict[str, Any]:
         """Get bot statistics"""
         try:
             from database.mongodb import get_accounts_collection
-            
+
             accounts_collection = await get_accounts_collection()
-            
+
             total = await accounts_collection.count_documents({})
             active = await accounts_collection.count_documents({"is_active": True})
-            
+
             return {
                 "total_accounts": total,
                 "active_accounts": active,
@@ -56,12 +141,13 @@ class BotMonitor:
             logger.error(f"❌ Error getting bot stats: {e}")
             return {"error": str(e)}
 
+# Global monitor instance, its start time is the bot's uptime
+bot_monitor = BotMonitor(interval=Config.MONITOR_INTERVAL, size=Config.MONITOR_SAMPLES)
+
 async def get_system_stats() -> Dict[str, Any]:
     """Get system statistics"""
-    monitor = BotMonitor()
-    return await monitor.get_system_stats()
+    return await bot_monitor.get_system_stats()
 
 async def get_bot_stats() -> Dict[str, Any]:
     """Get bot statistics"""
-    monitor = BotMonitor()
-    return await monitor.get_bot_stats()
+    return await bot_monitor.get_bot_stats()
@@ -0,0 +1,95 @@
+import re
+from typing import Optional, Tuple
+
+# Login-code phrases used by Telegram (and most services) in the languages
+# our accounts receive messages in. These are matched before generic keywords.
+LOGIN_CODE_PHRASES = [
+    r"login\s+code",
+    r"log\s*in\s+code",
+    r"sign[\s-]?in\s+code",
+    r"verification\s+code",
+    r"confirmation\s+code",
+    r"security\s+code",
+    r"one[\s-]time\s+(?:pass(?:word|code)|code)",
+    r"код\s+(?:для\s+)?(?:входа|подтверждения)(?:\s+в\s+telegram)?",
+    r"код\s+(?:для\s+)?входу(?:\s+в\s+telegram)?",
+    r"código\s+(?:de\s+)?(?:inicio\s+de\s+sesión|acceso|verificación|login|confirmação|verificação)",
+    r"code\s+de\s+(?:connexion|vérification|confirmation)",
+    r"codice\s+di\s+(?:accesso|verifica|login)",
+    r"(?:login|anmelde|bestätigungs)[\s-]?code",
+    r"giriş\s+kodu",
+    r"kode\s+(?:masuk|login|verifikasi)",
+    r"kod\s+(?:logowania|weryfikacyjny)",
+    r"رمز\s+(?:تسجيل\s+الدخول|الدخول|التحقق)",
+    r"کد\s+(?:ورود|تایید)",
+    r"लॉगिन\s+कोड",
+    r"登录(?:代码|验证码)",
+    r"验证码",
+    r"ログインコード",
+    r"로그인\s*코드",
+]
+
+# Generic keywords that usually precede a code
+CODE_KEYWORDS = [
+    r"code",
+    r"otp",
+    r"pin",
+    r"passcode",
+    r"password",
+    r"verification",
+    r"код",
+    r"código",
+    r"codice",
+    r"kodu?",
+    r"رمز",
+    r"کد",
+]
+
+# Ranked alternatives, highest confidence first. Each alternative has exactly
+# one named capturing group holding the code; the group name maps to a rank.
+_ALTERNATIVES = [
+    ("login", rf"(?:{'|'.join(LOGIN_CODE_PHRASES)})[^\d\n]{{0,12}}?(?P<login>\d{{4,8}})\b"),
+    ("suffix", r"\b(?P<suffix>\d{4,8})\s+(?:is\s+your|is\s+the|это\s+ваш|es\s+tu|est\s+votre)"),
+    ("keyword", rf"\b(?:{'|'.join(CODE_KEYWORDS)})\b[^\d\n]{{0,12}}?(?P<keyword>\d{{4,8}})\b"),
+    ("bare", r"(?<![\d+\-/.:])\b(?P<bare>\d{5,6})\b(?![\-/.:]\d)"),
+]
+
+OTP_RANKS = {
+    "login": 3,
+    "suffix": 2,
+    "keyword": 2,
+    "bare": 1,
+}
+
+OTP_PATTERN = re.compile(
+    "|".join(pattern for _, pattern in _ALTERNATIVES),
+    re.IGNORECASE | re.UNICODE
+)
+
+def extract_otp_with_rank(text: str) -> Tuple[Optional[str], int]:
+    """
+    Extract the highest-confidence OTP from text
+
+    Returns:
+        Tuple of (code, rank) where rank is 0 when nothing was found
+    """
+    if not text:
+        return None, 0
+
+    best_code = None
+    best_rank = 0
+
+    for match in OTP_PATTERN.finditer(text):
+        name = match.lastgroup
+        rank = OTP_RANKS[name]
+        if rank > best_rank:
+            best_code = match.group(name)
+            best_rank = rank
+            if rank == OTP_RANKS["login"]:
+                break
+
+    return best_code, best_rank
+
+def extract_otp_from_text(text: str) -> Optional[str]:
+    """Extract OTP from text message"""
+    return extract_otp_with_rank(text)[0]
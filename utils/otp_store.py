@@ -0,0 +1,72 @@
+import time
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class OTPStore:
+    def __init__(self, ttl: int = 60, max_codes: int = 10):
+        self.ttl = ttl
+        self.max_codes = max_codes
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, account_id) -> Optional[List[Dict[str, Any]]]:
+        """Get cached OTPs for account if they were fetched within the TTL"""
+        entry = self.entries.get(str(account_id))
+        if entry and time.monotonic() - entry["checked_at"] < self.ttl:
+            self.hits += 1
+            return entry["codes"]
+
+        self.misses += 1
+        return None
+
+    def get_stale(self, account_id) -> Optional[Dict[str, Any]]:
+        """Get cached entry regardless of age (codes and watermarks)"""
+        return self.entries.get(str(account_id))
+
+    def put(
+        self,
+        account_id,
+        codes: List[Dict[str, Any]],
+        watermarks: Optional[Dict[str, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """Store OTPs for account, newest first, dropping repeats of the same message"""
+        unique = {}
+        for otp in codes:
+            key = (otp.get("source"), otp.get("id") or (otp.get("code"), otp.get("time")))
+            unique.setdefault(key, otp)
+        codes = sorted(
+            unique.values(),
+            key=lambda otp: otp.get("date") or datetime.min,
+            reverse=True
+        )[:self.max_codes]
+
+        self.entries[str(account_id)] = {
+            "codes": codes,
+            "watermarks": dict(watermarks or {}),
+            "checked_at": time.monotonic()
+        }
+        return codes
+
+    def invalidate(self, account_id=None):
+        """Drop cached OTPs for account or all accounts"""
+        if account_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(str(account_id), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get OTP store statistics"""
+        return {
+            "accounts": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": self.ttl
+        }
+
+# Global OTP store instance
+otp_store = OTPStore(ttl=Config.OTP_CACHE_TTL)
@@ -0,0 +1,121 @@
+import math
+import threading
+import time
+from functools import wraps
+from typing import Dict, Any, Optional, Callable, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LatencySketch:
+    """
+    Streaming latency percentiles in fixed memory
+
+    Durations go into logarithmic buckets that are GAMMA apart, so every
+    percentile is within about 2% of the true value. The bucket array has
+    the same size however many durations are recorded.
+    """
+
+    GAMMA = 1.04
+    MIN_SECONDS = 1e-5
+    BUCKETS = 420  # 10us up to about 137s
+
+    __slots__ = ("counts", "count", "errors", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, error: bool = False):
+        if seconds <= self.MIN_SECONDS:
+            index = 0
+        else:
+            index = min(self.BUCKETS - 1, math.ceil(math.log(seconds / self.MIN_SECONDS, self.GAMMA)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimated duration below which q of the recorded durations fall"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen > rank:
+                # Report the middle of the bucket, capped at the real maximum
+                estimate = self.MIN_SECONDS * self.GAMMA ** index * 2 / (1 + self.GAMMA)
+                return min(estimate, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "calls": self.count,
+            "errors": self.errors,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.quantile(0.50) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+class PerfRegistry:
+    """Latency sketches of every timed route, safe to record from any thread"""
+
+    def __init__(self):
+        self.routes: Dict[str, LatencySketch] = {}
+        self.since = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, error: bool = False):
+        with self.lock:
+            sketch = self.routes.get(route)
+            if sketch is None:
+                sketch = self.routes[route] = LatencySketch()
+            sketch.record(seconds, error)
+
+    def slowest(self, limit: int = 15, key: str = "p95_ms") -> List[Dict[str, Any]]:
+        """Routes with the highest value of key, e.g. p95_ms or errors"""
+        with self.lock:
+            summaries = [{"route": route, **sketch.summary()} for route, sketch in self.routes.items()]
+        summaries.sort(key=lambda summary: summary[key], reverse=True)
+        return summaries[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+        self.since = time.time()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-route percentiles"""
+        with self.lock:
+            return {route: sketch.summary() for route, sketch in self.routes.items()}
+
+# Global perf registry
+perf = PerfRegistry()
+
+def timed(route: Optional[str] = None, kind: str = "handler") -> Callable:
+    """Record the latency and errors of an async handler under kind:route"""
+    def decorator(func: Callable) -> Callable:
+        name = f"{kind}:{route or func.__name__}"
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                perf.record(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
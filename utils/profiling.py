@@ -0,0 +1,236 @@
+import asyncio
+import cProfile
+import io
+import linecache
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STDLIB_ROOT = os.path.dirname(os.__file__)
+
+# Frames of the profilers themselves are left out of heap reports
+HEAP_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+# A loop thread waiting in these functions has nothing to run
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "_run_once"}
+
+def short_path(filename: str) -> str:
+    """Path relative to the bot, the installed package or the standard library"""
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    for root in (PROJECT_ROOT, STDLIB_ROOT):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+    return filename
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+class Profiler:
+    """
+    On-demand CPU profiles and heap snapshots of the running bot
+
+    Nothing is hooked until a run is started: cProfile and the stack
+    sampler are attached only for the requested seconds, and tracemalloc
+    is traced only between heap_start and heap_stop. One CPU profile runs
+    at a time.
+    """
+
+    def __init__(self):
+        self.running: Optional[str] = None
+        self.heap_baseline: Optional[tracemalloc.Snapshot] = None
+        self.heap_started: Optional[float] = None
+        self.runs = 0
+
+    def _begin(self, mode: str):
+        if self.running:
+            raise RuntimeError(f"A {self.running} profile is already running.")
+        self.running = mode
+        self.runs += 1
+
+    async def profile(self, seconds: float, sort: str = "cumulative", top: int = 40) -> str:
+        """Profile every call on the event loop thread for seconds with cProfile"""
+        self._begin("cProfile")
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self.running = None
+
+        return await asyncio.to_thread(self._format_profile, profile, seconds, sort, top)
+
+    @staticmethod
+    def _format_profile(profile: cProfile.Profile, seconds: float, sort: str, top: int) -> str:
+        output = io.StringIO()
+        output.write(
+            f"cProfile of the event loop thread for {seconds:g}s, sorted by {sort}\n"
+            f"Work in asyncio.to_thread workers is not included\n\n"
+        )
+        stats = pstats.Stats(profile, stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        stats.print_callers(min(top, 15))
+        return output.getvalue()
+
+    async def sample(self, seconds: float, interval: float = 0.005, top: int = 40) -> str:
+        """Sample the event loop thread's stack every interval for seconds"""
+        self._begin("sampling")
+        loop_thread_id = threading.get_ident()
+        stop = threading.Event()
+        result: Dict[str, Any] = {}
+        thread = threading.Thread(
+            target=self._sample_loop,
+            args=(loop_thread_id, interval, stop, result),
+            name="profile-sampler",
+            daemon=True
+        )
+        try:
+            thread.start()
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self.running = None
+
+        return self._format_samples(result, seconds, interval, top)
+
+    @staticmethod
+    def _sample_loop(thread_id: int, interval: float, stop: threading.Event, result: Dict[str, Any]):
+        own: Counter = Counter()
+        total: Counter = Counter()
+        samples = idle = 0
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            samples += 1
+            if frame.f_code.co_name in IDLE_FUNCTIONS:
+                idle += 1
+                continue
+
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if leaf:
+                    own[key] += 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    total[key] += 1
+                frame = frame.f_back
+        result.update(own=own, total=total, samples=samples, idle=idle)
+
+    @staticmethod
+    def _format_samples(result: Dict[str, Any], seconds: float, interval: float, top: int) -> str:
+        samples = result.get("samples", 0)
+        busy = samples - result.get("idle", 0)
+        lines = [
+            f"Stack samples of the event loop thread every {interval * 1000:g}ms for {seconds:g}s",
+            f"{samples} samples, {busy} busy ({busy / samples * 100 if samples else 0:.1f}% of the time)",
+            ""
+        ]
+
+        def section(title: str, counts: Counter):
+            lines.append(f"{title} (samples, % of busy)")
+            for (filename, lineno, name), count in counts.most_common(top):
+                lines.append(f"{count:8d} {count / busy * 100:6.1f}%  {name}  {short_path(filename)}:{lineno}")
+            lines.append("")
+
+        if busy:
+            section("Top functions by own time", result["own"])
+            section("Top functions by total time, including callees", result["total"])
+        else:
+            lines.append("The event loop was idle for the whole run.")
+        return "\n".join(lines)
+
+    def heap_start(self, frames: int = 10):
+        """Start tracing allocations and take the baseline snapshot"""
+        if tracemalloc.is_tracing():
+            raise RuntimeError("Allocation tracing is already running.")
+        tracemalloc.start(frames)
+        self.heap_started = time.time()
+        self.heap_baseline = tracemalloc.take_snapshot().filter_traces(HEAP_FILTERS)
+
+    def heap_stop(self):
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Allocation tracing is not running.")
+        tracemalloc.stop()
+        self.heap_baseline = None
+        self.heap_started = None
+
+    async def heap_report(self, top: int = 30) -> str:
+        """Top allocation sites now and their growth since the baseline"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Allocation tracing is not running, start it first.")
+        return await asyncio.to_thread(self._heap_report, top)
+
+    def _heap_report(self, top: int) -> str:
+        snapshot = tracemalloc.take_snapshot().filter_traces(HEAP_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"tracemalloc, tracing for {time.time() - self.heap_started:.0f}s "
+            f"with {tracemalloc.get_traceback_limit()} frames",
+            f"Traced now {format_size(current)}, peak {format_size(peak)}, "
+            f"tracing overhead {format_size(tracemalloc.get_tracemalloc_memory())}",
+            ""
+        ]
+
+        lines.append("Growth since baseline by line")
+        for stat in snapshot.compare_to(self.heap_baseline, "lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{format_size(stat.size_diff):>12} {stat.count_diff:+8d} blocks  "
+                f"{short_path(frame.filename)}:{frame.lineno}  (now {format_size(stat.size)})"
+            )
+
+        lines.extend(["", "Largest allocation sites by line"])
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{format_size(stat.size):>12} {stat.count:8d} blocks  {short_path(frame.filename)}:{frame.lineno}"
+            )
+
+        lines.extend(["", "Largest growth with its traceback"])
+        for stat in snapshot.compare_to(self.heap_baseline, "traceback")[:5]:
+            lines.append(f"{format_size(stat.size_diff)} in {stat.count_diff:+d} blocks")
+            # Six frames, each formatted as a location and a source line
+            for frame in stat.traceback.format(most_recent_first=True)[:12]:
+                lines.append(f"  {frame}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get profiler state"""
+        return {
+            "running": self.running,
+            "runs": self.runs,
+            "heap_tracing": tracemalloc.is_tracing()
+        }
+
+# Global profiler instance
+profiler = Profiler()
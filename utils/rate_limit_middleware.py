@@ -0,0 +1,136 @@
+import time
+from typing import Dict, Any, Optional, Tuple
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, TypeHandler
+import logging
+from config import Config
+from utils.rate_limiter import check_rate_limit
+
+logger = logging.getLogger(__name__)
+
+# Commands and their RATE_LIMITS bucket, unlisted commands use "command"
+COMMAND_BUCKETS = {
+    "stats": "stats",
+    "tasks": "stats",
+    "perf": "stats",
+    "login": "login",
+    "send": "send_message",
+    "join": "join_chat",
+    "leave": "join_chat",
+    "report": "report",
+    "otp": "api_call",
+}
+
+# Callback data prefixes and their bucket, unlisted callbacks use "callback"
+CALLBACK_BUCKETS = {
+    "admin_accounts_page_": "paging",
+    "admin_all_accounts": "paging",
+    "admin_refresh": "paging",
+    "user_page_": "paging",
+    "user_accounts": "paging",
+    "user_refresh": "paging",
+    "otp_page_": "paging",
+    "otp_results_page_": "paging",
+    "otp_refresh": "api_call",
+    "otp_all": "api_call",
+    "admin_stats": "stats",
+}
+
+# Ways out of a running operation are never limited
+EXEMPT_COMMANDS = {"stop", "cancel"}
+EXEMPT_CALLBACKS = {"login_cancel", "report_stop", "join_stop", "leave_stop", "send_stop"}
+
+class RateLimitMiddleware:
+    """
+    Rejects over-limit updates before any command, callback or message
+    handler runs
+
+    Runs as a TypeHandler in group -1. Blocked updates end with
+    ApplicationHandlerStop, and the user is told the wait time once per
+    blocked window rather than on every rejected update.
+    """
+
+    def __init__(self, exempt_user_ids: Tuple[int, ...] = ()):
+        self.exempt_user_ids = set(exempt_user_ids)
+        self.callback_prefixes = sorted(CALLBACK_BUCKETS, key=len, reverse=True)
+        self.notified: Dict[Tuple[int, str], float] = {}
+        self.checked = 0
+        self.blocked = 0
+        self.notices = 0
+
+    def get_bucket(self, update: Update) -> Optional[str]:
+        """Map an update to its RATE_LIMITS bucket, None if it is not limited"""
+        if update.callback_query:
+            data = update.callback_query.data or ""
+            if data in EXEMPT_CALLBACKS:
+                return None
+            for prefix in self.callback_prefixes:
+                if data.startswith(prefix):
+                    return CALLBACK_BUCKETS[prefix]
+            return "callback"
+
+        message = update.message
+        if message is None or not message.text:
+            return None
+
+        if message.text.startswith("/"):
+            command = message.text.split()[0][1:].split("@")[0].lower()
+            if command in EXEMPT_COMMANDS:
+                return None
+            return COMMAND_BUCKETS.get(command, "command")
+
+        return "message"
+
+    async def __call__(self, update: Update, context):
+        user = update.effective_user
+        if user is None or user.id in self.exempt_user_ids:
+            return
+
+        bucket = self.get_bucket(update)
+        if bucket is None:
+            return
+
+        self.checked += 1
+        allowed, wait_time = await check_rate_limit(user.id, bucket)
+        if allowed:
+            return
+
+        self.blocked += 1
+        await self.notify(update, user.id, bucket, wait_time or 0)
+        raise ApplicationHandlerStop
+
+    async def notify(self, update: Update, user_id: int, bucket: str, wait_time: float):
+        """Tell the user how long to wait, once per blocked window"""
+        now = time.monotonic()
+        key = (user_id, bucket)
+        text = None
+        if self.notified.get(key, 0) <= now:
+            if len(self.notified) > 10000:
+                self.notified = {k: until for k, until in self.notified.items() if until > now}
+            self.notified[key] = now + max(wait_time, 1)
+            self.notices += 1
+            text = f"⏳ Too many requests, try again in {int(wait_time) + 1}s."
+
+        try:
+            if update.callback_query:
+                # Callbacks are still answered so the button stops loading
+                await update.callback_query.answer(text, show_alert=bool(text))
+            elif text and update.effective_message:
+                await update.effective_message.reply_text(text)
+        except Exception as e:
+            logger.debug(f"Could not send rate limit notice to {user_id}: {e}")
+
+    def handler(self) -> TypeHandler:
+        """Build the TypeHandler to add in a group ahead of the other handlers"""
+        return TypeHandler(Update, self)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get middleware statistics"""
+        return {
+            "checked": self.checked,
+            "blocked": self.blocked,
+            "notices": self.notices
+        }
+
+# Global rate limit middleware, the owner is never limited
+rate_limit_middleware = RateLimitMiddleware(exempt_user_ids=(Config.OWNER_ID,))
@@ -1,18 +1,96 @@
 import asyncio
 import time
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Dict, Optional, Any, Tuple
+from datetime import datetime
+from collections import OrderedDict
 import logging
+from config import Config
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+class WindowCounter:
+    """Request counts of the current and previous fixed window of one key"""
+    
+    __slots__ = ("window_start", "current", "previous", "period")
+    
+    def __init__(self, window_start: float, period: int):
+        self.window_start = window_start
+        self.current = 0
+        self.previous = 0
+        self.period = period
+    
+    def roll(self, now: float):
+        """Advance to the window containing now"""
+        elapsed = now - self.window_start
+        if elapsed < self.period:
+            return
+        windows = int(elapsed // self.period)
+        self.previous = self.current if windows == 1 else 0
+        self.current = 0
+        self.window_start += windows * self.period
+    
+    def estimate(self, now: float) -> float:
+        """Requests in the sliding period ending at now"""
+        weight = 1 - (now - self.window_start) / self.period
+        return self.previous * weight + self.current
+    
+    def idle(self, now: float) -> bool:
+        return now - self.window_start >= 2 * self.period
+
 class RateLimiter:
-    def __init__(self):
-        self.user_limits: Dict[int, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
-        self.account_limits: Dict[str, List[float]] = defaultdict(list)
-        self.ip_limits: Dict[str, List[float]] = defaultdict(list)
-        
+    """
+    Sliding-window rate limiter
+    
+    Each (user, action) keeps two counters, the current fixed window and the
+    previous one, and the previous one is weighted by how much of it still
+    overlaps the sliding period. Checks are O(1) and use constant memory per
+    key. Keys are kept in least recently used order and a few are looked
+    at from the front on each check: idle ones are evicted, live ones are
+    moved to the back. A daemon sweeps every idle key every sweep_interval
+    seconds so memory is freed when checks stop coming in.
+    """
+    
+    def __init__(self, evict_batch: int = 2, sweep_interval: float = 300, sweep_chunk: int = 5000):
+        self.user_limits: OrderedDict = OrderedDict()
+        self.account_limits: Dict[str, WindowCounter] = {}
+        self.ip_limits: Dict[str, WindowCounter] = {}
+        self.evict_batch = evict_batch
+        self.sweep_interval = sweep_interval
+        self.sweep_chunk = sweep_chunk
+        self.sweeper_task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.denied = 0
+        self.evicted = 0
+    
+    def _counter(self, user_id: int, action: str, period: int, now: float) -> WindowCounter:
+        key = (user_id, action)
+        counter = self.user_limits.get(key)
+        if counter is None or counter.period != period:
+            counter = self.user_limits[key] = WindowCounter(now, period)
+        else:
+            self.user_limits.move_to_end(key)
+            counter.roll(now)
+        return counter
+    
+    def _evict_front(self, now: float):
+        for _ in range(self.evict_batch):
+            if not self.user_limits:
+                return
+            key, counter = next(iter(self.user_limits.items()))
+            if counter.idle(now):
+                del self.user_limits[key]
+                self.evicted += 1
+            else:
+                # A longer period can keep a key live behind idle ones
+                self.user_limits.move_to_end(key)
+    
     async def check_user_limit(
         self, 
         user_id: int, 
@@ -21,21 +99,28 @@ class RateLimiter:
         period: int = 60
     ) -> bool:
         """Check if user has exceeded rate limit for an action"""
-        now = time.time()
-        
-        # Clean old timestamps
-        timestamps = self.user_limits[user_id][action]
-        timestamps = [ts for ts in timestamps if now - ts < period]
-        self.user_limits[user_id][action] = timestamps
+        return self.hit(user_id, action, limit, period)
+    
+    def hit(self, user_id: int, action: str, limit: int, period: int = 60) -> bool:
+        """Count one request if it is within the limit, returns False if not"""
+        now = time.monotonic()
+        self.checks += 1
+        self._evict_front(now)
         
-        # Check limit
-        if len(timestamps) >= limit:
+        counter = self._counter(user_id, action, period, now)
+        if counter.estimate(now) + 1 > limit:
+            self.denied += 1
             return False
         
-        # Add new timestamp
-        timestamps.append(now)
+        counter.current += 1
         return True
     
+    async def acquire(self, user_id: int, action: str, limit: int, period: int = 60) -> Tuple[bool, float]:
+        """Count one request if allowed, returns (allowed, wait_time)"""
+        if self.hit(user_id, action, limit, period):
+            return True, 0
+        return False, self.wait_time(user_id, action, limit, period)
+    
     async def get_wait_time(
         self, 
         user_id: int, 
@@ -44,39 +129,267 @@ class RateLimiter:
         period: int = 60
     ) -> float:
         """Get remaining wait time for user"""
-        now = time.time()
-        timestamps = self.user_limits[user_id][action]
+        return self.wait_time(user_id, action, limit, period)
+    
+    def wait_time(self, user_id: int, action: str, limit: int, period: int = 60) -> float:
+        """Seconds until the next request of user for action would be allowed"""
+        counter = self.user_limits.get((user_id, action))
+        if counter is None or counter.period != period:
+            return 0
         
-        if len(timestamps) < limit:
+        now = time.monotonic()
+        counter.roll(now)
+        if counter.estimate(now) + 1 <= limit:
             return 0
         
-        # Get oldest timestamp
-        oldest = min(timestamps)
-        wait_time = (oldest + period) - now
+        elapsed = now - counter.window_start
+        if counter.current + 1 > limit:
+            # Wait for the next window, then for this one to age out of it
+            return (period - elapsed) + period * (1 - (limit - 1) / counter.current)
+        
+        # Only the weighted previous window is in the way
+        return max(0, period * (1 - (limit - 1 - counter.current) / counter.previous) - elapsed)
+    
+    def evict_idle(self) -> int:
+        """Drop every key whose windows have both expired, returns the number dropped"""
+        now = time.monotonic()
+        idle = [key for key, counter in self.user_limits.items() if counter.idle(now)]
+        for key in idle:
+            del self.user_limits[key]
+        self.evicted += len(idle)
+        return len(idle)
+    
+    def start_sweeper(self):
+        """Start the daemon that evicts idle keys every sweep_interval seconds"""
+        from utils.task_manager import task_manager
         
-        return max(0, wait_time)
+        if self.sweeper_task and not self.sweeper_task.done():
+            return
+        self.sweeper_task = task_manager.spawn(self._sweeper_loop(), kind="rate_limit_sweeper", daemon=True)
+    
+    async def sweep(self) -> int:
+        """Evict every idle key, sweep_chunk keys at a time so the event loop is not held"""
+        keys = list(self.user_limits)
+        evicted = 0
+        for start in range(0, len(keys), self.sweep_chunk):
+            now = time.monotonic()
+            for key in keys[start:start + self.sweep_chunk]:
+                counter = self.user_limits.get(key)
+                if counter is not None and counter.idle(now):
+                    del self.user_limits[key]
+                    evicted += 1
+            await asyncio.sleep(0)
+        self.evicted += evicted
+        return evicted
+    
+    async def _sweeper_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            evicted = await self.sweep()
+            if evicted:
+                logger.debug(f"🧹 Evicted {evicted} idle rate limit keys")
     
     async def reset_limits(self, user_id: Optional[int] = None):
         """Reset rate limits for user or all users"""
         if user_id:
-            if user_id in self.user_limits:
-                del self.user_limits[user_id]
+            for key in [key for key in self.user_limits if key[0] == user_id]:
+                del self.user_limits[key]
         else:
             self.user_limits.clear()
             self.account_limits.clear()
             self.ip_limits.clear()
     
+    async def close(self):
+        pass
+    
     async def get_stats(self) -> Dict[str, Any]:
         """Get rate limiter statistics"""
         return {
-            "total_users": len(self.user_limits),
+            "backend": "memory",
+            "total_users": len({key[0] for key in self.user_limits}),
+            "total_keys": len(self.user_limits),
             "total_accounts": len(self.account_limits),
             "total_ips": len(self.ip_limits),
+            "checks": self.checks,
+            "denied": self.denied,
+            "evicted": self.evicted,
             "timestamp": datetime.utcnow().isoformat()
         }
 
+# Same sliding-window estimate as WindowCounter, run atomically in Redis.
+# KEYS: current window, previous window. ARGV: limit, period, seconds into
+# the current window, 1 to count the request or 0 to only peek.
+# Returns {allowed, wait in milliseconds}.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+
+if previous * (1 - elapsed / period) + current + 1 <= limit then
+    if ARGV[4] == '1' then
+        redis.call('INCR', KEYS[1])
+        redis.call('EXPIRE', KEYS[1], period * 2)
+    end
+    return {1, 0}
+end
+
+local wait
+if current + 1 > limit then
+    wait = (period - elapsed) + period * (1 - (limit - 1) / current)
+else
+    wait = math.max(0, period * (1 - (limit - 1 - current) / previous) - elapsed)
+end
+return {0, math.ceil(wait * 1000)}
+"""
+
+class RedisRateLimiter:
+    """
+    Rate limiter shared by every bot instance through Redis
+    
+    Counters are kept per fixed window in Redis and checked by a Lua script,
+    so concurrent checks from several instances stay atomic. While Redis is
+    unreachable, checks go to a local RateLimiter and Redis is retried after
+    retry_after seconds.
+    """
+    
+    def __init__(self, url: str, prefix: str = "rate_limit", retry_after: float = 30, timeout: float = 1.0):
+        self.url = url
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self.client = aioredis.from_url(
+            url,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout
+        )
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+        self.fallback = RateLimiter(sweep_interval=Config.RATE_LIMIT_SWEEP_INTERVAL)
+        self.down_until = 0.0
+        self.checks = 0
+        self.denied = 0
+        self.fallbacks = 0
+    
+    def _keys(self, user_id: int, action: str, period: int) -> Tuple[list, float]:
+        now = time.time()
+        window = int(now // period)
+        # The hash tag keeps both windows of a key in one cluster slot
+        base = f"{self.prefix}:{{{user_id}:{action}}}"
+        return [f"{base}:{window}", f"{base}:{window - 1}"], now - window * period
+    
+    def _mark_down(self, error: Exception):
+        if time.monotonic() >= self.down_until:
+            logger.warning(f"⚠️ Redis rate limiter unavailable, using local limits for {self.retry_after}s: {error}")
+        self.down_until = time.monotonic() + self.retry_after
+    
+    async def _run(self, user_id: int, action: str, limit: int, period: int, count: bool) -> Optional[Tuple[bool, float]]:
+        if time.monotonic() < self.down_until:
+            return None
+        
+        keys, elapsed = self._keys(user_id, action, period)
+        try:
+            allowed, wait_ms = await self.script(keys=keys, args=[limit, period, elapsed, 1 if count else 0])
+        except (aioredis.RedisError, OSError) as e:
+            self._mark_down(e)
+            return None
+        return bool(allowed), wait_ms / 1000
+    
+    async def acquire(self, user_id: int, action: str, limit: int, period: int = 60) -> Tuple[bool, float]:
+        """Count one request if allowed, returns (allowed, wait_time)"""
+        self.checks += 1
+        result = await self._run(user_id, action, limit, period, count=True)
+        if result is None:
+            self.fallbacks += 1
+            result = await self.fallback.acquire(user_id, action, limit, period)
+        if not result[0]:
+            self.denied += 1
+        return result
+    
+    async def check_user_limit(
+        self, 
+        user_id: int, 
+        action: str, 
+        limit: int, 
+        period: int = 60
+    ) -> bool:
+        """Check if user has exceeded rate limit for an action"""
+        allowed, _ = await self.acquire(user_id, action, limit, period)
+        return allowed
+    
+    async def get_wait_time(
+        self, 
+        user_id: int, 
+        action: str, 
+        limit: int, 
+        period: int = 60
+    ) -> float:
+        """Get remaining wait time for user"""
+        result = await self._run(user_id, action, limit, period, count=False)
+        if result is None:
+            return self.fallback.wait_time(user_id, action, limit, period)
+        return result[1]
+    
+    async def ping(self) -> bool:
+        """Check that Redis is reachable"""
+        try:
+            await self.client.ping()
+            self.down_until = 0.0
+            return True
+        except (aioredis.RedisError, OSError) as e:
+            self._mark_down(e)
+            return False
+    
+    async def reset_limits(self, user_id: Optional[int] = None):
+        """Reset rate limits for user or all users"""
+        await self.fallback.reset_limits(user_id)
+        pattern = f"{self.prefix}:{{{user_id}:*" if user_id else f"{self.prefix}:*"
+        try:
+            keys = [key async for key in self.client.scan_iter(match=pattern, count=500)]
+            for start in range(0, len(keys), 500):
+                await self.client.delete(*keys[start:start + 500])
+        except (aioredis.RedisError, OSError) as e:
+            self._mark_down(e)
+    
+    async def close(self):
+        await self.client.aclose()
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get rate limiter statistics"""
+        return {
+            "backend": "redis",
+            "redis_available": time.monotonic() >= self.down_until,
+            "checks": self.checks,
+            "denied": self.denied,
+            "fallbacks": self.fallbacks,
+            "local": await self.fallback.get_stats(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+def create_rate_limiter(config):
+    """Create the Redis limiter when REDIS_URL is set and redis is installed, else a local one"""
+    if not config.REDIS_URL:
+        return RateLimiter(sweep_interval=config.RATE_LIMIT_SWEEP_INTERVAL)
+    
+    if not REDIS_AVAILABLE:
+        logger.warning("⚠️ REDIS_URL is set but the redis package is not installed, using local rate limits")
+        return RateLimiter(sweep_interval=config.RATE_LIMIT_SWEEP_INTERVAL)
+    
+    return RedisRateLimiter(config.REDIS_URL)
+
+async def init_rate_limiter() -> bool:
+    """Start the idle key sweeper and check the Redis connection, returns False if limits are local only"""
+    if not isinstance(rate_limiter, RedisRateLimiter):
+        rate_limiter.start_sweeper()
+        return False
+    
+    rate_limiter.fallback.start_sweeper()
+    if await rate_limiter.ping():
+        logger.info("✅ Rate limits shared through Redis")
+        return True
+    return False
+
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = create_rate_limiter(Config)
 
 # Rate limit configurations
 RATE_LIMITS = {
@@ -85,6 +398,11 @@ RATE_LIMITS = {
     "join_chat": {"limit": 5, "period": 60},  # 5 joins per minute
     "report": {"limit": 3, "period": 300},  # 3 reports per 5 minutes
     "api_call": {"limit": 30, "period": 60},  # 30 API calls per minute
+    "stats": {"limit": 5, "period": 60},  # 5 statistics views per minute
+    "paging": {"limit": 30, "period": 60},  # 30 list pages per minute
+    "command": {"limit": 20, "period": 60},  # 20 other commands per minute
+    "callback": {"limit": 60, "period": 60},  # 60 other button presses per minute
+    "message": {"limit": 30, "period": 60},  # 30 text messages per minute
 }
 
 async def check_rate_limit(
@@ -102,15 +420,12 @@ async def check_rate_limit(
     # Get limits for action
     limits = RATE_LIMITS.get(action, {"limit": 5, "period": 60})
     
-    # Check user limit
-    user_allowed = await rate_limiter.check_user_limit(
+    # Check user limit, counting the request if it is allowed
+    user_allowed, wait_time = await rate_limiter.acquire(
         user_id, action, limits["limit"], limits["period"]
     )
     
     if not user_allowed:
-        wait_time = await rate_limiter.get_wait_time(
-            user_id, action, limits["limit"], limits["period"]
-        )
         return False, wait_time
     
     return True, None
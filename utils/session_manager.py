@@ -3,8 +3,9 @@ import os
 import json
 import asyncio
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import logging
+from utils.metrics import pyrogram_seconds
 
 logger = logging.getLogger(__name__)
 
@@ -74,13 +75,14 @@ class SessionManager:
         if filename in self.session_cache:
             del self.session_cache[filename]
         
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-                logger.info(f"✅ Session deleted: {filename}")
-                return True
-            except Exception as e:
-                logger.error(f"❌ Error deleting session {filename}: {e}")
+        try:
+            await asyncio.to_thread(os.remove, filepath)
+            logger.info(f"✅ Session deleted: {filename}")
+            return True
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Error deleting session {filename}: {e}")
         
         return False
     
@@ -96,8 +98,10 @@ class SessionManager:
                 session_string=session_data["session_string"]
             )
             
-            await app.connect()
-            await app.get_me()
+            with pyrogram_seconds.time(operation="connect"):
+                await app.connect()
+            with pyrogram_seconds.time(operation="get_me"):
+                await app.get_me()
             await app.disconnect()
             
             return True
@@ -110,6 +114,19 @@ class SessionManager:
         """Clean up session files older than specified days"""
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
         
+        # Directory scans and unlinks block, keep them off the event loop
+        removed = await asyncio.to_thread(self._remove_old_sessions, cutoff_date)
+        
+        for filename in removed:
+            logger.info(f"🗑️ Removed old session: {filename}")
+            
+            # Remove from cache
+            name_without_ext = filename.replace(".session", "")
+            if name_without_ext in self.session_cache:
+                del self.session_cache[name_without_ext]
+    
+    def _remove_old_sessions(self, cutoff_date: datetime) -> List[str]:
+        removed = []
         for filename in os.listdir(self.sessions_dir):
             if filename.endswith(".session"):
                 filepath = os.path.join(self.sessions_dir, filename)
@@ -120,27 +137,17 @@ class SessionManager:
                     
                     if mtime < cutoff_date:
                         os.remove(filepath)
-                        logger.info(f"🗑️ Removed old session: {filename}")
+                        removed.append(filename)
                         
-                        # Remove from cache
-                        name_without_ext = filename.replace(".session", "")
-                        if name_without_ext in self.session_cache:
-                            del self.session_cache[name_without_ext]
-                            
                 except Exception as e:
                     logger.error(f"❌ Error cleaning up session {filename}: {e}")
+        
+        return removed
     
     async def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics"""
-        total_sessions = 0
+        total_sessions, total_size = await asyncio.to_thread(self._scan_sessions)
         valid_sessions = 0
-        total_size = 0
-        
-        for filename in os.listdir(self.sessions_dir):
-            if filename.endswith(".session"):
-                total_sessions += 1
-                filepath = os.path.join(self.sessions_dir, filename)
-                total_size += os.path.getsize(filepath)
         
         return {
             "total_sessions": total_sessions,
@@ -150,6 +157,18 @@ class SessionManager:
             "total_size_mb": total_size / (1024 * 1024),
             "cache_size": len(self.session_cache)
         }
+    
+    def _scan_sessions(self) -> Tuple[int, int]:
+        total_sessions = 0
+        total_size = 0
+        
+        for filename in os.listdir(self.sessions_dir):
+            if filename.endswith(".session"):
+                total_sessions += 1
+                filepath = os.path.join(self.sessions_dir, filename)
+                total_size += os.path.getsize(filepath)
+        
+        return total_sessions, total_size
 
 # Create global instance
 session_manager = SessionManager()
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from bson import json_util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Never written to a backend, wherever they appear in a state
+SECRET_KEYS = {"session_string", "password", "api_hash", "phone_code_hash", "otp_code"}
+
+def strip_secrets(value: Any) -> Any:
+    """Copy of value without SECRET_KEYS in any nested dict"""
+    if isinstance(value, dict):
+        return {key: strip_secrets(item) for key, item in value.items() if key not in SECRET_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [strip_secrets(item) for item in value]
+    return value
+
+class MongoStateBackend:
+    """Conversation states in the conversation_states collection"""
+
+    def __init__(self):
+        self.collection = None
+
+    async def setup(self):
+        from database.mongodb import get_database
+
+        db = await get_database()
+        self.collection = db.conversation_states
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def save(self, flow: str, user_id: int, data: str, expires_at: Optional[float]):
+        await self.collection.replace_one(
+            {"_id": f"{flow}:{user_id}"},
+            {
+                "flow": flow,
+                "user_id": user_id,
+                "state": data,
+                "expires_at": datetime.utcfromtimestamp(expires_at) if expires_at else None
+            },
+            upsert=True
+        )
+
+    async def delete(self, flow: str, user_id: int):
+        await self.collection.delete_one({"_id": f"{flow}:{user_id}"})
+
+    async def load(self, flow: str, user_id: int) -> Optional[str]:
+        doc = await self.collection.find_one({"_id": f"{flow}:{user_id}"}, {"state": 1})
+        return doc["state"] if doc else None
+
+    async def load_index(self) -> List[Tuple[str, int, Optional[float]]]:
+        index = []
+        cursor = self.collection.find({}, {"flow": 1, "user_id": 1, "expires_at": 1})
+        async for doc in cursor:
+            expires_at = doc.get("expires_at")
+            index.append((
+                doc["flow"],
+                doc["user_id"],
+                (expires_at - datetime(1970, 1, 1)).total_seconds() if expires_at else None
+            ))
+        return index
+
+    async def close(self):
+        pass
+
+class SQLiteStateBackend:
+    """Conversation states in a local SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    async def setup(self):
+        await asyncio.to_thread(self._setup)
+
+    def _setup(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_states ("
+                "flow TEXT NOT NULL, user_id INTEGER NOT NULL, state TEXT NOT NULL, "
+                "expires_at REAL, PRIMARY KEY (flow, user_id))"
+            )
+            self.conn.execute(
+                "DELETE FROM conversation_states WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (time.time(),)
+            )
+            self.conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            self.conn.commit()
+            return rows
+
+    async def save(self, flow: str, user_id: int, data: str, expires_at: Optional[float]):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO conversation_states (flow, user_id, state, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (flow, user_id, data, expires_at)
+        )
+
+    async def delete(self, flow: str, user_id: int):
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM conversation_states WHERE flow = ? AND user_id = ?",
+            (flow, user_id)
+        )
+
+    async def load(self, flow: str, user_id: int) -> Optional[str]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT state FROM conversation_states WHERE flow = ? AND user_id = ?",
+            (flow, user_id)
+        )
+        return rows[0][0] if rows else None
+
+    async def load_index(self) -> List[Tuple[str, int, Optional[float]]]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT flow, user_id, expires_at FROM conversation_states"
+        )
+        return [(flow, user_id, expires_at) for flow, user_id, expires_at in rows]
+
+    async def close(self):
+        if self.conn:
+            await asyncio.to_thread(self.conn.close)
+            self.conn = None
+
+class StateStore:
+    """
+    Write-behind persistence of conversation states through a single ordered writer
+
+    Saves only queue a reference to the state. The writer serializes it when
+    it gets to it, so a state changed several times before the flush is
+    serialized and written once, as it is at that point.
+
+    Saves are not awaited. Writes still queued when the process dies
+    without reaching close() are lost. The window is usually one backend
+    round trip per queued state, and longer while the backend is slow.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pending: Dict[Tuple[str, int], tuple] = {}
+        self.writer_task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def serialize(self, state: Dict[str, Any], transient_keys: set) -> str:
+        """Serialize state, skipping transient, secret and unserializable values"""
+        data = strip_secrets({key: value for key, value in state.items() if key not in transient_keys})
+        try:
+            return json_util.dumps(data)
+        except (TypeError, ValueError):
+            serializable = {}
+            for key, value in data.items():
+                try:
+                    json_util.dumps(value)
+                    serializable[key] = value
+                except (TypeError, ValueError):
+                    continue
+            return json_util.dumps(serializable)
+
+    def save(self, flow: str, user_id: int, state: Dict[str, Any], transient_keys: set, expires_at: Optional[float]):
+        """Write state in the background, as it is when the writer gets to it"""
+        self._enqueue((flow, user_id), ("save", state, transient_keys, expires_at))
+
+    def delete(self, flow: str, user_id: int):
+        """Delete state in the background"""
+        self._enqueue((flow, user_id), ("delete", None, None, None))
+
+    def _enqueue(self, key: Tuple[str, int], operation: tuple):
+        # Only the latest operation per state is written
+        if key in self.pending:
+            self.coalesced += 1
+        else:
+            self.queue.put_nowait(key)
+        self.pending[key] = operation
+
+        if self.writer_task is None or self.writer_task.done():
+            try:
+                self.writer_task = asyncio.get_running_loop().create_task(self._writer())
+            except RuntimeError:
+                pass
+
+    async def _writer(self):
+        while True:
+            key = await self.queue.get()
+            flow, user_id = key
+            action, state, transient_keys, expires_at = self.pending.pop(key)
+            try:
+                if action == "save":
+                    await self.backend.save(flow, user_id, self.serialize(state, transient_keys), expires_at)
+                else:
+                    await self.backend.delete(flow, user_id)
+                self.writes += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Error persisting {flow} state for {user_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def load(self, flow: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Load a persisted state"""
+        data = await self.backend.load(flow, user_id)
+        return json_util.loads(data) if data else None
+
+    async def load_index(self) -> List[Tuple[str, int, Optional[float]]]:
+        """Load (flow, user_id, expires_at) of all persisted states"""
+        return await self.backend.load_index()
+
+    async def close(self):
+        """Flush pending writes and close the backend"""
+        if self.writer_task and not self.writer_task.done():
+            await self.queue.join()
+            self.writer_task.cancel()
+        await self.backend.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get state store statistics"""
+        return {
+            "backend": type(self.backend).__name__,
+            "pending_writes": self.queue.qsize(),
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "errors": self.errors
+        }
+
+def create_state_backend(config):
+    """Create the configured state backend, None keeps states in memory only"""
+    backend = (config.STATE_BACKEND or "memory").lower()
+
+    if backend == "mongo":
+        return MongoStateBackend()
+    if backend == "sqlite":
+        return SQLiteStateBackend(config.STATE_SQLITE_PATH)
+    if backend != "memory":
+        logger.warning(f"⚠️ Unknown STATE_BACKEND '{backend}', keeping states in memory")
+    return None
+
+async def init_state_store(registry, config) -> Optional[StateStore]:
+    """Attach persistent storage to the conversation registry and rehydrate it"""
+    backend = create_state_backend(config)
+    if backend is None:
+        registry.attach(None, config.STATE_TTL)
+        return None
+
+    try:
+        await backend.setup()
+    except Exception as e:
+        logger.error(f"❌ State backend setup failed, keeping states in memory: {e}")
+        registry.attach(None, config.STATE_TTL)
+        return None
+
+    store = StateStore(backend)
+    registry.attach(store, config.STATE_TTL)
+    restored = await registry.rehydrate()
+    logger.info(f"✅ Conversation state store ready ({type(backend).__name__}, {restored} restored)")
+    return store
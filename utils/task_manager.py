@@ -0,0 +1,195 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Coroutine, Tuple
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class TaskLimitError(Exception):
+    """Raised when a background task would exceed a concurrency cap"""
+    pass
+
+class ManagedTask:
+    """A background task with its owner, kind and start time"""
+
+    __slots__ = ("task", "owner", "kind", "daemon", "started_at", "started")
+
+    def __init__(self, task: asyncio.Task, owner: Optional[int], kind: str, daemon: bool):
+        self.task = task
+        self.owner = owner
+        self.kind = kind
+        self.daemon = daemon
+        self.started_at = datetime.utcnow()
+        self.started = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.started
+
+class TaskManager:
+    """
+    Registry of background coroutines
+
+    User tasks count against a per-user cap and a global cap. Tasks without
+    an owner are system work and are not capped. Daemon tasks are cancelled
+    right away on shutdown instead of drained.
+    """
+
+    def __init__(self, max_total: int = 10, max_per_user: int = 3):
+        self.max_total = max_total
+        self.max_per_user = max_per_user
+        self.tasks: Dict[asyncio.Task, ManagedTask] = {}
+        self.by_key: Dict[Tuple[int, str], ManagedTask] = {}
+        self.user_counts: Dict[int, int] = {}
+        self.user_total = 0
+        self.spawned = 0
+        self.rejected = 0
+        self.failed = 0
+        self.closing = False
+
+    def check(self, owner: Optional[int], kind: str):
+        """Raise TaskLimitError if owner may not start another task of kind"""
+        if owner is None:
+            return
+        if self.closing:
+            raise TaskLimitError("The bot is shutting down, try again shortly.")
+        if (owner, kind) in self.by_key:
+            raise TaskLimitError(f"A {kind} task is already running for you.")
+        if self.user_counts.get(owner, 0) >= self.max_per_user:
+            raise TaskLimitError(f"You already have {self.max_per_user} tasks running.")
+        if self.user_total >= self.max_total:
+            raise TaskLimitError("Too many tasks are running right now, try again later.")
+
+    def spawn(
+        self,
+        coro: Coroutine,
+        owner: Optional[int] = None,
+        kind: str = "task",
+        daemon: bool = False
+    ) -> asyncio.Task:
+        """Start and register a background coroutine"""
+        try:
+            self.check(owner, kind)
+        except TaskLimitError:
+            self.rejected += 1
+            coro.close()
+            raise
+
+        task = asyncio.create_task(coro, name=f"{kind}:{owner}")
+        entry = ManagedTask(task, owner, kind, daemon)
+        self.tasks[task] = entry
+        if owner is not None:
+            self.by_key[(owner, kind)] = entry
+            self.user_counts[owner] = self.user_counts.get(owner, 0) + 1
+            self.user_total += 1
+
+        self.spawned += 1
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task):
+        entry = self.tasks.pop(task, None)
+        if entry is None:
+            return
+
+        if entry.owner is not None:
+            if self.by_key.get((entry.owner, entry.kind)) is entry:
+                del self.by_key[(entry.owner, entry.kind)]
+            self.user_counts[entry.owner] -= 1
+            if not self.user_counts[entry.owner]:
+                del self.user_counts[entry.owner]
+            self.user_total -= 1
+
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            logger.error(f"❌ Background {entry.kind} task for {entry.owner} failed: {task.exception()}")
+
+    def get(self, owner: int, kind: str) -> Optional[asyncio.Task]:
+        """Get the running task of kind for owner"""
+        entry = self.by_key.get((owner, kind))
+        return entry.task if entry else None
+
+    def is_running(self, owner: int, kind: str) -> bool:
+        return (owner, kind) in self.by_key
+
+    def cancel(self, owner: int, kind: Optional[str] = None) -> int:
+        """Cancel owner's tasks, of one kind or all, returns the number cancelled"""
+        entries = [
+            entry for entry in self.tasks.values()
+            if entry.owner == owner and (kind is None or entry.kind == kind)
+        ]
+        for entry in entries:
+            entry.task.cancel()
+        return len(entries)
+
+    def list_tasks(self) -> List[Dict[str, Any]]:
+        """List running tasks, oldest first"""
+        entries = sorted(self.tasks.values(), key=lambda entry: entry.started)
+        return [
+            {
+                "owner": entry.owner,
+                "kind": entry.kind,
+                "daemon": entry.daemon,
+                "started_at": entry.started_at,
+                "age_seconds": entry.age()
+            }
+            for entry in entries
+        ]
+
+    async def drain(self, timeout: float, cancel_timeout: float = 5.0) -> Tuple[int, int]:
+        """
+        Stop accepting tasks, wait up to timeout for running ones and cancel the rest
+
+        Cancelled tasks get cancel_timeout seconds to unwind, a task that
+        swallows its cancellation is abandoned rather than hanging shutdown.
+
+        Returns:
+            Tuple of (finished, cancelled)
+        """
+        self.closing = True
+
+        for entry in list(self.tasks.values()):
+            if entry.daemon:
+                entry.task.cancel()
+
+        pending = [entry.task for entry in self.tasks.values() if not entry.daemon]
+        finished = 0
+        if pending:
+            logger.info(f"⏳ Draining {len(pending)} background tasks (up to {timeout}s)...")
+            done, not_done = await asyncio.wait(pending, timeout=timeout)
+            finished = len(done)
+            for task in not_done:
+                task.cancel()
+            pending = list(not_done)
+
+        remaining = set(pending) | set(self.tasks)
+        if remaining:
+            _, stuck = await asyncio.wait(remaining, timeout=cancel_timeout)
+            for task in stuck:
+                logger.warning(f"⚠️ Task {task.get_name()} did not stop within {cancel_timeout}s of cancellation")
+
+        return finished, len(pending)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get task manager statistics"""
+        kinds: Dict[str, int] = {}
+        for entry in self.tasks.values():
+            kinds[entry.kind] = kinds.get(entry.kind, 0) + 1
+
+        return {
+            "running": len(self.tasks),
+            "user_tasks": self.user_total,
+            "max_total": self.max_total,
+            "max_per_user": self.max_per_user,
+            "kinds": kinds,
+            "spawned": self.spawned,
+            "rejected": self.rejected,
+            "failed": self.failed
+        }
+
+# Global task manager instance
+task_manager = TaskManager(
+    max_total=Config.MAX_WORKERS,
+    max_per_user=Config.MAX_TASKS_PER_USER
+)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Awaitable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs updates of different users concurrently, up to max_workers, while
+    updates of the same user run strictly one after another
+
+    The base class semaphore only bounds admitted updates (max_pending). Each
+    update then waits for its user's lock before taking a worker slot, so a
+    user with a long backlog never holds workers other users could use.
+    """
+
+    def __init__(self, max_workers: int = 10, max_pending: int = 256):
+        super().__init__(max(max_pending, max_workers))
+        self.max_workers = max_workers
+        self.workers: Optional[asyncio.Semaphore] = None
+        self.user_locks: Dict[int, asyncio.Lock] = {}
+        self.user_backlog: Dict[int, int] = {}
+        self.pending = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.processed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def initialize(self):
+        self.workers = asyncio.Semaphore(self.max_workers)
+
+    async def shutdown(self):
+        self.user_locks.clear()
+        self.user_backlog.clear()
+
+    @staticmethod
+    def get_user_id(update: object) -> Optional[int]:
+        """Get the user whose updates must stay ordered"""
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        if self.workers is None:
+            await self.initialize()
+
+        user_id = self.get_user_id(update)
+        arrived = time.monotonic()
+        self.pending += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.pending - self.running)
+
+        try:
+            if user_id is None:
+                await self._run(coroutine, arrived)
+                return
+
+            lock = self.user_locks.get(user_id)
+            if lock is None:
+                lock = self.user_locks[user_id] = asyncio.Lock()
+            self.user_backlog[user_id] = self.user_backlog.get(user_id, 0) + 1
+
+            try:
+                async with lock:
+                    await self._run(coroutine, arrived)
+            finally:
+                self.user_backlog[user_id] -= 1
+                if not self.user_backlog[user_id]:
+                    del self.user_backlog[user_id]
+                    self.user_locks.pop(user_id, None)
+        finally:
+            self.pending -= 1
+
+    async def _run(self, coroutine: Awaitable[Any], arrived: float):
+        async with self.workers:
+            waited = time.monotonic() - arrived
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+                self.processed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get update queue statistics"""
+        return {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queue_depth": self.pending - self.running,
+            "max_queue_depth": self.max_queue_depth,
+            "users_waiting": len(self.user_backlog),
+            "processed": self.processed,
+            "avg_wait_ms": (self.wait_seconds / self.processed * 1000) if self.processed else 0.0,
+            "max_wait_ms": self.max_wait_seconds * 1000
+        }
+
+# Global update processor instance
+update_processor = UserOrderedUpdateProcessor(
+    max_workers=Config.MAX_WORKERS,
+    max_pending=Config.MAX_PENDING_UPDATES
+)
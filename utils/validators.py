@@ -28,6 +28,31 @@ def validate_phone_number(phone: str) -> Tuple[bool, Optional[str]]:
     
     return True, None
 
+def normalize_phone_key(phone: str) -> Optional[str]:
+    """
+    Normalize phone number to its canonical E.164 key
+    
+    Args:
+        phone: Phone number as typed (spaces, dashes, brackets, 00 prefix)
+    
+    Returns:
+        "+<digits>" key, or None if it cannot be a phone number
+    """
+    if not phone:
+        return None
+    
+    phone = phone.strip()
+    digits = ''.join(str(int(ch)) for ch in phone if ch.isdecimal())
+    
+    # International call prefix instead of +
+    if not phone.startswith('+') and digits.startswith('00'):
+        digits = digits[2:]
+    
+    if len(digits) < 8 or len(digits) > 15 or digits.startswith('0'):
+        return None
+    
+    return '+' + digits
+
 def validate_api_id(api_id: str) -> Tuple[bool, Optional[str]]:
     """Validate API ID"""
     if not api_id.isdigit():
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Callable
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class BlockingCallError(AssertionError):
+    """Raised by detect_blocking when the event loop was blocked too long"""
+    pass
+
+class LoopWatchdog:
+    """
+    Detects calls that block the event loop
+
+    A heartbeat task on the loop records a timestamp every interval and how
+    late it woke up. A separate thread checks the timestamp, and when the
+    loop has not beaten for threshold_ms it captures the loop thread's stack
+    while the blocking call is still running. Each location is logged at
+    most once per log_interval seconds.
+    """
+
+    def __init__(self, threshold_ms: float = 250, log_interval: float = 60):
+        self.threshold = threshold_ms / 1000
+        self.interval = min(0.1, self.threshold / 10)
+        self.log_interval = log_interval
+        self.loop_thread_id: Optional[int] = None
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+        self.last_beat = 0.0
+        self.in_stall = False
+        self.last_logged: Dict[str, float] = {}
+        self.stalls = 0
+        self.suppressed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    def start(self, spawn: Optional[Callable] = None):
+        """Start the heartbeat on the running loop and the watching thread, spawn defaults to the task manager"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.stopping.clear()
+
+        if spawn is None:
+            from utils.task_manager import task_manager
+            self.heartbeat_task = task_manager.spawn(self._heartbeat(), kind="loop_watchdog", daemon=True)
+        else:
+            self.heartbeat_task = spawn(self._heartbeat())
+
+        self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(0.0, now - before - self.interval)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self.last_beat = now
+
+    def _watch(self):
+        while not self.stopping.wait(self.interval):
+            stalled = time.monotonic() - self.last_beat - self.interval
+            if stalled < self.threshold:
+                self.in_stall = False
+                continue
+            if self.in_stall:
+                continue
+
+            # One report per stall, taken while the loop is still blocked
+            self.in_stall = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                self.report(stalled, traceback.extract_stack(frame))
+
+    @staticmethod
+    def find_location(stack: traceback.StackSummary) -> traceback.FrameSummary:
+        """Deepest frame in the bot's own code, else the deepest frame"""
+        for entry in reversed(stack):
+            if entry.filename.startswith(PROJECT_ROOT) and "site-packages" not in entry.filename:
+                return entry
+        return stack[-1]
+
+    def report(self, stalled: float, stack: traceback.StackSummary):
+        location = self.find_location(stack)
+        where = f"{os.path.relpath(location.filename, PROJECT_ROOT)}:{location.lineno} in {location.name}"
+        self.last_stall = {"ms": stalled * 1000, "location": where, "line": location.line}
+
+        now = time.monotonic()
+        if now - self.last_logged.get(where, 0) < self.log_interval:
+            self.suppressed += 1
+            return
+        self.last_logged[where] = now
+
+        logger.warning(
+            f"🧊 Event loop blocked for over {stalled * 1000:.0f}ms at {where}: {location.line}\n"
+            + "".join(traceback.format_list(stack[-8:]))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get watchdog statistics"""
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "suppressed_reports": self.suppressed,
+            "last_lag_ms": self.last_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+            "last_stall": self.last_stall
+        }
+
+@asynccontextmanager
+async def detect_blocking(max_ms: float):
+    """
+    Raise BlockingCallError if the event loop is blocked for more than
+    max_ms inside the block, for use in tests:
+
+        async with detect_blocking(50):
+            await handle_login(update, context)
+    """
+    watchdog = LoopWatchdog(threshold_ms=max_ms, log_interval=0)
+    watchdog.start(spawn=asyncio.ensure_future)
+    try:
+        yield watchdog
+        # Let the heartbeat observe a block at the very end of the body
+        await asyncio.sleep(watchdog.interval * 2)
+    finally:
+        watchdog.stop()
+
+    blocked_ms = max(watchdog.max_lag * 1000, watchdog.last_stall["ms"] if watchdog.last_stall else 0)
+    if blocked_ms > max_ms:
+        where = watchdog.last_stall["location"] if watchdog.last_stall else "unknown location"
+        raise BlockingCallError(f"Event loop blocked for {blocked_ms:.0f}ms (limit {max_ms:.0f}ms) at {where}")
+
+# Global event loop watchdog
+loop_watchdog = LoopWatchdog(threshold_ms=Config.LOOP_BLOCK_THRESHOLD_MS)
+
+def enable_asyncio_debug(loop: asyncio.AbstractEventLoop, slow_callback_ms: float):
+    """Turn on asyncio debug mode, which logs every callback slower than slow_callback_ms"""
+    loop.set_debug(True)
+    loop.slow_callback_duration = slow_callback_ms / 1000
+    logging.getLogger("asyncio").setLevel(logging.DEBUG)
+    logger.warning(f"🐞 asyncio debug mode on, slow callback threshold {slow_callback_ms:.0f}ms")
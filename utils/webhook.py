@@ -0,0 +1,87 @@
+import hmac
+import json
+import secrets
+from typing import Dict, Any, Optional
+from aiohttp import web
+from telegram import Update
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """Embedded aiohttp server that acknowledges Telegram updates and queues them"""
+
+    def __init__(
+        self,
+        application,
+        path: str = "/telegram",
+        secret_token: Optional[str] = None,
+        host: str = "0.0.0.0",
+        port: int = 8443
+    ):
+        self.application = application
+        self.path = path if path.startswith("/") else f"/{path}"
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Verify, parse and queue one update, processing happens off the request"""
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+
+        try:
+            data = json.loads(await request.read())
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self.invalid += 1
+            logger.warning(f"⚠️ Invalid webhook payload: {e}")
+            return web.Response(status=400)
+
+        if update is not None:
+            self.application.update_queue.put_nowait(update)
+            self.received += 1
+
+        return web.Response(status=200)
+
+    async def start(self, url: str, max_connections: int = 40):
+        """Start serving and register the webhook with Telegram"""
+        self.runner = web.AppRunner(self.build_app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+        await self.application.bot.set_webhook(
+            url=f"{url.rstrip('/')}{self.path}",
+            secret_token=self.secret_token,
+            max_connections=max_connections,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🌐 Webhook listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Stop serving, the webhook stays registered for the next start"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get webhook ingestion statistics"""
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+            "queued": self.application.update_queue.qsize()
+        }